@@ -0,0 +1,182 @@
+# app/backup.py
+"""
+在线热备份：用 SQLite backup API 给 app.db 拍快照，不必停掉 Streamlit / 桌面端。
+
+直接复制 app.db 文件时，写者可能正写到一半（WAL 里的提交也还没合并回主文件），
+备份出来的库常常是坏的。这里：
+
+- snapshot_db()：sqlite3.Connection.backup 按页分步复制，每步 BACKUP_STEP_PAGES 页，
+  每步之后在进度回调里 sleep BACKUP_STEP_SLEEP 秒（backup() 自带的 sleep 参数只在 BUSY/LOCKED
+  重试时才睡，正常分步之间并不让出），期间写者照常提交；源连接全程持有一个读事务，快照就是开始那一刻的一致状态
+  （WAL 下读写互不阻塞，别的连接提交也不会让备份从头重来）；
+- 快照先写成 .part，PRAGMA integrity_check 通过后才改名为 app-YYYYmmdd-HHMMSS.db；
+- backup_covers()：封面按内容 hash 存放（covers/ab/cd/<hash>.jpg），备份目录里已有的文件
+  就是同一内容，只复制新增的 hash；
+- rotate()：只保留最近 keep 份快照，并删掉不再被任何快照引用的封面。
+
+恢复：停掉应用，把某个快照复制为 data/app.db，把 backups/covers 复制回 data/covers。
+"""
+from __future__ import annotations
+
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Set, Tuple
+
+from .config import (
+    BACKUP_DIR, BACKUP_KEEP, BACKUP_STEP_PAGES, BACKUP_STEP_SLEEP, DATA_DIR, DB_PATH,
+)
+
+SNAPSHOT_PREFIX = "app-"
+SNAPSHOT_SUFFIX = ".db"
+
+
+class BackupError(RuntimeError):
+    """快照校验不通过等。"""
+
+
+def verify(path) -> List[str]:
+    """PRAGMA integrity_check；返回问题列表，空列表表示完好。"""
+    con = sqlite3.connect(f"file:{Path(path)}?mode=ro", uri=True)
+    try:
+        rows = [r[0] for r in con.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:     # 页头都坏了时直接报错
+        rows = [str(e)]
+    finally:
+        con.close()
+    return [] if rows == ["ok"] else rows
+
+
+def snapshot_db(
+    dest,
+    pages: int = BACKUP_STEP_PAGES,
+    sleep: float = BACKUP_STEP_SLEEP,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Path:
+    """把 app.db 在线备份到 dest（先写 .part，校验通过后改名），返回 dest。每步 pages 页后 sleep 秒。"""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = dest.with_name(dest.name + ".part")
+    part.unlink(missing_ok=True)
+
+    def _progress(_status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+        if remaining and sleep > 0:         # 回调在两步之间调用：在这里让出磁盘/CPU
+            time.sleep(sleep)
+
+    src = sqlite3.connect(str(DB_PATH), timeout=30, isolation_level=None)
+    dst = sqlite3.connect(str(part))
+    try:
+        # 在源连接上先开一个读事务：整个备份都从同一个 WAL 快照读，
+        # 其它连接的提交不会让 backup 从头重拷（否则写入频繁时永远拷不完）
+        src.execute("BEGIN")
+        src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=max(1, int(pages)), progress=_progress)
+        src.execute("COMMIT")
+        # 快照做成单文件（源库是 WAL 模式，页头会带过来）
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+
+    problems = verify(part)
+    if problems:
+        bad = part.with_name(part.name.replace(".part", ".corrupt"))
+        part.replace(bad)
+        raise BackupError(f"快照校验失败（已保留为 {bad.name}）：{'; '.join(problems[:5])}")
+    part.replace(dest)
+    return dest
+
+
+def _cover_paths(snapshot) -> Set[str]:
+    con = sqlite3.connect(f"file:{Path(snapshot)}?mode=ro", uri=True)
+    try:
+        return {r[0] for r in con.execute("SELECT rel_path FROM cover_blobs")}
+    except sqlite3.OperationalError:      # 旧库还没有 cover_blobs
+        return set()
+    finally:
+        con.close()
+
+
+def backup_covers(snapshot, dest_root=BACKUP_DIR) -> Tuple[int, int, int]:
+    """
+    按快照里的 cover_blobs 复制封面到 dest_root 下同样的相对路径；已存在的跳过。
+    返回 (新复制数, 新复制字节数, 源文件缺失数)。
+    """
+    dest_root = Path(dest_root)
+    copied = size = missing = 0
+    for rel in sorted(_cover_paths(snapshot)):
+        target = dest_root / rel
+        if target.exists():
+            continue
+        source = DATA_DIR / rel
+        if not source.exists():
+            missing += 1
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + ".part")
+        shutil.copy2(source, tmp)
+        tmp.replace(target)
+        copied += 1
+        size += target.stat().st_size
+    return copied, size, missing
+
+
+def list_snapshots(dest_root=BACKUP_DIR) -> List[Path]:
+    """按时间从旧到新。"""
+    return sorted(Path(dest_root).glob(f"{SNAPSHOT_PREFIX}*{SNAPSHOT_SUFFIX}"),
+                  key=lambda p: (p.stat().st_mtime, p.name))
+
+
+def rotate(dest_root=BACKUP_DIR, keep: int = BACKUP_KEEP) -> Tuple[List[Path], int]:
+    """只留最近 keep 份快照；再删掉不被任何剩余快照引用的封面。返回 (删除的快照, 删除的封面数)。"""
+    dest_root = Path(dest_root)
+    snaps = list_snapshots(dest_root)
+    removed = snaps[:-keep] if keep > 0 else []
+    for p in removed:
+        p.unlink(missing_ok=True)
+
+    pruned = 0
+    covers_dir = dest_root / "covers"
+    if removed and covers_dir.exists():
+        wanted: Set[str] = set()
+        for p in list_snapshots(dest_root):
+            wanted |= _cover_paths(p)
+        for f in covers_dir.rglob("*"):
+            if f.is_file() and f.relative_to(dest_root).as_posix() not in wanted:
+                f.unlink()
+                pruned += 1
+    return removed, pruned
+
+
+def backup(
+    dest_root=None,
+    keep: Optional[int] = None,
+    covers: bool = True,
+    progress: Optional[Callable[[int, int], None]] = None,
+    pages: int = BACKUP_STEP_PAGES,
+) -> dict:
+    """拍一份快照（校验）→ 增量备份封面 → 轮转。返回各步统计。"""
+    dest_root = Path(dest_root or BACKUP_DIR)
+    keep = BACKUP_KEEP if keep is None else keep
+    t0 = time.perf_counter()
+    stem = f"{SNAPSHOT_PREFIX}{datetime.now():%Y%m%d-%H%M%S}"
+    dest, i = dest_root / f"{stem}{SNAPSHOT_SUFFIX}", 1
+    while dest.exists():                 # 同一秒内连续备份
+        dest, i = dest_root / f"{stem}-{i}{SNAPSHOT_SUFFIX}", i + 1
+    snap = snapshot_db(dest, pages=pages, progress=progress)
+    out = {
+        "snapshot": str(snap),
+        "bytes": snap.stat().st_size,
+        "snapshot_s": round(time.perf_counter() - t0, 2),
+    }
+    if covers:
+        out["covers_copied"], out["covers_bytes"], out["covers_missing"] = backup_covers(snap, dest_root)
+    removed, pruned = rotate(dest_root, keep)
+    out["rotated"] = [p.name for p in removed]
+    out["covers_pruned"] = pruned
+    out["total_s"] = round(time.perf_counter() - t0, 2)
+    return out
@@ -0,0 +1,149 @@
+# app/breaker.py
+"""
+按站点的熔断器。
+
+站点开始大面积超时/报错时，原先每本书仍要付出完整的 REQUEST_TIMEOUT × 重试次数。
+熔断后在冷却期内直接跳过该站点：
+
+- closed    正常放行；连续失败 ≥ failure_threshold，或最近 window 次里错误率 ≥ error_rate
+            （至少 min_calls 次）时 → open
+- open      冷却 cooldown 秒内一律拒绝；到期后放行**一个**探测请求 → half_open
+- half_open 探测成功 → closed（计数清零）；失败 → 重新 open
+
+计数在 httpcache.CachingAdapter 的网络出口处进行（每个真实请求一次，缓存命中不算）：
+超时/连接失败/5xx/429/403 记失败，其余记成功。流水线在调用 provider 前用 is_open()
+判断是否整站跳过；被拒绝的请求抛 CircuitOpenError（属于 requests.ConnectionError，
+provider 原有的异常处理会把它当成一次快速失败）。
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+
+from .config import BREAKER
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """站点处于熔断状态，请求未发出。"""
+
+
+class CircuitBreaker:
+    def __init__(self, site: str, failure_threshold: int = 5, error_rate: float = 0.5,
+                 window: int = 20, min_calls: int = 10, cooldown: float = 60.0):
+        self.site = site
+        self.failure_threshold = int(failure_threshold)
+        self.error_rate = float(error_rate)
+        self.min_calls = int(min_calls)
+        self.cooldown = float(cooldown)
+        self._lock = threading.Lock()
+        self._outcomes: deque = deque(maxlen=int(window))   # True=成功
+        self._state = CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.total_failures = 0
+        self.total_successes = 0
+        self.trips = 0
+        self.rejected = 0
+
+    # ---------- 放行判断 ----------
+    def allow(self) -> bool:
+        """发请求前调用；open 冷却期内拒绝，到期后只放一个探测请求。"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def is_open(self) -> bool:
+        """只读判断（不占用探测名额）：当前是否应整站跳过。"""
+        with self._lock:
+            if self._state == OPEN:
+                return time.monotonic() - self._opened_at < self.cooldown
+            if self._state == HALF_OPEN:
+                return self._probe_in_flight
+            return False
+
+    # ---------- 结果记录 ----------
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self._outcomes.append(True)
+            self._consecutive = 0
+            if self._state == HALF_OPEN:
+                self._outcomes.clear()
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self._outcomes.append(False)
+            self._consecutive += 1
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+            if self._state == CLOSED:
+                n = len(self._outcomes)
+                fails = n - sum(self._outcomes)
+                if (self._consecutive >= self.failure_threshold
+                        or (n >= self.min_calls and fails / n >= self.error_rate)):
+                    self._trip()
+
+    def _trip(self):
+        self._opened_at = time.monotonic()
+        self.trips += 1
+        self._transition(OPEN)
+
+    def _transition(self, new_state: str):
+        if new_state == self._state:
+            return
+        print(f"[breaker] {self.site}: {self._state} → {new_state}"
+              + (f"（{self.cooldown:.0f}s 后探测）" if new_state == OPEN else ""))
+        self._state = new_state
+        self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            n = len(self._outcomes)
+            retry_in: Optional[float] = None
+            if self._state == OPEN:
+                retry_in = max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive,
+                "window_error_rate": round((n - sum(self._outcomes)) / n, 2) if n else 0.0,
+                "failures": self.total_failures,
+                "successes": self.total_successes,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "retry_in_s": round(retry_in, 1) if retry_in is not None else None,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(site: str) -> CircuitBreaker:
+    with _breakers_lock:
+        br = _breakers.get(site)
+        if br is None:
+            br = _breakers[site] = CircuitBreaker(site, **BREAKER)
+        return br
+
+
+def breaker_states() -> Dict[str, dict]:
+    with _breakers_lock:
+        items = list(_breakers.items())
+    return {site: br.snapshot() for site, br in items}
@@ -0,0 +1,239 @@
+# app/bulk.py
+"""
+批量写库：一次处理一批 BookDetail，替代逐本 SELECT → flush → 逐字段赋值 → 单独提交。
+
+- 有 ISBN 的书：多行 INSERT ... ON CONFLICT(isbn13) DO UPDATE（校验不过的 ISBN 退回按 isbn），
+  规则与 _get_or_create_book_by_detail 相同——新值非空才覆盖（文本去空白后为空、数字为 0 视为空）；
+  isbn13 查不到但原始 isbn 已存在的（isbn13 为空的旧行），按主键 UPDATE，免得撞 isbn 唯一约束整块回滚；
+- 无 ISBN 的书：逐条新建（不按标题合并）；
+- clc 为空的书统一分类（CIP + 规则法）后按主键批量 UPDATE，拿不准的提交后交给 LLM 阶段（app/llm_stage.py）；Source 用 executemany 插入（保留策略见 app/sources.py）；
+- 按 BULK_CHUNK 条一个事务提交（经单写线程），bulk_stats() 给出累计 rows/s。
+"""
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from time import perf_counter
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .classify import classify_clc_many
+from .llm_stage import defer_clc, should_defer
+from .config import BULK_CHUNK
+from .covers import get_cover_queue
+from .db import Book
+from .isbn import to_isbn13
+from .sources import add_sources, source_row
+from .dims import sync_book_dims
+from .writer import run_write
+from . import negcache
+
+# (query_norm, site, BookDetail)
+BulkItem = Tuple[str, str, object]
+
+_TEXT_COLUMNS = ("title_std", "authors_std", "publisher", "edition", "summary",
+                 "author_bio", "language", "cip")
+_INT_COLUMNS = ("pub_year", "pages")
+
+_RETURNING = (Book.id, Book.isbn, Book.isbn13, Book.cover_path, Book.clc, Book.created_at,
+              Book.title_std, Book.authors_std, Book.summary, Book.cip)
+
+# 新书没给语言时的缺省值（同 Book.language 的 default）
+_DEFAULT_LANGUAGE = Book.__table__.c.language.default.arg
+
+# 单条 INSERT 的行数上限（SQLite 绑定参数个数有限）
+_ROWS_PER_STATEMENT = 200
+
+
+def _row_from_detail(d, now: datetime) -> dict:
+    def _s(v):
+        v = (v or "").strip() if isinstance(v, str) else v
+        return v or None
+
+    isbn = _s(d.isbn)
+    return {
+        "isbn": isbn,
+        "isbn13": to_isbn13(isbn),
+        "title_std": (d.title or "").strip(),
+        "authors_std": ",".join(d.authors or []) or None,
+        "publisher": _s(d.publisher),
+        "pub_year": d.pub_year or None,
+        "edition": _s(d.edition),
+        "pages": d.pages or None,
+        "summary": _s(d.summary),
+        "author_bio": _s(d.author_bio),
+        "language": _s(d.language),
+        "cip": _s(getattr(d, "cip", None)),
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _merge_rows(old: dict, new: dict) -> dict:
+    """同一批里 ISBN 重复：后来的非空值覆盖先前的。"""
+    merged = dict(old)
+    for k, v in new.items():
+        if v not in (None, "", 0):
+            merged[k] = v
+    return merged
+
+
+def _key(row: dict) -> Optional[Tuple[str, str]]:
+    """upsert 的冲突列及其值：优先规范 ISBN-13。"""
+    if row["isbn13"]:
+        return "isbn13", row["isbn13"]
+    if row["isbn"]:
+        return "isbn", row["isbn"]
+    return None
+
+
+def _upsert_stmt(rows: List[dict], conflict: str):
+    stmt = sqlite_insert(Book).values(rows)
+    ex = stmt.excluded
+    set_ = {c: func.coalesce(func.nullif(func.trim(ex[c]), ""), getattr(Book, c))
+            for c in _TEXT_COLUMNS}
+    set_.update({c: func.coalesce(func.nullif(ex[c], 0), getattr(Book, c)) for c in _INT_COLUMNS})
+    set_["updated_at"] = ex.updated_at
+    return stmt.on_conflict_do_update(index_elements=[conflict], set_=set_).returning(*_RETURNING)
+
+
+def _update_stmt(book_id: int, row: dict):
+    """按主键合并一行，覆盖规则同 _upsert_stmt；isbn/isbn13 不动。"""
+    values = {c: func.coalesce(func.nullif(func.trim(row[c]), ""), getattr(Book, c))
+              for c in _TEXT_COLUMNS}
+    values.update({c: func.coalesce(func.nullif(row[c], 0), getattr(Book, c)) for c in _INT_COLUMNS})
+    values["updated_at"] = row["updated_at"]
+    return update(Book).where(Book.id == book_id).values(values).returning(*_RETURNING)
+
+
+def _ids_by_raw_isbn(session, by_key: dict) -> dict:
+    """
+    按 isbn13 upsert 的行里，isbn13 查不到、原始 isbn 却已被某行占用的
+    （_migrate_isbn13 留下的 isbn13 为空的重复行等）：直接插入会撞 books.isbn 唯一约束。
+    返回 {key: 已有 book_id}，这些行改走 _update_stmt。
+    """
+    keys = [k for k in by_key if k[0] == "isbn13"]
+    out: dict = {}
+    for i in range(0, len(keys), _ROWS_PER_STATEMENT):
+        part = keys[i:i + _ROWS_PER_STATEMENT]
+        known = set(session.scalars(select(Book.isbn13).where(Book.isbn13.in_([v for _c, v in part]))))
+        raw = {by_key[k]["isbn"]: k for k in part if k[1] not in known}
+        if raw:
+            for book_id, isbn in session.execute(select(Book.id, Book.isbn).where(Book.isbn.in_(list(raw)))):
+                out[raw[isbn]] = book_id
+    return out
+
+
+def upsert_details(session, items: Sequence[BulkItem], force: bool = False,
+                   deferred: Optional[list] = None) -> List[Tuple[int, Optional[str]]]:
+    """
+    写线程里执行：写入一批详情，返回与 items 对齐的 [(book_id, 待下载封面 URL 或 None)]。
+    force=True 时顺带清掉对应 (query, site) 的未命中记录。
+    规则法拿不准、需要 LLM 复核的书追加到 deferred（提交后交给 defer_clc()）。
+    """
+    now = datetime.utcnow()
+    by_key: dict = {}
+    for _q, _site, d in items:
+        row = _row_from_detail(d, now)
+        key = _key(row)
+        if key:
+            by_key[key] = _merge_rows(by_key[key], row) if key in by_key else row
+
+    # ---- 有 ISBN：多行 upsert（按冲突列分组）----
+    books: dict = {}      # (冲突列, 值) → RETURNING 行
+    rebound = _ids_by_raw_isbn(session, by_key)
+    for key, book_id in rebound.items():
+        books[key] = session.execute(_update_stmt(book_id, by_key[key])).one()
+    for conflict in ("isbn13", "isbn"):
+        rows = [row for key, row in by_key.items() if key[0] == conflict and key not in rebound]
+        for i in range(0, len(rows), _ROWS_PER_STATEMENT):
+            for r in session.execute(_upsert_stmt(rows[i:i + _ROWS_PER_STATEMENT], conflict)):
+                books[(conflict, getattr(r, conflict))] = r
+
+    # ---- 逐条对齐结果；无 ISBN 的直接新建 ----
+    resolved = []
+    for _q, _site, d in items:
+        row = _row_from_detail(d, now)
+        key = _key(row)
+        if key:
+            resolved.append(books[key])
+        else:
+            row["language"] = row["language"] or _DEFAULT_LANGUAGE
+            resolved.append(session.execute(insert(Book).values(row).returning(*_RETURNING)).one())
+
+    # 本批新插入（created_at 即本批时间戳）且没给语言的，补缺省语言；已有的书不动
+    fresh = [r.id for r in books.values() if r.created_at == now]
+    if fresh:
+        session.execute(
+            update(Book).where(Book.id.in_(fresh), Book.language.is_(None))
+            .values(language=_DEFAULT_LANGUAGE)
+            .execution_options(synchronize_session=False)
+        )
+
+    # ---- 自动分类（clc 为空时），按主键批量 UPDATE；事务里不调 LLM ----
+    todo = list({r.id: r for r in resolved if not r.clc}.values())
+    inputs = [(r.title_std or "", r.authors_std.split(",") if r.authors_std else [], r.summary or "", r.cip)
+              for r in todo]
+    results = classify_clc_many(inputs, use_llm=False)
+    clc_updates = []
+    for r, (title, authors, summary, _cip), res in zip(todo, inputs, results):
+        code = (res[0] or "").strip()
+        if not code:
+            continue
+        clc_updates.append({"id": r.id, "clc": code})
+        if deferred is not None and should_defer(res):
+            deferred.append((r.id, code, (title, authors, summary)))
+    if clc_updates:
+        session.execute(update(Book), clc_updates)
+
+    # ---- Source：executemany（内容未变的不追加，并按保留条数裁剪）----
+    add_sources(session, [source_row(r.id, site, d) for (_q, site, d), r in zip(items, resolved)])
+
+    # 作者/出版社维表
+    sync_book_dims(session, {r.id for r in resolved})
+
+    if force:
+        for q, site, _d in items:
+            negcache.forget(session, q, site)
+
+    return [(r.id, None if r.cover_path else getattr(d, "cover_url", None))
+            for (_q, _s, d), r in zip(items, resolved)]
+
+
+# ---------- 分块提交 + 吞吐统计 ----------
+_stats = {"rows": 0, "chunks": 0, "seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+def bulk_ingest(items: Sequence[BulkItem], chunk: Optional[int] = None, force: bool = False) -> List[int]:
+    """按 chunk 条一个事务写入，返回与 items 对齐的 book_id 列表；封面在提交后入队。"""
+    size = max(1, int(chunk or BULK_CHUNK))
+    ids: List[int] = []
+    for i in range(0, len(items), size):
+        part = list(items[i:i + size])
+        t0 = perf_counter()
+        deferred: list = []
+        res = run_write(upsert_details, part, force, deferred)
+        dt = perf_counter() - t0
+        with _stats_lock:
+            _stats["rows"] += len(part)
+            _stats["chunks"] += 1
+            _stats["seconds"] += dt
+        print(f"[bulk] {len(part)} rows in {dt * 1000:.0f}ms ({len(part) / dt if dt else 0:.0f} rows/s)")
+        queue = get_cover_queue()
+        for book_id, cover_url in res:
+            if cover_url:
+                queue.submit(book_id, cover_url)
+        defer_clc(deferred)
+        ids.extend(book_id for book_id, _ in res)
+    return ids
+
+
+def bulk_stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    out["seconds"] = round(out["seconds"], 3)
+    out["rows_per_s"] = round(out["rows"] / out["seconds"], 1) if out["seconds"] else 0.0
+    return out
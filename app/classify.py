@@ -4,44 +4,40 @@ AI/规则 混合的中图法（CLC）分类器。
 
 用法（管道中已集成）：
     code, label, score, src = classify_clc(title, authors, summary, cip=None)
+    results = classify_clc_many([(title, authors, summary, cip), ...])   # 批量，见文件末尾
 
 策略：
-1) 若有 CIP 且看起来像 CLC（如 "TP391.1"），直接用其前缀映射到门类（T 工业技术 → "TP..." 保留原样）。
-2) 否则做“弱监督规则分类”（关键词打分），给出 code/label/score。
-3) 若本地部署了 LLM，可在此处接入（已留接口），用 LLM 对“标题+作者+摘要”进行判断，解析回 CLC 代码。
-   - 为了避免无网络/无 key 失败，默认不开启；可按注释启用。
+1) 若有 CIP 且含有效的 CLC 号（如 "TP391.1"，字母部分须是类目表里的真实类目），直接采用，保留完整细分。
+2) 训练过本地模型（app/clcmodel.py，需 numpy）时，用它预测；概率够高直接采用，source="model"。
+3) 否则做“弱监督规则分类”（关键词打分），给出 code/label/score。
+4) 配置了 LLM（OpenAI 兼容接口，见 config.LLM_*）时，用 LLM 对“标题+作者+摘要”进行判断，解析回 CLC 代码；
+   - 结果按 (模型, 提示版本, 标题, 作者, 简介) 持久缓存，批量时多本书拼成一个提示；
+   - 未配置 API Key 时不启用，避免无网络/无 key 失败。
+返回的 label 是最细一级的类名（类目表 app/clc_table.tsv 的最长有效前缀，见 app/clctree.py）。
 """
 
 from __future__ import annotations
-import os
+import json
 import re
-from typing import Dict, List, Tuple, Optional
-
-# ======= CLC 顶层门类（A-Z）与中文名 =======
-CLC_LABELS: Dict[str, str] = {
-    "A": "马克思主义、列宁主义、毛泽东思想、邓小平理论",
-    "B": "哲学、宗教",
-    "C": "社会科学总论",
-    "D": "政治、法律",
-    "E": "军事",
-    "F": "经济",
-    "G": "文化、科学、教育、体育",
-    "H": "语言、文字",
-    "I": "文学",
-    "J": "艺术",
-    "K": "历史、地理",
-    "N": "自然科学总论",
-    "O": "数理科学和化学",
-    "P": "天文学、地球科学",
-    "Q": "生物科学",
-    "R": "医药、卫生",
-    "S": "农业科学",
-    "T": "工业技术",
-    "U": "交通运输",
-    "V": "航空、航天",
-    "X": "环境科学、安全科学",
-    "Z": "综合性图书",
-}
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .clcmodel import book_text, get_clc_model
+from .clctree import CLC_BUCKETS, CLC_LABELS, UNCLASSIFIED, get_clc_tree, normalize_code  # noqa: F401  门类表保持原导入路径可用
+from .config import CLC_MODEL_CONFIDENT, LLM_BATCH_SIZE, LLM_MODEL, LLM_TIMEOUT
+from .kwmatch import KeywordMatcher
+from .llm import LLMError, cache_key, chat, get_llm_cache, llm_configured
+
+
+# ======= 门类 / 大类（类目层级见 app/clctree.py）=======
+def clc_bucket(clc_code: Optional[str]) -> str:
+    """CLC 代码 → 大类名（按所属门类；不是有效分类号的归“未分类”）。"""
+    return get_clc_tree().bucket(clc_code)
+
+
+def bucket_heads(bucket: str) -> List[str]:
+    """某大类包含的 CLC 首字母。"""
+    return sorted(h for h, name in CLC_BUCKETS.items() if name == bucket)
+
 
 # ======= 规则法：关键词 → 门类权重 =======
 # 说明：这只是“弱监督”打分表，命中越多分越高；你可以按自己馆藏不断增补。
@@ -70,9 +66,9 @@ KEYWORDS: Dict[str, List[str]] = {
     "Z": ["百科全书", "年鉴", "论文集", "综合", "工具书"],
 }
 
-# 正则：匹配看起来像 CLC/CIP 号，如 "TP391.1"、"H315.4"
-_CLC_RE = re.compile(r"\b([A-Z])[A-Z0-9]{0,2}(?:\.\d+)?", flags=re.I)
-_CIP_CLC_RE = re.compile(r"\b([A-Z])([A-Z0-9]{0,2})(?:\.\d+)?", flags=re.I)
+# 正则：看起来像 CLC 号的片段，如 "TP391.1"、"H315.4"、"I247.5"（字母部分最多两位）
+_CODE_RE = re.compile(r"([A-Z]{1,2})(\d+(?:\.\d+)*)?")
+_CIP_TOKEN_RE = re.compile(r"(?<![A-Z0-9])[A-Z]{1,2}(?:\d+(?:\.\d+)*)?(?![A-Z])")
 
 
 def _normalize(s: Optional[str]) -> str:
@@ -83,15 +79,35 @@ def _normalize(s: Optional[str]) -> str:
     return s
 
 
+# 每个命中的关键词（同一词多次出现只算一次）加 1.0；科教/技术类再稍微加成
+KEYWORD_WEIGHTS: Dict[str, float] = {code: 1.2 for code in ("T", "O", "Q", "R", "P", "S", "X")}
+
+_matcher: Optional[KeywordMatcher] = None
+
+
+def keyword_matcher() -> KeywordMatcher:
+    """KEYWORDS 编译成的 Aho–Corasick 自动机（首次使用时构建）。"""
+    global _matcher
+    if _matcher is None:
+        _matcher = KeywordMatcher(KEYWORDS)
+    return _matcher
+
+
+def reload_keywords() -> None:
+    """运行中增补了 KEYWORDS 后调用，下次打分时重建自动机。"""
+    global _matcher
+    _matcher = None
+
+
+def keyword_hits(text: str) -> Dict[str, Dict[str, List[int]]]:
+    """命中明细 {门类: {关键词: [位置…]}}，用于解释规则分类的依据。"""
+    return keyword_matcher().hits(text)
+
+
 def _score_by_keywords(text: str) -> Dict[str, float]:
-    text_lc = text.lower()
     scores: Dict[str, float] = {k: 0.0 for k in CLC_LABELS.keys()}
-    for code, kws in KEYWORDS.items():
-        for kw in kws:
-            if kw and kw.lower() in text_lc:
-                # 每次命中加 1.0；科教/技术类再稍微加成
-                base = 1.2 if code in ("T", "O", "Q", "R", "P", "S", "X") else 1.0
-                scores[code] += base
+    for code, kws in keyword_hits(text).items():
+        scores[code] = scores.get(code, 0.0) + KEYWORD_WEIGHTS.get(code, 1.0) * len(kws)
     return scores
 
 
@@ -102,23 +118,40 @@ def _pick_best(scores: Dict[str, float]) -> Tuple[str, float]:
 
 
 def _label(code: str) -> str:
-    return CLC_LABELS.get(code.upper(), "未知")
+    """最细一级的类名（按类目表的最长有效前缀：TP391.1 → “文字信息处理”）。"""
+    return get_clc_tree().label(code)
+
+
+def _valid_code(code) -> Optional[str]:
+    """
+    规范化分类号；字母部分必须是类目表里的真实类目（"TP"、"I"），否则 None。
+    数字部分原样保留（表只收常用类目，更细的号也是有效的，类名按最长有效前缀取）。
+    """
+    m = _CODE_RE.match(normalize_code(code))
+    if not m:
+        return None
+    resolved = get_clc_tree().resolve(m.group(0))
+    if not resolved or len(resolved) < len(m.group(1)):
+        return None
+    return m.group(0)
 
 
 def _from_cip(cip: Optional[str]) -> Optional[str]:
     """
-    若给了 CIP/CLC 字段（如 "TP391.1"），直接取其门类前缀（例如 "TP" / "T"）。
-    优先返回最长可见的前缀（保留细分），否则至少返回门类字母。
+    从 CIP/CLC 字段（如 "TP391.1"、"Ⅳ. ①I247.5"）里取第一个有效的分类号，保留完整细分。
+    只有字母没有数字的片段（如 "TP"）只在整个字段就是它时才认，免得把 ISBN 等字样当成分类号。
     """
     if not cip:
         return None
-    m = _CIP_CLC_RE.search(cip.upper())
-    if not m:
-        return None
-    # 返回如 "TP391.1" 的前两位字母数字前缀，保持更多信息；否则至少返回 "T"
-    head = m.group(0)
-    # 规范化：去掉多余空白
-    return head
+    text = " ".join(normalize_code(part) for part in cip.split())
+    for m in _CIP_TOKEN_RE.finditer(text):
+        tok = m.group(0)
+        if not any(ch.isdigit() for ch in tok) and tok != text.strip():
+            continue
+        code = _valid_code(tok)
+        if code:
+            return code
+    return None
 
 
 def classify_rule_based(title: str, authors: List[str] | None, summary: str | None) -> Tuple[str, str, float, str]:
@@ -150,49 +183,144 @@ def classify_rule_based(title: str, authors: List[str] | None, summary: str | No
     return code, _label(code), conf, "rule"
 
 
-# ======= 可选：LLM 分类接口（默认关闭，避免环境依赖） =======
-_ENABLE_LLM = True  # 如需启用，改成 True 并配置 API Key
-
-def classify_llm(title: str, authors: List[str] | None, summary: str | None) -> Optional[Tuple[str, str, float, str]]:
+# ======= 可选：本地模型（app/clcmodel.py；未安装 numpy 或未训练时不启用） =======
+def classify_model_many(
+    books: Sequence[Tuple[str, Optional[List[str]], Optional[str]]],
+) -> List[Optional[Tuple[str, str, float, str]]]:
     """
-    可选的 LLM 分类器：返回 (code, label, confidence, source)
-    注意：为保持通用性，这里仅提供一个参考实现（OpenAI）。
-    默认关闭，避免无网络/无 Key 报错。
+    本地模型批量预测 (title, authors, summary)；与输入等长，
+    模型不可用或概率 < CLC_MODEL_CONFIDENT 的为 None（交给后面的 LLM / 规则法）。
     """
-    if not _ENABLE_LLM:
-        return None
-
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        return None
-
-    try:
-        import openai  # pip install openai>=1.0
-        client = openai.OpenAI(api_key=api_key)  # type: ignore
-        prompt = f"""
-你是图书馆编目员，请根据《中图法》给出图书门类代码（仅给出代码，不要解释）。
-候选门类：{", ".join([f"{k}:{v}" for k,v in CLC_LABELS.items()])}
+    model = get_clc_model()
+    if model is None or not books:
+        return [None] * len(books)
+    preds = model.predict([book_text(t or "", a, s) for t, a, s in books])
+    return [(code, _label(code), round(p, 3), "model") if p >= CLC_MODEL_CONFIDENT else None
+            for code, p in preds]
+
+
+# ======= 可选：LLM 分类（OpenAI 兼容接口，见 app/llm.py；未配置 API Key 时不启用） =======
+_ENABLE_LLM = True
+# 提示词有实质改动时递增：旧的缓存结果随之失效
+CLC_PROMPT_VERSION = "clc-batch-v1"
+_LLM_SUMMARY_CHARS = 600
+
+LLMInput = Tuple[str, Optional[List[str]], Optional[str]]   # (title, authors, summary)
+
+
+def _llm_key(title: str, authors: Optional[List[str]], summary: Optional[str]) -> str:
+    return cache_key(LLM_MODEL, CLC_PROMPT_VERSION, title or "", [a.strip() for a in authors or []], summary or "")
+
+
+def _batch_prompt(books: Sequence[LLMInput]) -> str:
+    lines = [
+        "你是图书馆编目员，请根据《中图法》给下面每本书判断门类代码（如 T、TP、TP3）。",
+        "候选门类：" + ", ".join(f"{k}:{v}" for k, v in CLC_LABELS.items()),
+        "",
+    ]
+    for i, (title, authors, summary) in enumerate(books, 1):
+        lines.append(f"[{i}] 标题: {title or ''}")
+        lines.append(f"    作者: {', '.join(authors or [])}")
+        lines.append(f"    摘要: {(summary or '')[:_LLM_SUMMARY_CHARS]}")
+    lines += [
+        "",
+        '只输出 JSON，不要解释，格式：{"results": [{"i": 1, "clc": "TP3"}, ...]}',
+        f"每本书一项（共 {len(books)} 项，i 为上面的编号）；无法判断的给 \"Z\"。",
+    ]
+    return "\n".join(lines)
+
+
+_LINE_RE = re.compile(r"^\s*\[?(\d+)\]?\s*[:：.、)\]]\s*\"?([A-Za-z][A-Za-z0-9.]*)", re.M)
+
+
+def _parse_batch(text: str, n: int) -> Dict[int, str]:
+    """解析批量回复 → {编号(从 1 起): code}；先按 JSON 解析，不行再按“1: TP3”逐行兜底。"""
+    text = (text or "").strip()
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    out: Dict[int, str] = {}
+    data = None
+    for lo, hi in (("{", "}"), ("[", "]")):
+        a, b = text.find(lo), text.rfind(hi)
+        if a != -1 and b > a:
+            try:
+                data = json.loads(text[a:b + 1])
+                break
+            except ValueError:
+                continue
+    if isinstance(data, dict):
+        data = data.get("results", data.get("items"))
+    if isinstance(data, list):
+        for pos, item in enumerate(data, 1):
+            if isinstance(item, dict):
+                idx = item.get("i", item.get("id", pos))
+                code = item.get("clc", item.get("code"))
+            else:                      # ["TP3", "I2", ...] 按位置
+                idx, code = pos, item
+            try:
+                idx = int(idx)
+            except (TypeError, ValueError):
+                continue
+            code = _valid_code(code)
+            if code and 1 <= idx <= n:
+                out[idx] = code
+    if not out:
+        for m in _LINE_RE.finditer(text):
+            code = _valid_code(m.group(2))
+            if code and 1 <= int(m.group(1)) <= n:
+                out[int(m.group(1))] = code
+    return out
+
+
+def llm_enabled() -> bool:
+    return _ENABLE_LLM and llm_configured()
+
+
+def llm_lookup(books: Sequence[LLMInput]) -> Tuple[List[str], Dict[str, str]]:
+    """(每本书的缓存键, 缓存里已有的 {键: code})。"""
+    keys = [_llm_key(*b) for b in books]
+    cached = get_llm_cache().get_many(keys)
+    return keys, {k: v for k, v in cached.items() if isinstance(v, str)}
+
+
+def llm_request(part: Sequence[Tuple[str, LLMInput]], timeout=LLM_TIMEOUT) -> Dict[str, str]:
+    """把 [(缓存键, 书)] 拼成一个提示请求 LLM，解析后写入缓存，返回 {键: code}；请求失败抛 LLMError。"""
+    reply = chat([{"role": "user", "content": _batch_prompt([b for _k, b in part])}],
+                 model=LLM_MODEL, timeout=timeout)
+    got = _parse_batch(reply, len(part))
+    fresh = {part[idx - 1][0]: code for idx, code in got.items()}
+    get_llm_cache().put_many(fresh, LLM_MODEL, CLC_PROMPT_VERSION)
+    return fresh
+
+
+def llm_result(code: str) -> Tuple[str, str, float, str]:
+    # 置信度先给一个较高基线，后续可基于 logprobs 再细化
+    return code, _label(code), 0.85, "llm"
+
+
+def classify_llm_many(
+    books: Sequence[LLMInput],
+    batch_size: int = LLM_BATCH_SIZE,
+) -> List[Optional[Tuple[str, str, float, str]]]:
+    """
+    LLM 批量分类（同步）：先查持久缓存，未命中的每 batch_size 本拼成一个提示。
+    返回与输入等长的列表；未启用、请求失败或回复里没有该书时为 None。
+    入库流程不直接调用它，而是交给 app/llm_stage.py 的异步后台阶段。
+    """
+    if not llm_enabled() or not books:
+        return [None] * len(books)
+    keys, codes = llm_lookup(books)
+    todo = [(k, b) for k, b in dict(zip(keys, books)).items() if k not in codes]
+    for i in range(0, len(todo), max(1, batch_size)):
+        try:
+            codes.update(llm_request(todo[i:i + batch_size]))
+        except LLMError as e:
+            print("[classify] LLM 批量分类失败：", e)
+    return [llm_result(codes[k]) if k in codes else None for k in keys]
 
-标题: {title}
-作者: {", ".join(authors or [])}
-摘要: {summary or ""}
 
-仅输出一个代码，例如：T 或 TP 或 TP3；若无法判断请输出 Z。
-"""
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",  # 或任意你可用的模型
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-        )
-        text = (resp.choices[0].message.content or "").strip().upper()
-        m = _CLC_RE.search(text)
-        if not m:
-            return None
-        code = m.group(0)
-        # 置信度先给一个较高基线，后续可基于 logprobs/对话结构再细化
-        return code, _label(code[0]), 0.85, "llm"
-    except Exception:
-        return None
+def classify_llm(title: str, authors: List[str] | None, summary: str | None) -> Optional[Tuple[str, str, float, str]]:
+    """单本 LLM 分类：返回 (code, label, confidence, source)；走与批量相同的提示和缓存。"""
+    return classify_llm_many([(title, authors, summary)])[0]
 
 
 def classify_clc(
@@ -200,24 +328,78 @@ def classify_clc(
     authors: List[str] | None,
     summary: str | None,
     cip: Optional[str] = None,
+    use_llm: bool = True,
 ) -> Tuple[str, str, float, str]:
     """
     统一入口：
     1) CIP/CLC 号（若可解析） → 直接返回，source="cip"
-    2) LLM（可选，开启时） → 若输出有效代码 → source="llm"
-    3) 规则法 → source="rule"
+    2) 本地模型（已训练时） → 概率够高 → source="model"
+    3) LLM（可选，开启且 use_llm 时） → 若输出有效代码 → source="llm"
+    4) 规则法 → source="rule"
+    写事务里请传 use_llm=False，LLM 交给 app/llm_stage.py 在提交后再做。
     """
     # 1) CIP 优先
     code_from_cip = _from_cip(cip)
     if code_from_cip:
         code = code_from_cip
         # 门类取首字母映射中文名
-        return code, _label(code[0]), 0.95, "cip"
+        return code, _label(code), 0.95, "cip"
 
-    # 2) LLM（可选）
-    llm_res = classify_llm(title, authors, summary)
+    # 2) 本地模型
+    model_res = classify_model_many([(title, authors, summary)])[0]
+    if model_res:
+        return model_res
+
+    # 3) LLM（可选）
+    llm_res = classify_llm(title, authors, summary) if use_llm else None
     if llm_res:
         return llm_res
 
-    # 3) 规则法
+    # 4) 规则法
     return classify_rule_based(title, authors, summary)
+
+
+# ======= 批量分类 =======
+# 规则法置信度达到该值就直接采用，不再交给 LLM 等慢速后端
+CLC_RULE_CONFIDENT = 0.8
+
+ClassifyInput = Tuple[str, Optional[List[str]], Optional[str], Optional[str]]   # (title, authors, summary, cip)
+
+
+def classify_clc_many(
+    books: Sequence[ClassifyInput],
+    use_llm: bool = True,
+) -> List[Tuple[str, str, float, str]]:
+    """
+    批量版 classify_clc：books 为 (title, authors, summary, cip) 序列，结果按输入顺序返回。
+    1) 有 CIP 的直接定；
+    2) 其余整批交给本地模型（一次向量化推理），概率够高的直接定；
+    3) 剩下的整批走规则法（共用一个关键词自动机），置信度 ≥ CLC_RULE_CONFIDENT 的直接定；
+    4) 只有剩下“拿不准”的才交给 LLM（批量提示 + 持久缓存；use_llm=False 或 LLM 不可用时沿用规则结果）。
+    """
+    results: List[Optional[Tuple[str, str, float, str]]] = [None] * len(books)
+    rest: List[int] = []
+    for i, (_title, _authors, _summary, cip) in enumerate(books):
+        code = _from_cip(cip)
+        if code:
+            results[i] = (code, _label(code), 0.95, "cip")
+        else:
+            rest.append(i)
+
+    undecided: List[int] = []
+    model_res = classify_model_many([books[i][:3] for i in rest])
+    for i, res in zip(rest, model_res):
+        if res:
+            results[i] = res
+            continue
+        title, authors, summary, _cip = books[i]
+        results[i] = classify_rule_based(title or "", authors, summary)
+        if results[i][2] < CLC_RULE_CONFIDENT:
+            undecided.append(i)
+
+    if use_llm and undecided:
+        llm_res = classify_llm_many([(books[i][0] or "", books[i][1], books[i][2]) for i in undecided])
+        for i, res in zip(undecided, llm_res):
+            if res:
+                results[i] = res
+    return results  # type: ignore[return-value]
@@ -0,0 +1,325 @@
+# app/clcmodel.py
+"""
+本地中图法分类模型：字符 n-gram TF-IDF + 线性分类器（多分类逻辑回归），用馆藏自己的标注训练。
+
+离线时原先只有规则法的关键词表，LLM 又要联网；而库里已有大量 CIP 给出分类号的书，
+正好当训练集。这里：
+
+- 特征：标题/作者/简介规范化后取字符 1~3-gram，次线性 tf（1+log tf）× 平滑 idf，按行 L2 归一；
+  词表按文档频率截断（min_df / max_features）；
+- 分类器：softmax 回归，小批量 Adam + L2 正则，只用 numpy（没有 scipy/scikit-learn 也能跑）；
+- 推理是批量向量化的：一批书的特征拼成 CSR 形式的 (列号, 值, 行偏移)，
+  W[列号] × 值 后按行 np.add.reduceat 求和，分块进行（限制中间矩阵占用的内存）；
+- 类别：门类（T 类取两字母，如 TP），样本足够的细到下一位（如 I2、TP3），
+  不足 CLC_MODEL_MIN_CLASS 的细类并回门类；
+- 模型存为 data/clc_model.npz，首次用到时加载，文件更新后（重新训练）自动换新。
+
+numpy 是可选依赖：未安装或还没训练时 get_clc_model() 返回 None，分类流程照旧走 LLM / 规则法。
+训练与评估见 scripts/train_clc_model.py、scripts/bench_clc_model.py。
+"""
+from __future__ import annotations
+
+import json
+import math
+import random
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:  # 可选依赖
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .config import CLC_MODEL_MIN_CLASS, CLC_MODEL_PATH
+
+MODEL_FORMAT = 1
+PREDICT_BLOCK = 64                # 推理时每块的行数（特征提取的中间列表）
+LOGITS_NNZ = 8192                 # 打分时每段的非零元数上限：中间矩阵约 LOGITS_NNZ × 类别数 × 4 字节
+NGRAM_RANGE = (1, 3)
+_SUMMARY_CHARS = 400
+_PUNCT_RE = re.compile(r"[\s　,，.。;；:：!！?？、·\-—_()（）\[\]【】《》<>〈〉\"'“”‘’/\\|]+")
+
+
+def book_text(title: str, authors: Optional[Sequence[str]], summary: Optional[str]) -> str:
+    """模型输入：标题权重最高，重复一次；简介只取开头一段。"""
+    title = (title or "").strip()
+    parts = [title, title, " ".join(a for a in (authors or []) if a), (summary or "")[:_SUMMARY_CHARS]]
+    return " ".join(p for p in parts if p)
+
+
+def _grams(text: str) -> List[str]:
+    # 标点/空白切成片段，片段内取字符 n-gram（不跨片段）
+    out: List[str] = []
+    lo, hi = NGRAM_RANGE
+    for seg in _PUNCT_RE.split(text.lower()):
+        for n in range(lo, hi + 1):
+            out.extend(seg[i:i + n] for i in range(len(seg) - n + 1))
+    return out
+
+
+def label_of(code: Optional[str], depth: int = 2) -> Optional[str]:
+    """分类号截到第 depth 级：depth=1 为门类（"I"、"TP"），depth=2 再多一位（"I2"、"TP3"）。"""
+    code = (code or "").strip().upper()
+    if not code or not code[0].isalpha():
+        return None
+    n = depth + (1 if code[0] == "T" and len(code) > 1 and code[1].isalpha() else 0)
+    return code[:n]
+
+
+def training_labels(codes: Sequence[str], min_class: int = CLC_MODEL_MIN_CLASS) -> List[Optional[str]]:
+    """细类样本够 min_class 才保留，否则并回门类；门类也不够的返回 None（不参与训练）。"""
+    fine = [label_of(c, 2) for c in codes]
+    counts = Counter(fine)
+    labels = [f if f and counts[f] >= min_class else label_of(c, 1) for f, c in zip(fine, codes)]
+    counts = Counter(labels)
+    return [lb if lb and counts[lb] >= min_class else None for lb in labels]
+
+
+def labelled_books(session, all_labels: bool = False) -> Tuple[List[str], List[str]]:
+    """
+    训练/评估数据：(文本, 分类号)。缺省只取 CIP 里能解析出分类号的书（标注可靠）；
+    all_labels=True 时再加上 clc 已有值的书（可能含规则法/LLM 的结果）。
+    """
+    from sqlalchemy import or_, select
+    from .classify import _from_cip
+    from .db import Book
+
+    cond = or_(Book.cip.isnot(None), Book.clc.isnot(None)) if all_labels else Book.cip.isnot(None)
+    texts: List[str] = []
+    codes: List[str] = []
+    stmt = select(Book.title_std, Book.authors_std, Book.summary, Book.cip, Book.clc).where(cond)
+    for r in session.execute(stmt.execution_options(yield_per=2000)):
+        code = _from_cip(r.cip) or ((r.clc or "").strip() if all_labels else None)
+        if not code:
+            continue
+        texts.append(book_text(r.title_std or "", r.authors_std.split(",") if r.authors_std else [], r.summary))
+        codes.append(code)
+    return texts, codes
+
+
+class CLCModel:
+    def __init__(self, vocab: Dict[str, int], idf, W, b, classes: List[str], meta: Optional[dict] = None):
+        self.vocab = vocab
+        self.idf = idf
+        self.W = W                    # (特征数, 类别数)
+        self.b = b                    # (类别数,)
+        self.classes = list(classes)
+        self.meta = meta or {}
+
+    # ---------- 特征 ----------
+    def transform(self, texts: Sequence[str]):
+        """TF-IDF，返回 CSR 三元组 (列号, 值, 行偏移)。"""
+        vocab = self.vocab
+        cols: List[int] = []
+        tfs: List[int] = []
+        indptr = [0]
+        for text in texts:
+            cnt = Counter(j for j in map(vocab.get, _grams(text)) if j is not None)
+            cols.extend(cnt.keys())
+            tfs.extend(cnt.values())
+            indptr.append(len(cols))
+        idx = np.asarray(cols, dtype=np.int64)
+        indptr = np.asarray(indptr, dtype=np.int64)
+        val = (1.0 + np.log(np.asarray(tfs, dtype=np.float32))) * self.idf[idx]
+        starts, nonempty = indptr[:-1], indptr[1:] > indptr[:-1]
+        if len(idx):
+            norms = np.ones(len(texts), dtype=np.float32)
+            norms[nonempty] = np.sqrt(np.add.reduceat(val * val, starts[nonempty]))
+            val /= np.repeat(norms, np.diff(indptr))
+        return idx, val.astype(np.float32), indptr
+
+    def _logits(self, idx, val, indptr):
+        n = len(indptr) - 1
+        out = np.tile(self.b, (n, 1))
+        # 按非零元数分段（每段约 LOGITS_NNZ 个，至少一行），W[列号] 取出的中间矩阵大小有上限
+        lo = 0
+        while lo < n:
+            hi = max(lo + 1, int(np.searchsorted(indptr, indptr[lo] + LOGITS_NNZ, side="right")) - 1)
+            hi = min(hi, n)
+            a, z = indptr[lo], indptr[hi]
+            if z > a:
+                ptr = indptr[lo:hi + 1] - a
+                starts, nonempty = ptr[:-1], ptr[1:] > ptr[:-1]
+                out[lo:hi][nonempty] += np.add.reduceat(self.W[idx[a:z]] * val[a:z, None], starts[nonempty], axis=0)
+            lo = hi
+        return out
+
+    # ---------- 推理 ----------
+    def predict_proba(self, texts: Sequence[str]):
+        # 按 PREDICT_BLOCK 行一块算，_logits 里再按非零元数分段：W[列号] 取出的是
+        # (非零元数 × 类别数) 的稠密矩阵，整批 500 本、上百个类别时会占到几百 MB
+        out = np.empty((len(texts), len(self.classes)), dtype=np.float32)
+        for i in range(0, len(texts), PREDICT_BLOCK):
+            out[i:i + PREDICT_BLOCK] = _softmax(self._logits(*self.transform(texts[i:i + PREDICT_BLOCK])))
+        return out
+
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """[(类别, 概率)]，与 texts 对齐。"""
+        if not texts:
+            return []
+        p = self.predict_proba(texts)
+        best = p.argmax(axis=1)
+        return [(self.classes[j], float(p[i, j])) for i, j in enumerate(best)]
+
+    # ---------- 存取 ----------
+    def save(self, path=CLC_MODEL_PATH) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        terms = [""] * len(self.vocab)
+        for t, j in self.vocab.items():
+            terms[j] = t
+        tmp = path.with_name(path.name + ".part")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f, terms=np.asarray(terms), idf=self.idf, W=self.W, b=self.b,
+                classes=np.asarray(self.classes),
+                meta=np.asarray(json.dumps({**self.meta, "format": MODEL_FORMAT}, ensure_ascii=False)),
+            )
+        tmp.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path=CLC_MODEL_PATH) -> "CLCModel":
+        with np.load(Path(path), allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("format") != MODEL_FORMAT:
+                raise ValueError(f"模型格式 {meta.get('format')} 与当前版本 {MODEL_FORMAT} 不符，请重新训练")
+            vocab = {str(t): j for j, t in enumerate(z["terms"])}
+            return cls(vocab, z["idf"], z["W"], z["b"], [str(c) for c in z["classes"]], meta)
+
+
+def _softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def train(
+    texts: Sequence[str],
+    labels: Sequence[str],
+    epochs: int = 20,
+    lr: float = 0.05,
+    l2: float = 1e-6,
+    batch: int = 256,
+    min_df: int = 2,
+    max_features: int = 100_000,
+    seed: int = 0,
+    progress: Optional[Callable[[int, float], None]] = None,
+) -> CLCModel:
+    """从 (文本, 类别) 训练一个模型；progress(epoch, 平均损失) 每轮回调一次。"""
+    if np is None:
+        raise RuntimeError("本地分类模型需要安装 numpy")
+    if len(texts) != len(labels) or not texts:
+        raise ValueError("训练样本为空或文本与类别数不一致")
+
+    # 词表：文档频率 ≥ min_df，取最常见的 max_features 个
+    df = Counter()
+    for t in texts:
+        df.update(set(_grams(t)))
+    kept = sorted((g for g, c in df.items() if c >= min_df), key=lambda g: (-df[g], g))[:max_features]
+    vocab = {g: j for j, g in enumerate(kept)}
+    n = len(texts)
+    idf = np.asarray([math.log((1 + n) / (1 + df[g])) + 1.0 for g in kept], dtype=np.float32)
+
+    classes = sorted(set(labels))
+    cls_idx = {c: j for j, c in enumerate(classes)}
+    y = np.asarray([cls_idx[c] for c in labels], dtype=np.int64)
+    model = CLCModel(vocab, idf, np.zeros((len(vocab), len(classes)), dtype=np.float32),
+                     np.zeros(len(classes), dtype=np.float32), classes)
+    idx, val, indptr = model.transform(texts)
+
+    # 小批量 Adam；梯度 X^T (P - Y) 用 np.add.at 散加到本批出现过的特征行上，
+    # 也只更新这些行（稀疏/惰性 Adam，每步代价与本批非零元数成正比，与词表大小无关）
+    rng = np.random.default_rng(seed)
+    mW, vW = np.zeros_like(model.W), np.zeros_like(model.W)
+    mb, vb = np.zeros_like(model.b), np.zeros_like(model.b)
+    beta1, beta2, eps, step = 0.9, 0.999, 1e-8, 0
+    for epoch in range(1, epochs + 1):
+        order = rng.permutation(n)
+        total = 0.0
+        for s in range(0, n, batch):
+            rows = order[s:s + batch]
+            lens = indptr[rows + 1] - indptr[rows]
+            take = np.concatenate([np.arange(indptr[r], indptr[r + 1]) for r in rows])
+            sub_ptr = np.concatenate([[0], np.cumsum(lens)])
+            b_idx, b_val = idx[take], val[take]
+            p = _softmax(model._logits(b_idx, b_val, sub_ptr))
+            yb = y[rows]
+            total += float(-np.log(p[np.arange(len(rows)), yb] + 1e-12).sum())
+            d = p
+            d[np.arange(len(rows)), yb] -= 1.0
+            d /= len(rows)
+            touched, inv = np.unique(b_idx, return_inverse=True)
+            gW = l2 * model.W[touched]
+            np.add.at(gW, inv, b_val[:, None] * np.repeat(d, lens, axis=0))
+            gb = d.sum(axis=0)
+            step += 1
+            c1, c2 = 1 - beta1 ** step, 1 - beta2 ** step
+            mW[touched] = beta1 * mW[touched] + (1 - beta1) * gW
+            vW[touched] = beta2 * vW[touched] + (1 - beta2) * gW * gW
+            model.W[touched] -= lr * (mW[touched] / c1) / (np.sqrt(vW[touched] / c2) + eps)
+            mb[:] = beta1 * mb + (1 - beta1) * gb
+            vb[:] = beta2 * vb + (1 - beta2) * gb * gb
+            model.b -= lr * (mb / c1) / (np.sqrt(vb / c2) + eps)
+        if progress:
+            progress(epoch, total / n)
+    model.meta = {"samples": n, "features": len(vocab), "classes": len(classes), "epochs": epochs}
+    return model
+
+
+def split_holdout(n: int, frac: float, seed: int = 0) -> Tuple[List[int], List[int]]:
+    """随机切出 frac 比例做验证集，返回 (训练下标, 验证下标)。"""
+    order = list(range(n))
+    random.Random(seed).shuffle(order)
+    k = int(n * frac)
+    return order[k:], order[:k]
+
+
+def evaluate(model: CLCModel, texts: Sequence[str], codes: Sequence[str], threshold: float = 0.0) -> dict:
+    """
+    验证集指标：门类准确率（head_acc）、与类别同粒度的准确率（acc）；
+    只看概率 ≥ threshold 的那部分时的覆盖率（coverage）和门类准确率（confident_acc）。
+    """
+    preds = model.predict(texts)
+    n = len(preds)
+    if not n:
+        return {"n": 0}
+    head = [label_of(p, 1) == label_of(c, 1) for (p, _pr), c in zip(preds, codes)]
+    same = [(c or "").upper().startswith(p) for (p, _pr), c in zip(preds, codes)]
+    sure = [h for h, (_p, pr) in zip(head, preds) if pr >= threshold]
+    return {
+        "n": n,
+        "head_acc": round(sum(head) / n, 4),
+        "acc": round(sum(same) / n, 4),
+        "coverage": round(len(sure) / n, 4),
+        "confident_acc": round(sum(sure) / len(sure), 4) if sure else 0.0,
+    }
+
+
+# ---------- 懒加载 ----------
+_model: Optional[CLCModel] = None
+_model_mtime: Optional[float] = None
+_model_lock = threading.Lock()
+
+
+def get_clc_model(path=CLC_MODEL_PATH) -> Optional[CLCModel]:
+    """当前模型；未安装 numpy、还没训练或加载失败时为 None。模型文件更新后下次调用自动重新加载。"""
+    global _model, _model_mtime
+    if np is None:
+        return None
+    try:
+        mtime = Path(path).stat().st_mtime
+    except OSError:
+        return None
+    with _model_lock:
+        if _model_mtime != mtime:
+            _model_mtime = mtime
+            try:
+                _model = CLCModel.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print("[clcmodel] 模型加载失败：", e)
+                _model = None
+        return _model
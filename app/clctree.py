@@ -0,0 +1,189 @@
+# app/clctree.py
+"""
+中图法类目层级：门类 + app/clc_table.tsv 里的二、三级（及更细的常用）类目，装进一棵前缀 trie。
+
+原先只有 22 个门类的中文名，分类号只看首字母：TP391 只显示“工业技术”，
+CIP 里随便一段像分类号的字母数字（哪怕不是真实类目）都会被当成结果。这里：
+
+- resolve(code)：最长有效前缀，"TP391.41" → "TP391.4"，"I247.57" → "I247.5"，"W12" → None；
+- path(code)：从门类到该类的 [(分类号, 类名)…]，path_label() 拼成“工业技术 › … › 信息处理”；
+- bucket(code)：展示用大类（UI 卡片与分面共用，按门类映射，见 CLC_BUCKETS）；
+- 表在第一次用到时才读入；trie 每个节点只有 子节点 dict + 类名 两个槽位。
+
+    tree = get_clc_tree()
+    tree.resolve("tp312.8")      # → "TP312"
+    tree.path_label("TP312")     # → "工业技术 › 自动化技术、计算机技术 › … › 程序语言、算法语言"
+"""
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+TABLE_PATH = Path(__file__).with_name("clc_table.tsv")
+
+# ======= CLC 顶层门类（A-Z）与中文名 =======
+CLC_LABELS: Dict[str, str] = {
+    "A": "马克思主义、列宁主义、毛泽东思想、邓小平理论",
+    "B": "哲学、宗教",
+    "C": "社会科学总论",
+    "D": "政治、法律",
+    "E": "军事",
+    "F": "经济",
+    "G": "文化、科学、教育、体育",
+    "H": "语言、文字",
+    "I": "文学",
+    "J": "艺术",
+    "K": "历史、地理",
+    "N": "自然科学总论",
+    "O": "数理科学和化学",
+    "P": "天文学、地球科学",
+    "Q": "生物科学",
+    "R": "医药、卫生",
+    "S": "农业科学",
+    "T": "工业技术",
+    "U": "交通运输",
+    "V": "航空、航天",
+    "X": "环境科学、安全科学",
+    "Z": "综合性图书",
+}
+
+# ======= 门类 → 展示用大类（UI 卡片与分面筛选共用）=======
+CLC_BUCKETS: Dict[str, str] = {
+    **{h: "科学技术类" for h in "TOQRPSXNUV"},
+    "K": "历史类",
+    "J": "艺术类",
+    "I": "文学类",
+    "H": "语言类",
+    "F": "经济管理类",
+    "G": "教育文化类",
+    "B": "哲学宗教类",
+    "C": "社会政治类",
+    "D": "社会政治类",
+    "A": "综合/知识类",
+    "Z": "综合/知识类",
+    "E": CLC_LABELS["E"],
+}
+UNCLASSIFIED = "未分类"
+PATH_SEP = " › "
+
+
+class _Node:
+    __slots__ = ("children", "label")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.label: Optional[str] = None        # None：只是更长分类号的中间前缀，不是有效类目
+
+
+def normalize_code(code: Optional[str]) -> str:
+    """去空白、转大写；全角字母数字转半角。"""
+    s = "".join(str(code or "").split()).upper()
+    return s.translate({c: c - 0xFEE0 for c in range(0xFF01, 0xFF5F)})
+
+
+class CLCTree:
+    def __init__(self, rows: Dict[str, str]):
+        self._root = _Node()
+        self.size = 0
+        for code, label in rows.items():
+            self.add(code, label)
+
+    def add(self, code: str, label: str):
+        node = self._root
+        for ch in normalize_code(code):
+            node = node.children.setdefault(ch, _Node())
+        if node.label is None:
+            self.size += 1
+        node.label = label
+
+    def _walk(self, code: Optional[str]) -> List[Tuple[str, str]]:
+        """沿 code 往下走，收集途经的每个有效类目 (分类号, 类名)，即从门类开始的路径。"""
+        out: List[Tuple[str, str]] = []
+        node = self._root
+        code = normalize_code(code)
+        for i, ch in enumerate(code):
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if node.label is not None:
+                out.append((code[:i + 1], node.label))
+        return out
+
+    def resolve(self, code: Optional[str]) -> Optional[str]:
+        """最长有效前缀；连门类都不是时返回 None。"""
+        p = self._walk(code)
+        return p[-1][0] if p else None
+
+    def label(self, code: Optional[str], default: str = "未知") -> str:
+        """最长有效前缀对应的类名（TP391 → “信息处理（信息加工）”）。"""
+        p = self._walk(code)
+        return p[-1][1] if p else default
+
+    def path(self, code: Optional[str]) -> List[Tuple[str, str]]:
+        return self._walk(code)
+
+    def path_label(self, code: Optional[str], sep: str = PATH_SEP) -> str:
+        return sep.join(label for _c, label in self._walk(code))
+
+    def top(self, code: Optional[str]) -> Optional[str]:
+        """所属门类字母；无效分类号为 None。"""
+        head = normalize_code(code)[:1]
+        return head if head in self._root.children and self._root.children[head].label else None
+
+    def bucket(self, code: Optional[str]) -> str:
+        return CLC_BUCKETS.get(self.top(code) or "", UNCLASSIFIED)
+
+    def children(self, code: str) -> List[Tuple[str, str]]:
+        """直接下级类目（跳过不是有效类目的中间前缀）。"""
+        code = normalize_code(code)
+        node = self._root
+        for ch in code:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        out: List[Tuple[str, str]] = []
+        stack = [(code + ch, child) for ch, child in sorted(node.children.items(), reverse=True)]
+        while stack:
+            c, n = stack.pop()
+            if n.label is not None:
+                out.append((c, n.label))
+            else:
+                stack.extend((c + ch, child) for ch, child in sorted(n.children.items(), reverse=True))
+        return out
+
+    def __contains__(self, code) -> bool:
+        p = self._walk(code)
+        return bool(p) and p[-1][0] == normalize_code(code)
+
+
+def load_table(path=TABLE_PATH) -> Dict[str, str]:
+    """门类 + 表文件里的类目；# 开头为注释。"""
+    rows = dict(CLC_LABELS)
+    with open(path, encoding="utf-8") as f:
+        for ln in f:
+            ln = ln.rstrip("\n")
+            if not ln.strip() or ln.lstrip().startswith("#"):
+                continue
+            code, _, label = ln.partition("\t")
+            if code.strip() and label.strip():
+                rows[normalize_code(code)] = label.strip()
+    return rows
+
+
+_tree: Optional[CLCTree] = None
+_tree_lock = threading.Lock()
+
+
+def get_clc_tree() -> CLCTree:
+    global _tree
+    if _tree is None:
+        with _tree_lock:
+            if _tree is None:
+                try:
+                    rows = load_table()
+                except OSError as e:         # 打包时漏了表文件：退回只有门类
+                    print("[clctree] 类目表读取失败，只用门类：", e)
+                    rows = dict(CLC_LABELS)
+                _tree = CLCTree(rows)
+    return _tree
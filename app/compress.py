@@ -0,0 +1,41 @@
+# app/compress.py
+"""
+文本压缩：有 zstandard 就用 zstd，否则用标准库 zlib。
+解压按数据头自动识别（zstd 帧魔数 / zlib），两种格式可以在同一张表里混存；
+str 视为未压缩的旧数据，原样返回。
+"""
+from __future__ import annotations
+
+import zlib
+from typing import Optional, Union
+
+try:  # 可选依赖
+    import zstandard as _zstd
+except ImportError:  # pragma: no cover
+    _zstd = None
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+
+CODEC = "zstd" if _zstd is not None else "zlib"
+
+
+def compress_text(s: Optional[str]) -> Optional[bytes]:
+    if s is None:
+        return None
+    data = s.encode("utf-8")
+    if _zstd is not None:
+        return _zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress_text(v: Union[bytes, str, None]) -> Optional[str]:
+    if v is None or isinstance(v, str):
+        return v
+    v = bytes(v)
+    if v[:4] == ZSTD_MAGIC:
+        if _zstd is None:
+            raise RuntimeError("数据以 zstd 压缩，需要安装 zstandard")
+        return _zstd.ZstdDecompressor().decompress(v).decode("utf-8")
+    return zlib.decompress(v).decode("utf-8")
@@ -1,4 +1,5 @@
 # app/config.py
+import os
 from pathlib import Path
 
 # 项目与数据目录
@@ -9,13 +10,77 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 # SQLite 路径（db.py 需要）
 DB_PATH = DATA_DIR / "app.db"
 
+# 每个新连接执行的 PRAGMA：WAL 下读写互不阻塞；synchronous=NORMAL 在 WAL 下断电最多丢最后一次提交
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 30000,          # 毫秒，跨进程（Streamlit/桌面/脚本）争用时等待而非报 locked
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": -65536,           # 负数为 KiB，即 64 MiB
+    "mmap_size": 256 * 1024 * 1024,
+    "wal_autocheckpoint": 1000,     # 页
+}
+
+# 单写线程：入库结果排队，攒够 WRITER_BATCH 条或等 WRITER_LINGER 秒合成一个事务提交
+WRITER_BATCH = 32
+WRITER_LINGER = 0.02
+WRITER_QUEUE_MAX = 1000
+
+# 批量写库（app/bulk.py）：每 BULK_CHUNK 条详情一个事务
+BULK_CHUNK = 500
+
+# 来源记录（sources）保留策略：每本书每个站点只留最近 N 条（0 为不限）；
+# 内容与该站点上一条相同（content_hash 一致）时不再追加
+SOURCE_KEEP_LATEST = 5
+SOURCE_SKIP_UNCHANGED = True
+
+# 在线备份（app/backup.py）：快照目录、保留份数；每步复制 BACKUP_STEP_PAGES 页后 sleep BACKUP_STEP_SLEEP 秒，
+# 给同时在跑的入库让出磁盘与 CPU（0 为不停顿）
+BACKUP_DIR = DATA_DIR / "backups"
+BACKUP_KEEP = 7
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_SLEEP = 0.01
+
 # 封面保存目录
 COVERS_DIR = DATA_DIR / "covers"
 COVERS_DIR.mkdir(parents=True, exist_ok=True)
 
+# 封面下载：独立线程池，入库事务提交后再下载
+COVER_WORKERS = 4
+COVER_MAX_BYTES = 10 * 1024 * 1024
+
 # 仅启用豆瓣 & 京东（按顺序尝试）
 PROVIDERS = ["douban", "jd"]
 
+# 批量入库：工作线程数 & 每个站点同时在途的请求上限
+INGEST_WORKERS = 4
+SITE_CONCURRENCY = {"douban": 2, "jd": 2}
+SITE_CONCURRENCY_DEFAULT = 2
+
+# 并行查询（fan-out）：同时问所有 provider，取优先级最高的有效结果；默认关闭
+PROVIDER_FANOUT = False
+
+# 按站点限速（令牌桶）：rate=每秒请求数，burst=允许的突发量；遇 429/403 自动减速再慢慢恢复
+RATE_LIMITS = {
+    "douban": {"rate": 1.0, "burst": 3},
+    "jd": {"rate": 2.0, "burst": 4},
+    "openlibrary": {"rate": 3.0, "burst": 5},
+    "googlebooks": {"rate": 3.0, "burst": 5},
+    "default": {"rate": 5.0, "burst": 10},   # 未登记主机（封面 CDN 等），每个主机一个桶
+}
+# 主机名后缀 → 站点（限速/熔断按站点统计）
+SITE_HOSTS = {
+    "douban": ("book.douban.com", "douban.com"),
+    "jd": ("jd.com",),
+    "openlibrary": ("openlibrary.org",),
+    "googlebooks": ("googleapis.com",),
+}
+
+# 熔断：连续失败 failure_threshold 次，或最近 window 次错误率 ≥ error_rate（至少 min_calls 次）
+# 即跳过该站点 cooldown 秒，之后放一个探测请求
+BREAKER = {"failure_threshold": 5, "error_rate": 0.5, "window": 20, "min_calls": 10, "cooldown": 60}
+
 # 请求参数
 USER_AGENT = (
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
@@ -26,5 +91,48 @@ USER_AGENT = (
 REQUEST_TIMEOUT = (8, 12)         # 详情页/封面
 REQUEST_TIMEOUT_FAST = (5, 8)     # 搜索页/探测
 
+# HTTP 响应缓存（所有 provider 共用，SQLite 文件，正文 zlib 压缩）
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_PATH = DATA_DIR / "http_cache.db"
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024   # 超出后按最近访问时间（LRU）淘汰
+# 按 URL 片段匹配 TTL（秒），自上而下先命中先用；未命中的 URL 不缓存
+HTTP_CACHE_TTLS = [
+    ("book.douban.com/j/subject_suggest", 24 * 3600),
+    ("book.douban.com/subject_search", 24 * 3600),
+    ("book.douban.com/isbn/", 7 * 24 * 3600),
+    ("book.douban.com/subject/", 7 * 24 * 3600),
+    ("search.jd.com/", 24 * 3600),
+    ("item.jd.com/", 7 * 24 * 3600),
+    ("openlibrary.org/", 7 * 24 * 3600),
+    ("www.googleapis.com/books/", 7 * 24 * 3600),
+]
+
+# 未命中缓存：查不到的 (查询, provider) 在有效期内直接跳过（秒）
+NEGATIVE_CACHE_TTL = {
+    "no_result": 7 * 24 * 3600,       # 站点确实搜不到
+    "isbn_mismatch": 30 * 24 * 3600,  # 搜到的书 ISBN 对不上
+    "http_error": 3600,               # 超时/5xx 等，可能只是暂时的
+}
+
 # 可选：离线目录（未启用时不影响）
 OFFLINE_JSON = DATA_DIR / "offline_catalog.json"
+
+# LLM 分类（OpenAI 兼容的 /chat/completions 接口；换成本地替身服务只需改 LLM_BASE_URL）
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"))
+LLM_API_KEY = os.getenv("LLM_API_KEY", os.getenv("OPENAI_API_KEY", ""))
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_TIMEOUT = (5, 60)             # 连接/读取超时（秒）
+LLM_BATCH_SIZE = 20               # 一个提示里分类的书目数
+# 分类结果持久缓存：键为 (模型, 提示版本, 标题, 作者, 简介) 的 hash
+LLM_CACHE_PATH = DATA_DIR / "llm_cache.db"
+# 入库后的异步 LLM 分类阶段（app/llm_stage.py）：同时在途的请求数、单次请求时限、重试
+LLM_CONCURRENCY = 4
+LLM_CALL_DEADLINE = 20.0          # 秒；超时视为失败，重试用尽后保留规则法结果
+LLM_RETRIES = 2
+LLM_RETRY_BACKOFF = 1.0           # 第 n 次重试前随机等待 0 ~ BACKOFF·2^n 秒
+LLM_LINGER = 0.5                  # 攒批等待（秒）
+
+# 本地分类模型（app/clcmodel.py，需 numpy）：用馆藏里 CIP 给出的分类号训练，见 scripts/train_clc_model.py
+CLC_MODEL_PATH = DATA_DIR / "clc_model.npz"
+CLC_MODEL_CONFIDENT = 0.6         # 预测概率达到该值才采用，否则继续走 LLM / 规则法
+CLC_MODEL_MIN_CLASS = 5           # 样本数不足的细类并回门类（仍不足的丢弃）
@@ -0,0 +1,345 @@
+# app/covers.py
+"""
+封面下载：独立于入库事务的异步阶段。
+
+原先 fetch_cover 在 search_and_ingest 的 `with session.begin()` 里同步执行，
+整个图片下载期间（最长 12s 读超时）都占着 SQLite 写事务，且把整张图读进内存。
+现在：
+
+- 元数据提交后把 (book_id, url) 投进 CoverQueue（同一对去重）；
+- 工作线程流式写入临时文件，完成后原子 rename 到 data/covers；
+- 再用一个很短的事务回填 Book.cover_path（只在仍为空时写）。
+
+命令行脚本结束前调用 get_cover_queue().drain() 等待剩余下载。
+
+存储是内容寻址的：文件名为图片字节的 sha256，放在两级分片目录
+data/covers/ab/cd/<hash>.jpg 下；cover_urls 记录 URL → hash，cover_blobs.refcount
+由 books 上的触发器维护（见 db.py），gc_covers() 只需处理 refcount 归零的那几条。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+from sqlalchemy import update, or_, select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .config import COVERS_DIR, USER_AGENT, REQUEST_TIMEOUT, COVER_WORKERS, COVER_MAX_BYTES
+from .db import SessionLocal, Book, CoverBlob, CoverUrl
+from .httpcache import cached_session
+from .writer import run_write
+
+_tls = threading.local()
+
+
+def _session():
+    sess = getattr(_tls, "sess", None)
+    if sess is None:
+        sess = _tls.sess = cached_session({"User-Agent": USER_AGENT})
+    return sess
+
+
+# ---------- 内容寻址存储 ----------
+_EXT_BY_TYPE = {"image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}
+
+
+def blob_rel_path(digest: str, ext: str = ".jpg") -> str:
+    """sha256 → 'covers/ab/cd/<hash><ext>'（相对 DATA_DIR）。"""
+    return f"covers/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def resolve_cover_path(cover_path: Optional[str]) -> Optional[Path]:
+    """
+    把 DB 中的 cover_path 解析为本机绝对路径；只做 stat，不扫描目录。
+    - 'covers/ab/cd/<hash>.jpg'（当前格式）与 'covers/xxx.jpg'（历史平铺格式）均相对 data/
+    - 历史绝对路径：存在就用，否则按文件名到 data/covers 下找
+    """
+    if not cover_path:
+        return None
+    p = Path(cover_path)
+    if not p.is_absolute():
+        cand = COVERS_DIR.parent / p
+        if cand.exists():
+            return cand
+    elif p.exists():
+        return p
+    legacy = COVERS_DIR / p.name
+    return legacy if legacy.exists() else None
+
+
+def _register_blob(digest: str, rel: str, size: int, url: Optional[str]) -> None:
+    run_write(_insert_blob, digest, rel, size, url)
+
+
+def _insert_blob(s, digest: str, rel: str, size: int, url: Optional[str]) -> None:
+    s.execute(
+        sqlite_insert(CoverBlob)
+        .values(hash=digest, rel_path=rel, size=size, refcount=0, created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["hash"])
+    )
+    if url:
+        s.execute(
+            sqlite_insert(CoverUrl)
+            .values(url=url, hash=digest, fetched_at=datetime.utcnow())
+            .on_conflict_do_update(index_elements=["url"], set_={"hash": digest, "fetched_at": datetime.utcnow()})
+        )
+
+
+def store_file(tmp_path: Path, digest: str, size: int, ext: str = ".jpg", url: Optional[str] = None) -> str:
+    """把已算好 hash 的临时文件移入分片目录（已存在则丢弃临时文件），返回相对路径。"""
+    rel = blob_rel_path(digest, ext)
+    dest = COVERS_DIR.parent / rel
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        os.unlink(tmp_path)
+    else:
+        os.replace(tmp_path, dest)
+    _register_blob(digest, rel, size, url)
+    return rel
+
+
+def _known_url(url: str) -> Optional[str]:
+    """URL 之前下载过且文件仍在 → 直接复用。"""
+    with SessionLocal() as s:
+        rel = s.execute(
+            select(CoverBlob.rel_path).join(CoverUrl, CoverUrl.hash == CoverBlob.hash).where(CoverUrl.url == url)
+        ).scalar_one_or_none()
+    if rel and (COVERS_DIR.parent / rel).exists():
+        return rel
+    return None
+
+
+# ---------- 封面抓取（返回“相对路径”） ----------
+def fetch_cover(url: Optional[str]) -> str:
+    """
+    流式下载封面并存入内容寻址目录，返回相对路径 'covers/ab/cd/<hash>.jpg'。
+    同一 URL 下载过则不再请求；不同 URL 的相同图片只存一份。若失败返回空字符串。
+    """
+    if not url:
+        return ""
+    known = _known_url(url)
+    if known:
+        return known
+    tmp_path = None
+    try:
+        with _session().get(url, timeout=REQUEST_TIMEOUT, stream=True) as r:
+            r.raise_for_status()
+            ctype = (r.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+            ext = _EXT_BY_TYPE.get(ctype, ".jpg")
+            fd, tmp_path = tempfile.mkstemp(prefix=".cover-", suffix=".part", dir=COVERS_DIR)
+            h = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                for chunk in r.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > COVER_MAX_BYTES:
+                        raise ValueError(f"cover too large (> {COVER_MAX_BYTES} bytes)")
+                    h.update(chunk)
+                    f.write(chunk)
+        if size == 0:
+            raise ValueError("empty cover")
+        rel = store_file(Path(tmp_path), h.hexdigest(), size, ext, url=url)
+        tmp_path = None
+        # ★ 关键：返回相对路径
+        return rel
+    except Exception as e:
+        print("[cover] fetch failed:", e)
+        return ""
+    finally:
+        if tmp_path:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def _set_cover_path(book_id: int, rel: str) -> bool:
+    """经单写线程回填封面；用户已手动设置过的不覆盖。"""
+    def _apply(s):
+        res = s.execute(
+            update(Book)
+            .where(Book.id == book_id, or_(Book.cover_path.is_(None), Book.cover_path == ""))
+            .values(cover_path=rel)
+        )
+        return (res.rowcount or 0) > 0
+    return run_write(_apply)
+
+
+class CoverQueue:
+    """去重的 (book_id, url) 下载队列 + 工作线程池。"""
+
+    def __init__(self, workers: int = COVER_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="cover")
+        self._lock = threading.Lock()
+        self._pending: dict = {}      # (book_id, url) → Future
+        self.counters = {"queued": 0, "deduped": 0, "saved": 0, "failed": 0}
+
+    def submit(self, book_id: int, url: Optional[str]) -> bool:
+        """投递一张封面；同一 (book_id, url) 尚在队列/下载中则忽略。返回是否新投递。"""
+        if not book_id or not url:
+            return False
+        key = (book_id, url)
+        with self._lock:
+            if key in self._pending:
+                self.counters["deduped"] += 1
+                return False
+            self.counters["queued"] += 1
+            self._pending[key] = self._pool.submit(self._work, key)
+        return True
+
+    def _work(self, key):
+        book_id, url = key
+        try:
+            rel = fetch_cover(url)
+            ok = bool(rel) and _set_cover_path(book_id, rel)
+            with self._lock:
+                self.counters["saved" if ok else "failed"] += 1
+            return rel
+        except Exception as e:
+            print(f"[cover] book #{book_id} failed:", e)
+            with self._lock:
+                self.counters["failed"] += 1
+            return ""
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """等待当前队列里的下载全部结束；超时返回 False。"""
+        with self._lock:
+            futs = list(self._pending.values())
+        if not futs:
+            return True
+        done, not_done = wait(futs, timeout=timeout)
+        return not not_done
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.counters)
+            out["pending"] = len(self._pending)
+        return out
+
+
+_queue: Optional[CoverQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_cover_queue() -> CoverQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = CoverQueue()
+        return _queue
+
+
+# ---------- 维护：垃圾回收 / 历史迁移 ----------
+def gc_covers(grace_seconds: int = 3600) -> Tuple[int, int]:
+    """
+    删除 refcount<=0 的封面文件与记录（只查这些行，代价与变更量成正比）。
+    grace_seconds 内新存入的不删：下载完成到回填 cover_path 之间 refcount 仍为 0。
+    返回 (删除文件数, 释放字节数)。
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    with SessionLocal() as s:
+        rows = s.execute(
+            select(CoverBlob.hash, CoverBlob.rel_path, CoverBlob.size)
+            .where(CoverBlob.refcount <= 0, CoverBlob.created_at < cutoff)
+        ).all()
+    n = freed = 0
+    for digest, rel, size in rows:
+        with SessionLocal() as s, s.begin():
+            # 删除前再确认一次，期间可能又被引用了
+            res = s.execute(delete(CoverBlob).where(CoverBlob.hash == digest, CoverBlob.refcount <= 0))
+            if not res.rowcount:
+                continue
+        path = COVERS_DIR.parent / rel
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        for d in (path.parent, path.parent.parent):   # 顺手删掉空的分片目录
+            try:
+                d.rmdir()
+            except OSError:
+                break
+        n += 1
+        freed += size or 0
+    return n, freed
+
+
+def recount_refs() -> int:
+    """按 books 重新计算全部 refcount（触发器之外的兜底校正），返回 blob 数。"""
+    with SessionLocal() as s, s.begin():
+        s.execute(
+            update(CoverBlob).values(
+                refcount=select(func.count(Book.id)).where(Book.cover_path == CoverBlob.rel_path).scalar_subquery()
+            )
+        )
+        return s.execute(select(func.count()).select_from(CoverBlob)).scalar_one()
+
+
+def migrate_legacy_covers() -> int:
+    """
+    把历史平铺文件（covers/<slug>.jpg）搬进内容寻址目录并改写 cover_path。
+    返回迁移的书目数。
+    """
+    n = 0
+    moved: dict = {}      # 本次已搬走的旧 cover_path → 新 rel（多本书可能共用同一个旧文件）
+    with SessionLocal() as s:
+        rows = s.execute(
+            select(Book.id, Book.cover_path).where(Book.cover_path.isnot(None), Book.cover_path != "")
+        ).all()
+    for bid, cover_path in rows:
+        if cover_path.startswith("covers/") and cover_path.count("/") == 3:
+            continue  # 已是分片格式
+        rel = moved.get(cover_path)
+        if rel is None:
+            src = resolve_cover_path(cover_path)
+            if not src:
+                continue
+            h = hashlib.sha256()
+            with open(src, "rb") as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            rel = blob_rel_path(digest, src.suffix.lower() or ".jpg")
+            dest = COVERS_DIR.parent / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            if dest.exists():
+                os.remove(src)        # 同内容已在分片目录里：平铺目录里的重复文件直接删
+            else:
+                os.replace(src, dest)
+            _register_blob(digest, rel, dest.stat().st_size, None)
+            moved[cover_path] = rel
+        with SessionLocal() as s, s.begin():
+            s.execute(update(Book).where(Book.id == bid).values(cover_path=rel))
+        n += 1
+    return n
+
+
+def sweep_untracked() -> int:
+    """全量扫描 data/covers，删掉既不在 cover_blobs、也没被任何书引用的文件（慢，偶尔跑）。"""
+    with SessionLocal() as s:
+        tracked = set(s.execute(select(CoverBlob.rel_path)).scalars())
+        tracked |= set(s.execute(select(Book.cover_path).where(Book.cover_path.isnot(None))).scalars())
+    keep_names = {Path(p).name for p in tracked}
+    n = 0
+    for f in COVERS_DIR.rglob("*"):
+        if not f.is_file() or f.name == ".gitkeep":
+            continue
+        rel = f.relative_to(COVERS_DIR.parent).as_posix()
+        if rel in tracked or f.name in keep_names:
+            continue
+        f.unlink()
+        n += 1
+    return n
@@ -3,14 +3,30 @@ from datetime import datetime
 from pathlib import Path
 
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, ForeignKey,
-    create_engine, event, Index
+    Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary,
+    create_engine, event, inspect, Index, UniqueConstraint, text
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from .config import DB_PATH
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship, deferred
+from sqlalchemy.types import TypeDecorator
+from .config import DB_PATH, SQLITE_PRAGMAS
+from .isbn import to_isbn13
+from .compress import compress_text, decompress_text
 
 Base = declarative_base()
 
+
+class CompressedText(TypeDecorator):
+    """读写都是 str，库里存 zstd/zlib 压缩后的字节；旧的明文 TEXT 行照常可读。"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return compress_text(value) if isinstance(value, str) else value
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+
 class Book(Base):
     __tablename__ = "books"
 
@@ -19,9 +35,11 @@ class Book(Base):
     authors_std = Column(String, index=True, nullable=True)
 
     publisher   = Column(String, nullable=True)   # 允许为 NULL
+    publisher_id = Column(Integer, ForeignKey("publishers.id", ondelete="SET NULL"), nullable=True, index=True)
     pub_year    = Column(Integer, nullable=True)
 
-    isbn        = Column(String, unique=True, index=True, nullable=True)  # 唯一
+    isbn        = Column(String, unique=True, index=True, nullable=True)  # 唯一（来源原样写法）
+    isbn13      = Column(String, nullable=True)   # 规范 ISBN-13（校验通过才有值），旧库由 init_db 迁移
     edition     = Column(String, nullable=True)
     pages       = Column(Integer, nullable=True)
 
@@ -41,6 +59,8 @@ class Book(Base):
 
     __table_args__ = (
         Index("ix_books_title_authors", "title_std", "authors_std"),
+        Index("ix_books_isbn13", "isbn13", unique=True),
+        Index("ix_books_updated_at", "updated_at"),
     )
 
 
@@ -52,24 +72,365 @@ class Source(Base):
 
     site       = Column(String, index=True, nullable=False)  # douban / jd / ...
     url        = Column(String, nullable=True)               # 详情页 URL
-    extracted  = Column(Text, nullable=True)                 # 原始字段 JSON
+    # 原始字段 JSON（压缩存储、延迟加载：列出来源时不读大字段）
+    extracted  = deferred(Column(CompressedText, nullable=True))
+    content_hash = Column(String, nullable=True)             # extracted 的 sha1，判断内容是否变化
 
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
     book       = relationship("Book", back_populates="sources")
 
+    __table_args__ = (
+        Index("ix_sources_book_site", "book_id", "site", "id"),
+    )
+
+
+class Author(Base):
+    """作者维表：name_norm 为规范化后的姓名（见 app/dims.py），唯一索引。"""
+    __tablename__ = "authors"
+
+    id        = Column(Integer, primary_key=True, autoincrement=True)
+    name      = Column(String, nullable=False)               # 首次出现时的写法
+    name_norm = Column(String, nullable=False, unique=True, index=True)
+
+
+class BookAuthor(Base):
+    """书—作者多对多；position 为作者在 authors_std 里的次序（0 为第一作者）。"""
+    __tablename__ = "book_authors"
+
+    book_id   = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    author_id = Column(Integer, ForeignKey("authors.id", ondelete="CASCADE"), primary_key=True)
+    position  = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_book_authors_author_book", "author_id", "book_id"),
+    )
+
+
+class Publisher(Base):
+    """出版社维表：name_norm 唯一索引。"""
+    __tablename__ = "publishers"
+
+    id        = Column(Integer, primary_key=True, autoincrement=True)
+    name      = Column(String, nullable=False)
+    name_norm = Column(String, nullable=False, unique=True, index=True)
+
+
+class FacetCount(Base):
+    """
+    分面计数：(facet, value) → 书目数，由 books 上的触发器增量维护（见 _FACET_EXPRS）。
+    value 为空串表示该字段为空（未分类 / 年份不详 …）。
+    """
+    __tablename__ = "facet_counts"
+
+    facet = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    n     = Column(Integer, nullable=False, default=0)
+
+
+class NegativeCache(Base):
+    """查不到的 (规范化查询, provider)：有效期内再次导入时直接跳过该 provider。"""
+    __tablename__ = "negative_cache"
+
+    id         = Column(Integer, primary_key=True, autoincrement=True)
+    query_norm = Column(String, nullable=False)
+    provider   = Column(String, nullable=False)
+    reason     = Column(String, nullable=False)   # no_result / isbn_mismatch / http_error
+
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        UniqueConstraint("query_norm", "provider", name="uq_negative_cache_query_provider"),
+    )
+
+
+class CoverBlob(Base):
+    """内容寻址的封面文件：按图片字节的 sha256 去重，refcount 由 books 上的触发器维护。"""
+    __tablename__ = "cover_blobs"
+
+    hash       = Column(String, primary_key=True)                  # sha256 hex
+    rel_path   = Column(String, unique=True, nullable=False)       # covers/ab/cd/<hash>.jpg
+    size       = Column(Integer, nullable=False, default=0)
+    refcount   = Column(Integer, nullable=False, default=0, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class CoverUrl(Base):
+    """封面来源 URL → 内容 hash；同一 URL 再次入库时不必重新下载。"""
+    __tablename__ = "cover_urls"
+
+    url        = Column(String, primary_key=True)
+    hash       = Column(String, ForeignKey("cover_blobs.hash", ondelete="CASCADE"), nullable=False, index=True)
+    fetched_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# books.cover_path 变化时维护 cover_blobs.refcount（任何写入方都生效，含 UI 直接删书）
+_COVER_REFCOUNT_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_books_cover_ins AFTER INSERT ON books
+    WHEN NEW.cover_path IS NOT NULL
+    BEGIN
+        UPDATE cover_blobs SET refcount = refcount + 1 WHERE rel_path = NEW.cover_path;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_books_cover_upd AFTER UPDATE OF cover_path ON books
+    WHEN NEW.cover_path IS NOT OLD.cover_path
+    BEGIN
+        UPDATE cover_blobs SET refcount = refcount - 1 WHERE rel_path = OLD.cover_path;
+        UPDATE cover_blobs SET refcount = refcount + 1 WHERE rel_path = NEW.cover_path;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_books_cover_del AFTER DELETE ON books
+    WHEN OLD.cover_path IS NOT NULL
+    BEGIN
+        UPDATE cover_blobs SET refcount = refcount - 1 WHERE rel_path = OLD.cover_path;
+    END
+    """,
+]
+
+
+@event.listens_for(Book, "before_insert")
+def _isbn13_on_insert(mapper, connection, target):
+    """ORM 写入时按 isbn 推导 isbn13（Core 批量写入由调用方自己填）。"""
+    target.isbn13 = to_isbn13(target.isbn)
+
+
+@event.listens_for(Book, "before_update")
+def _isbn13_on_update(mapper, connection, target):
+    if inspect(target).attrs.isbn.history.has_changes():
+        target.isbn13 = to_isbn13(target.isbn)
+
+
+# 全文检索：books_fts 为外部内容 FTS5 表（trigram 分词，中文按 3 字滑窗切分），
+# 内容仍存在 books 里，由下面的触发器同步；旧库首次建表时在 init_db() 里 rebuild 一次
+FTS_COLUMNS = ("title_std", "authors_std", "isbn", "publisher", "summary")
+
+_FTS_DDL = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        {", ".join(FTS_COLUMNS)},
+        content='books', content_rowid='id', tokenize='trigram'
+    )
+"""
+
+_FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_books_fts_ins AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, {", ".join(FTS_COLUMNS)})
+        VALUES (NEW.id, {", ".join("NEW." + c for c in FTS_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_books_fts_del AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, {", ".join(FTS_COLUMNS)})
+        VALUES ('delete', OLD.id, {", ".join("OLD." + c for c in FTS_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_books_fts_upd AFTER UPDATE OF {", ".join(FTS_COLUMNS)} ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, {", ".join(FTS_COLUMNS)})
+        VALUES ('delete', OLD.id, {", ".join("OLD." + c for c in FTS_COLUMNS)});
+        INSERT INTO books_fts(rowid, {", ".join(FTS_COLUMNS)})
+        VALUES (NEW.id, {", ".join("NEW." + c for c in FTS_COLUMNS)});
+    END
+    """,
+]
+
+
+# --- 分面计数 ---
+# facet → (触发器关心的列, 取值表达式)；{r} 为 NEW / OLD / books。
+# clc 只记首字母（大类由 classify.CLC_BUCKETS 在查询时汇总），decade 为 pub_year 所在年代。
+_FACET_EXPRS = {
+    "clc":       ("clc",          "coalesce(upper(substr({r}.clc, 1, 1)), '')"),
+    "decade":    ("pub_year",     "coalesce(CAST(nullif({r}.pub_year, 0) / 10 * 10 AS TEXT), '')"),
+    "publisher": ("publisher_id", "coalesce(CAST({r}.publisher_id AS TEXT), '')"),
+    "language":  ("language",     "coalesce({r}.language, '')"),
+}
+
+# 筛选用的索引；表达式须与 app/facets.py 里的写法逐字一致才能命中
+_FACET_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_books_clc_head ON books (upper(substr(clc, 1, 1)))",
+    "CREATE INDEX IF NOT EXISTS ix_books_pub_year ON books (pub_year)",
+    "CREATE INDEX IF NOT EXISTS ix_books_language ON books (language)",
+]
+
+
+def _facet_inc(facet: str, expr: str) -> str:
+    return (f"INSERT INTO facet_counts(facet, value, n) VALUES ('{facet}', {expr}, 1) "
+            f"ON CONFLICT(facet, value) DO UPDATE SET n = n + 1;")
+
+
+def _facet_dec(facet: str, expr: str) -> str:
+    return f"UPDATE facet_counts SET n = n - 1 WHERE facet = '{facet}' AND value = {expr};"
+
+
+_FACET_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_books_facets_ins AFTER INSERT ON books BEGIN
+        {" ".join(_facet_inc(f, e.format(r="NEW")) for f, (_c, e) in _FACET_EXPRS.items())}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_books_facets_del AFTER DELETE ON books BEGIN
+        {" ".join(_facet_dec(f, e.format(r="OLD")) for f, (_c, e) in _FACET_EXPRS.items())}
+    END
+    """,
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_books_facet_{f}_upd AFTER UPDATE OF {col} ON books
+    WHEN {e.format(r="OLD")} IS NOT {e.format(r="NEW")} BEGIN
+        {_facet_dec(f, e.format(r="OLD"))}
+        {_facet_inc(f, e.format(r="NEW"))}
+    END
+    """
+    for f, (col, e) in _FACET_EXPRS.items()
+]
+
 
 # --- Engine & Session ---
-engine = create_engine(f"sqlite:///{DB_PATH}", future=True, echo=False)
+# 批量入库时多个线程并发写，适当放宽等锁时间，避免 "database is locked"
+engine = create_engine(
+    f"sqlite:///{DB_PATH}", future=True, echo=False,
+    connect_args={"timeout": 30},
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 
-# SQLite 外键
+# 连接级 PRAGMA（WAL 等，见 config.SQLITE_PRAGMAS）
 @event.listens_for(engine, "connect")
 def _fk_pragma(dbapi_connection, connection_record):
+    # 关掉 pysqlite 自己的隐式 BEGIN，事务统一由下面的 begin 事件发出（SAVEPOINT 才可靠）
+    dbapi_connection.isolation_level = None
     cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
     cursor.close()
 
+# execution_options(sqlite_begin="IMMEDIATE")：写事务一开始就拿写锁，避免读后升级时的 BUSY
+@event.listens_for(engine, "begin")
+def _do_begin(conn):
+    mode = conn.get_execution_options().get("sqlite_begin", "")
+    conn.exec_driver_sql(f"BEGIN {mode}".strip())
+
 def init_db():
     Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for ddl in _COVER_REFCOUNT_TRIGGERS:
+            conn.execute(text(ddl))
+    _migrate_isbn13()
+    _migrate_sources()
+    _migrate_publisher_id()
+    _init_fts()
+    _init_facets()
+
+
+def _migrate_publisher_id():
+    """旧库补 books.publisher_id 列；维表内容由 scripts/backfill_dims.py 回填。"""
+    with engine.begin() as conn:
+        cols = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(books)")}
+        if "publisher_id" not in cols:
+            conn.exec_driver_sql(
+                "ALTER TABLE books ADD COLUMN publisher_id INTEGER REFERENCES publishers(id) ON DELETE SET NULL"
+            )
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_publisher_id ON books (publisher_id)")
+        # 增量导出按 updated_at 取（app/export.py）
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_updated_at ON books (updated_at)")
+
+
+def _migrate_sources():
+    """旧库补 sources.content_hash 列和 (book_id, site, id) 索引；旧的明文行由 scripts/compact_db.py 压缩。"""
+    with engine.begin() as conn:
+        cols = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(sources)")}
+        if "content_hash" not in cols:
+            conn.exec_driver_sql("ALTER TABLE sources ADD COLUMN content_hash VARCHAR")
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_sources_book_site ON sources (book_id, site, id)")
+
+
+def _migrate_isbn13():
+    """
+    旧库补 books.isbn13 列并回填，然后建唯一索引。
+    同一本书以 10 位/13 位各存了一行时，只有先入库（id 小）的一行拿到 isbn13，
+    其余保持 NULL 并打印出来，留给人工合并。
+    """
+    with engine.begin() as conn:
+        cols = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(books)")}
+        if "isbn13" not in cols:
+            conn.exec_driver_sql("ALTER TABLE books ADD COLUMN isbn13 VARCHAR")
+        rows = conn.exec_driver_sql(
+            "SELECT id, isbn FROM books WHERE isbn13 IS NULL AND isbn IS NOT NULL AND isbn != '' ORDER BY id"
+        ).all()
+        if rows:
+            taken = {r[0] for r in conn.exec_driver_sql("SELECT isbn13 FROM books WHERE isbn13 IS NOT NULL")}
+            updates, dupes = [], []
+            for book_id, raw in rows:
+                code = to_isbn13(raw)
+                if not code:
+                    continue
+                if code in taken:
+                    dupes.append((book_id, raw, code))
+                    continue
+                taken.add(code)
+                updates.append({"id": book_id, "code": code})
+            if updates:
+                conn.execute(text("UPDATE books SET isbn13 = :code WHERE id = :id"), updates)
+                print(f"[db] isbn13 backfilled for {len(updates)} books")
+            for book_id, raw, code in dupes:
+                print(f"[db] duplicate ISBN: book #{book_id} ({raw}) is the same as {code}; isbn13 left empty")
+        conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_books_isbn13 ON books (isbn13)")
+
+
+def fts_available() -> bool:
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='books_fts'"
+        )).first() is not None
+
+
+def _init_fts():
+    """建 FTS5 表和同步触发器；SQLite 不支持 FTS5/trigram（< 3.34）时跳过，搜索退回 LIKE。"""
+    existed = fts_available()
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(_FTS_DDL))
+            for ddl in _FTS_TRIGGERS:
+                conn.execute(text(ddl))
+    except Exception as e:
+        print("[db] FTS5 unavailable, search falls back to LIKE:", e)
+        return
+    if not existed:
+        n = rebuild_fts()
+        print(f"[db] books_fts created, indexed {n} books")
+
+
+def rebuild_fts() -> int:
+    """按 books 当前内容重建全文索引，返回书目数。"""
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO books_fts(books_fts) VALUES('rebuild')"))
+        conn.execute(text("INSERT INTO books_fts(books_fts) VALUES('optimize')"))
+        return conn.execute(text("SELECT COUNT(*) FROM books")).scalar() or 0
+
+
+def _init_facets():
+    """建分面筛选索引和计数触发器；计数表为空而 books 有数据（旧库升级）时全量统计一次。"""
+    with engine.begin() as conn:
+        for ddl in _FACET_INDEXES + _FACET_TRIGGERS:
+            conn.execute(text(ddl))
+        empty = conn.execute(text("SELECT 1 FROM facet_counts LIMIT 1")).first() is None
+        has_books = conn.execute(text("SELECT 1 FROM books LIMIT 1")).first() is not None
+    if empty and has_books:
+        n = rebuild_facets()
+        print(f"[db] facet_counts built for {n} books")
+
+
+def rebuild_facets() -> int:
+    """按 books 当前内容重算全部分面计数，返回书目数。"""
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM facet_counts"))
+        for facet, (_col, expr) in _FACET_EXPRS.items():
+            conn.execute(text(
+                f"INSERT INTO facet_counts(facet, value, n) "
+                f"SELECT '{facet}', {expr.format(r='books')}, COUNT(*) FROM books GROUP BY 2"
+            ))
+        return conn.execute(text("SELECT COUNT(*) FROM books")).scalar() or 0
@@ -9,7 +9,8 @@ from PySide6.QtGui import QPixmap, QAction
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QListWidget, QListWidgetItem, QLabel, QLineEdit, QTextEdit,
-    QPushButton, QFileDialog, QMessageBox, QFormLayout, QSpinBox, QSplitter, QToolBar, QStatusBar
+    QPushButton, QFileDialog, QMessageBox, QFormLayout, QSpinBox, QSplitter, QToolBar, QStatusBar,
+    QComboBox, QGroupBox
 )
 
 # ---- 将项目根目录加入 sys.path，便于相对导入 ----
@@ -18,28 +19,27 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 # 业务层：直接复用你现有的模块
-from app.db import SessionLocal, init_db, Book
-from app.pipeline import search_and_ingest
-from app.classify import CLC_LABELS
+from app.db import SessionLocal, Book
+from app.pipeline import search_and_ingest, search_and_ingest_many
+from app.classify import clc_bucket
+from app.clctree import get_clc_tree
+from app.facets import FACETS, all_facets
+from app.registry import get_registry
+from app.httpcache import cache_stats
+from app.ratelimit import limiter_states
+from app.breaker import breaker_states
+from app.readmodel import page as read_page, count_estimate, SEARCH_MAX_RESULTS
+from app.isbn import InvalidISBN
+from app.dims import author_names, sync_book_dims
+from app.writer import get_writer
+from app.covers import get_cover_queue, resolve_cover_path
+from app.llm_stage import get_llm_stage
+from app.llm import llm_stats
 
 DATA_DIR = ROOT_DIR / "data"
 COVERS_DIR = DATA_DIR / "covers"
 
-def clc_bucket(clc_code: Optional[str]) -> str:
-    if not clc_code:
-        return "未分类"
-    head = clc_code[0].upper()
-    if head in {"T","O","Q","R","P","S","X","N","U","V"}: return "科学技术类"
-    if head == "K": return "历史类"
-    if head == "J": return "艺术类"
-    if head == "I": return "文学类"
-    if head == "H": return "语言类"
-    if head == "F": return "经济管理类"
-    if head == "G": return "教育文化类"
-    if head == "B": return "哲学宗教类"
-    if head in {"C","D"}: return "社会政治类"
-    if head in {"A","Z"}: return "综合/知识类"
-    return CLC_LABELS.get(head, "未分类")
+PAGE_SIZE = 200   # 列表每页条数
 
 # --------- 异步信号 ---------
 class WorkerSignals(QObject):
@@ -54,7 +54,8 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("BookMeta 个人版（桌面端）")
         self.resize(1200, 800)
 
-        init_db()  # 确保数据库就绪
+        self.registry = get_registry()
+        self.registry.ensure_db()  # 确保数据库就绪（进程内只做一次）
 
         # 工具栏
         tb = QToolBar("Main")
@@ -64,22 +65,44 @@ class MainWindow(QMainWindow):
         act_refresh = QAction("刷新列表", self)
         act_add = QAction("新增（书名/作者/ISBN）", self)
         act_import = QAction("导入 CSV", self)
-        tb.addAction(act_refresh)
-        tb.addAction(act_add)
-        tb.addAction(act_import)
+        act_status = QAction("运行状态", self)
+        for act in (act_refresh, act_add, act_import, act_status):
+            act.setObjectName(act.text())  # _wire_events 里按 objectName 查找
+            tb.addAction(act)
 
         # 顶部搜索
         top = QWidget()
         top_layout = QHBoxLayout(top)
         self.search_edit = QLineEdit()
-        self.search_edit.setPlaceholderText("搜索：标题 / 作者 / ISBN")
+        self.search_edit.setPlaceholderText("搜索：标题 / 作者 / ISBN / 出版社 / 简介；作者:xxx / 出版社:xxx 精确查")
         self.search_btn = QPushButton("搜索")
         top_layout.addWidget(self.search_edit)
         top_layout.addWidget(self.search_btn)
 
-        # 左侧列表
+        # 左侧列表（分页，见 app/readmodel.py）
         self.list_widget = QListWidget()
         self.list_widget.setAlternatingRowColors(True)
+        pager = QWidget()
+        pager_layout = QHBoxLayout(pager)
+        pager_layout.setContentsMargins(0, 0, 0, 0)
+        self.prev_btn = QPushButton("◀ 上一页")
+        self.next_btn = QPushButton("下一页 ▶")
+        self.page_label = QLabel("")
+        self.page_label.setAlignment(Qt.AlignCenter)
+        pager_layout.addWidget(self.prev_btn)
+        pager_layout.addWidget(self.page_label, 1)
+        pager_layout.addWidget(self.next_btn)
+
+        # 最左侧：分面筛选（计数来自 facet_counts 表，见 app/facets.py）
+        facet_box = QGroupBox("分类浏览")
+        facet_form = QFormLayout(facet_box)
+        self.facet_combos = {}
+        for facet, title in FACETS.items():
+            combo = QComboBox()
+            combo.setMinimumContentsLength(12)
+            combo.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLengthWithIcon)
+            self.facet_combos[facet] = combo
+            facet_form.addRow(f"{title}：", combo)
 
         # 右侧详情
         self.cover_label = QLabel()
@@ -113,28 +136,40 @@ class MainWindow(QMainWindow):
         btn_row.addWidget(self.btn_save)
         btn_row.addWidget(self.btn_refresh)
         btn_row.addWidget(self.btn_delete)
+        dim_row = QHBoxLayout()
+        self.btn_same_author = QPushButton("同作者的书")
+        self.btn_same_publisher = QPushButton("同出版社的书")
+        dim_row.addWidget(self.btn_same_author)
+        dim_row.addWidget(self.btn_same_publisher)
 
         right_box = QWidget()
         right_layout = QVBoxLayout(right_box)
         right_layout.addWidget(self.cover_label)
         right_layout.addLayout(form)
         right_layout.addLayout(btn_row)
+        right_layout.addLayout(dim_row)
 
         # 中间分割
         split = QSplitter(Qt.Horizontal)
+        split.addWidget(facet_box)
         left_box = QWidget(); lb = QVBoxLayout(left_box)
         lb.setContentsMargins(0,0,0,0)
         lb.addWidget(top)
         lb.addWidget(self.list_widget)
+        lb.addWidget(pager)
         split.addWidget(left_box)
         split.addWidget(right_box)
-        split.setSizes([420, 780])
+        split.setSizes([220, 420, 780])
 
         self.setCentralWidget(split)
         self.setStatusBar(QStatusBar())
 
         # 状态
         self.current_id: Optional[int] = None
+        self._kw = ""
+        self._cursor: Optional[int] = None       # 当前页游标
+        self._next_cursor: Optional[int] = None
+        self._page_stack: list = []              # 之前各页的游标，用于“上一页”
         self._wire_events()
 
         # 初始加载
@@ -143,30 +178,86 @@ class MainWindow(QMainWindow):
     # 事件绑定
     def _wire_events(self):
         self.search_btn.clicked.connect(lambda: self.load_list(self.search_edit.text().strip()))
+        self.search_edit.returnPressed.connect(lambda: self.load_list(self.search_edit.text().strip()))
+        self.prev_btn.clicked.connect(self.on_prev_page)
+        self.next_btn.clicked.connect(self.on_next_page)
         self.list_widget.currentItemChanged.connect(self.on_select)
+        for combo in self.facet_combos.values():
+            combo.currentIndexChanged.connect(self.on_facet_changed)
         self.btn_delete.clicked.connect(self.on_delete)
         self.btn_save.clicked.connect(self.on_save)
         self.btn_refresh.clicked.connect(self.on_reingest)
+        self.btn_same_author.clicked.connect(self.on_same_author)
+        self.btn_same_publisher.clicked.connect(self.on_same_publisher)
         # 工具栏
         self.findChild(QAction, "新增（书名/作者/ISBN）").triggered.connect(self.on_add_dialog)
         self.findChild(QAction, "刷新列表").triggered.connect(lambda: self.load_list(self.search_edit.text().strip()))
         self.findChild(QAction, "导入 CSV").triggered.connect(self.on_import_csv)
+        self.findChild(QAction, "运行状态").triggered.connect(self.on_show_status)
 
-    # 列表加载
+    # 列表加载：关键字变化时回到第一页
     def load_list(self, kw: str = ""):
+        self._kw = kw
+        self._cursor = None
+        self._page_stack = []
+        self._load_page()
+
+    def on_facet_changed(self, _index: int):
+        self._cursor = None
+        self._page_stack = []
+        self._load_page()
+
+    def _facet_filters(self) -> dict:
+        return {f: c.currentData() for f, c in self.facet_combos.items() if c.currentData() is not None}
+
+    def _reload_facets(self, S):
+        """刷新各分面的取值与计数，保留当前选中项。"""
+        for facet, values in all_facets(S).items():
+            combo = self.facet_combos[facet]
+            chosen = combo.currentData()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem("全部", None)
+            for v in values:
+                combo.addItem(f"{v.label}（{v.count}）", v.value)
+            idx = combo.findData(chosen) if chosen is not None else 0
+            if idx < 0:
+                combo.addItem(chosen or "（空）", chosen)
+                idx = combo.count() - 1
+            combo.setCurrentIndex(idx)
+            combo.blockSignals(False)
+
+    def on_next_page(self):
+        if self._next_cursor is None:
+            return
+        self._page_stack.append(self._cursor)
+        self._cursor = self._next_cursor
+        self._load_page()
+
+    def on_prev_page(self):
+        if not self._page_stack:
+            return
+        self._cursor = self._page_stack.pop()
+        self._load_page()
+
+    def _load_page(self):
         self.list_widget.clear()
         S = SessionLocal()
         try:
-            q = S.query(Book)
-            if kw:
-                like = f"%{kw}%"
-                q = q.filter( (Book.title_std.like(like)) | (Book.authors_std.like(like)) | (Book.isbn.like(like)) )
-            rows = q.order_by(Book.id.desc()).limit(500).all()
-            for b in rows:
-                item = QListWidgetItem(f"{b.title_std}  [{b.isbn or '—'}]")
+            self._reload_facets(S)
+            # 有关键字：FTS5 + bm25 排序；否则按 id 倒序 keyset 分页（只取列表列）；分面条件叠加在上面
+            pg = read_page(S, self._kw, self._cursor, PAGE_SIZE, self._facet_filters())
+            total = pg.total if pg.total is not None else count_estimate(S)
+            for b in pg.rows:
+                item = QListWidgetItem(f"{b.title}  [{b.isbn or '—'}]")
                 item.setData(Qt.UserRole, b.id)
                 self.list_widget.addItem(item)
-            self.statusBar().showMessage(f"共 {len(rows)} 条记录")
+            self._next_cursor = pg.cursor
+            more = "+" if self._kw and total >= SEARCH_MAX_RESULTS else ""
+            self.page_label.setText(f"第 {len(self._page_stack) + 1} 页 · 共 {total}{more} 本")
+            self.prev_btn.setEnabled(bool(self._page_stack))
+            self.next_btn.setEnabled(pg.cursor is not None)
+            self.statusBar().showMessage(f"本页 {len(pg.rows)} 条 / 共 {total}{more} 条记录")
         finally:
             S.close()
 
@@ -178,15 +269,12 @@ class MainWindow(QMainWindow):
         self.fill_detail(bid)
 
     def _load_cover_pixmap(self, b: Book) -> QPixmap:
-        # cover_path 存相对路径（如 covers/xxx.jpg）
-        if b.cover_path:
-            path = Path(b.cover_path)
-            if not path.is_absolute():
-                path = ROOT_DIR / "data" / path
-            if path.exists():
-                pm = QPixmap(str(path))
-                if not pm.isNull():
-                    return pm.scaled(self.cover_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        # cover_path 存相对路径（如 covers/ab/cd/<hash>.jpg）
+        path = resolve_cover_path(b.cover_path)
+        if path:
+            pm = QPixmap(str(path))
+            if not pm.isNull():
+                return pm.scaled(self.cover_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
         # 占位
         pm = QPixmap(220, 300)
         pm.fill(Qt.lightGray)
@@ -207,7 +295,9 @@ class MainWindow(QMainWindow):
             self.year_spin.setValue(int(b.pub_year or 0))
             self.isbn_edit.setText(b.isbn or "")
             self.summary_edit.setPlainText(b.summary or "")
-            self.clc_label.setText(b.clc or "—")
+            tree = get_clc_tree()
+            self.clc_label.setText(f"{b.clc} {tree.label(b.clc, '')}".strip() if b.clc else "—")
+            self.clc_label.setToolTip(tree.path_label(b.clc))
             self.bucket_label.setText(clc_bucket(b.clc))
         finally:
             S.close()
@@ -228,7 +318,9 @@ class MainWindow(QMainWindow):
             b.pub_year = y or None
             b.isbn = self.isbn_edit.text().strip() or None
             b.summary = self.summary_edit.toPlainText() or None
-            S.add(b); S.commit()
+            S.add(b); S.flush()
+            sync_book_dims(S, [b.id])
+            S.commit()
             self.statusBar().showMessage("✅ 已保存")
             # 更新左侧显示
             cur = self.list_widget.currentItem()
@@ -237,6 +329,29 @@ class MainWindow(QMainWindow):
         finally:
             S.close()
 
+    # 同作者 / 同出版社：走 authors / publishers 维表索引（见 app/dims.py）
+    def on_same_author(self):
+        if not self.current_id:
+            return
+        S = SessionLocal()
+        try:
+            names = author_names(S, self.current_id)
+        finally:
+            S.close()
+        if not names:
+            self.statusBar().showMessage("该书没有作者信息")
+            return
+        self.search_edit.setText(f"作者:{names[0]}")
+        self.load_list(self.search_edit.text())
+
+    def on_same_publisher(self):
+        publisher = self.publisher_edit.text().strip()
+        if not publisher:
+            self.statusBar().showMessage("该书没有出版社信息")
+            return
+        self.search_edit.setText(f"出版社:{publisher}")
+        self.load_list(self.search_edit.text())
+
     # 删除
     def on_delete(self):
         if not self.current_id:
@@ -251,7 +366,7 @@ class MainWindow(QMainWindow):
                 S.delete(b); S.commit()
             self.statusBar().showMessage("🗑️ 已删除")
             self.current_id = None
-            self.load_list(self.search_edit.text().strip())
+            self._load_page()   # 留在当前页
         finally:
             S.close()
 
@@ -261,7 +376,7 @@ class MainWindow(QMainWindow):
         if not isbn:
             QMessageBox.information(self, "提示", "需要 ISBN 才能刷新。")
             return
-        self._do_background_ingest(isbn, done_msg="已刷新（如数据源有更新）")
+        self._do_background_ingest(isbn, done_msg="已刷新（如数据源有更新）", force=True)
 
     # 新增（弹出输入框）
     def on_add_dialog(self):
@@ -272,6 +387,25 @@ class MainWindow(QMainWindow):
             return
         self._do_background_ingest(kw.strip(), done_msg="已入库")
 
+    # 运行状态：数据源注册表 + HTTP 缓存
+    def on_show_status(self):
+        lines = ["【数据源注册表】"]
+        lines += [f"{k}: {v}" for k, v in self.registry.state().items()]
+        lines += ["", "【HTTP 缓存】"]
+        lines += [f"{k}: {v}" for k, v in cache_stats().items()]
+        lines += ["", "【封面下载队列】"]
+        lines += [f"{k}: {v}" for k, v in get_cover_queue().stats().items()]
+        lines += ["", "【站点限速】"]
+        lines += [f"{k}: {v}" for k, v in limiter_states().items()]
+        lines += ["", "【站点熔断】"]
+        lines += [f"{k}: {v}" for k, v in breaker_states().items()]
+        lines += ["", "【写库队列】"]
+        lines += [f"{k}: {v}" for k, v in get_writer().stats().items()]
+        lines += ["", "【LLM 分类】"]
+        lines += [f"{k}: {v}" for k, v in get_llm_stage().stats().items()]
+        lines += [f"api_{k}: {v}" for k, v in llm_stats().items()]
+        QMessageBox.information(self, "运行状态", "\n".join(lines))
+
     # CSV 导入
     def on_import_csv(self):
         file, _ = QFileDialog.getOpenFileName(self, "选择 CSV", str(Path.home()), "CSV Files (*.csv)")
@@ -296,15 +430,21 @@ class MainWindow(QMainWindow):
                 k_title = pick({"title","书名","name"})
                 k_author = pick({"author","authors","作者"})
                 k_isbn = pick({"isbn"})
-                for row in reader:
-                    total += 1
-                    q = ((row.get(k_isbn) or "") if k_isbn else "") or \
-                        f"{(row.get(k_title) or '')} {(row.get(k_author) or '')}".strip()
-                    if not q.strip():
-                        fail += 1; continue
-                    bid = search_and_ingest(q.strip())
+                def queries():
+                    nonlocal total, fail
+                    for row in reader:
+                        total += 1
+                        q = ((row.get(k_isbn) or "") if k_isbn else "") or \
+                            f"{(row.get(k_title) or '')} {(row.get(k_author) or '')}".strip()
+                        if not q.strip():
+                            fail += 1; continue
+                        yield q.strip()
+                for _row, bid, _err in search_and_ingest_many(queries()):
                     if bid: ok += 1
                     else: fail += 1
+                    self.statusBar().showMessage(f"⌛ 正在导入… {ok} 成功 / {fail} 失败")
+                    QApplication.processEvents()
+                get_cover_queue().drain(timeout=60)
             QMessageBox.information(self, "导入完成", f"总计 {total}，成功 {ok}，失败 {fail}")
             return True
         except Exception as e:
@@ -312,15 +452,18 @@ class MainWindow(QMainWindow):
             return False
 
     # 后台抓取，避免卡 UI
-    def _do_background_ingest(self, query: str, done_msg: str):
+    def _do_background_ingest(self, query: str, done_msg: str, force: bool = False):
         sig = WorkerSignals()
         def work():
             try:
-                bid = search_and_ingest(query)
+                bid = search_and_ingest(query, force=force)
                 if bid:
+                    get_cover_queue().drain(timeout=15)  # 后台线程里等封面落盘，不卡 UI
                     sig.success.emit(f"{done_msg}（ID={bid}）")
                 else:
                     sig.error.emit("未从任何数据源获取到元数据。")
+            except InvalidISBN as e:
+                sig.error.emit(str(e))
             except Exception:
                 sig.error.emit(traceback.format_exc())
             finally:
@@ -0,0 +1,177 @@
+# app/dims.py
+"""
+作者 / 出版社维表（authors、book_authors、publishers）。
+
+books.authors_std 是逗号拼接的字符串，“某作者的全部书”只能 LIKE '%名字%' 全表扫，
+还会匹配到别人名字里的子串；出版社也是原样字符串。这里：
+
+- normalize_author / normalize_publisher 给出规范名（全半角统一、去国籍/责任方式标注、
+  去“有限公司”等后缀），按规范名唯一索引；
+- sync_book_dims(session, book_ids) 按 books 当前内容重建这些书的作者关联和 publisher_id
+  （流水线、批量写库、UI 保存后调用；旧库用 scripts/backfill_dims.py 回填）；
+- resolve_author_ids / resolve_publisher_ids 走索引查 id：先精确匹配规范名，
+  没有再按前缀（索引范围扫描）。
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .db import Author, Book, BookAuthor, Publisher
+
+# 作者名前后的国籍/朝代标注：[美] （英） 【清】 等
+_AUTHOR_TAG_RE = re.compile(r"^[\[\(【（〔][^\]\)】）〕]{1,6}[\]\)】）〕]\s*")
+# 责任方式后缀
+_AUTHOR_ROLE_RE = re.compile(r"\s*(?:等)?\s*(?:著|编著|主编|编|译|编译|绘|撰|校注|口述|整理)\s*$")
+_AUTHOR_SPLIT_RE = re.compile(r"\s*(?:[,，;；/、|]|\s+and\s+|&)\s*", re.I)
+_DOTS_RE = re.compile(r"[•・‧∙･.]")
+_PUBLISHER_SUFFIX_RE = re.compile(r"(?:股份)?有限(?:责任)?公司$")
+_BRACKETS_RE = re.compile(r"[\(（][^\)）]*[\)）]")
+
+
+def _nfkc(s: str) -> str:
+    return unicodedata.normalize("NFKC", s or "").strip()
+
+
+def split_authors(authors_std: Optional[str]) -> List[str]:
+    """把 authors_std 拆成作者列表（去标注、去空、保序、按规范名去重）。"""
+    out, seen = [], set()
+    for part in _AUTHOR_SPLIT_RE.split(authors_std or ""):
+        name = clean_author(part)
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            out.append(name)
+    return out
+
+
+def clean_author(name: Optional[str]) -> str:
+    """去国籍/朝代标注和责任方式，统一间隔号与空白（保留大小写，用作展示名）。"""
+    s = _nfkc(name)
+    for _ in range(2):
+        s = _AUTHOR_TAG_RE.sub("", s)
+    s = _AUTHOR_ROLE_RE.sub("", s)
+    s = _DOTS_RE.sub("·", s)
+    s = re.sub(r"\s*·\s*", "·", s)
+    return re.sub(r"\s+", " ", s).strip(" ·")
+
+
+def normalize_author(name: Optional[str]) -> str:
+    """[美] 唐纳德·克努特 著 → 唐纳德·克努特；J. K.  Rowling / J.K. Rowling → j·k·rowling。"""
+    return clean_author(name).lower()
+
+
+def normalize_publisher(name: Optional[str]) -> str:
+    """人民文学出版社有限公司 / 人民文学出版社（北京） → 人民文学出版社。"""
+    s = _BRACKETS_RE.sub("", _nfkc(name))
+    s = re.sub(r"\s+", "", s)
+    s = _PUBLISHER_SUFFIX_RE.sub("", s)
+    return s.lower()
+
+
+# ---------- 写入 ----------
+def _ensure(session, model, names: Dict[str, str]) -> Dict[str, int]:
+    """{name_norm: 展示名} → {name_norm: id}；不存在的插入（并发安全的 ON CONFLICT DO NOTHING）。"""
+    if not names:
+        return {}
+    norms = list(names)
+    ids: Dict[str, int] = {}
+    for i in range(0, len(norms), 500):
+        part = norms[i:i + 500]
+        session.execute(
+            sqlite_insert(model)
+            .values([{"name": names[n], "name_norm": n} for n in part])
+            .on_conflict_do_nothing(index_elements=["name_norm"])
+        )
+        ids.update(dict(session.execute(
+            select(model.name_norm, model.id).where(model.name_norm.in_(part))
+        ).all()))
+    return ids
+
+
+def sync_book_dims(session, book_ids: Iterable[int]) -> None:
+    """按 books 当前的 authors_std / publisher 重建这些书的维表关联（调用方负责事务）。"""
+    book_ids = sorted({int(b) for b in book_ids if b})
+    if not book_ids:
+        return
+    rows = []
+    for i in range(0, len(book_ids), 500):
+        rows += session.execute(
+            select(Book.id, Book.authors_std, Book.publisher, Book.publisher_id, Book.updated_at)
+            .where(Book.id.in_(book_ids[i:i + 500]))
+        ).all()
+
+    author_names: Dict[str, str] = {}
+    pub_names: Dict[str, str] = {}
+    per_book = []
+    for bid, authors_std, publisher, old_pub, updated_at in rows:
+        norms = []
+        for name in split_authors(authors_std):
+            n = normalize_author(name)
+            author_names.setdefault(n, name)
+            norms.append(n)
+        pn = normalize_publisher(publisher) if publisher else ""
+        if pn:
+            pub_names.setdefault(pn, publisher.strip())
+        per_book.append((bid, norms, pn, old_pub, updated_at))
+
+    author_ids = _ensure(session, Author, author_names)
+    pub_ids = _ensure(session, Publisher, pub_names)
+
+    for i in range(0, len(book_ids), 500):
+        session.execute(delete(BookAuthor).where(BookAuthor.book_id.in_(book_ids[i:i + 500])))
+    links = [{"book_id": bid, "author_id": author_ids[n], "position": pos}
+             for bid, norms, *_rest in per_book for pos, n in enumerate(norms)]
+    if links:
+        session.execute(insert(BookAuthor), links)
+    # 只改 publisher_id 真变了的书；显式带上原 updated_at，免得 onupdate 把它刷新（导出水位线靠它）
+    pub_updates = []
+    for bid, _n, pn, old_pub, updated_at in per_book:
+        pid = pub_ids.get(pn) if pn else None
+        if pid != old_pub:
+            pub_updates.append({"id": bid, "publisher_id": pid, "updated_at": updated_at})
+    if pub_updates:
+        session.execute(update(Book), pub_updates)
+
+
+# ---------- 查询（全部走索引）----------
+def _resolve(session, model, norm: str, limit: int = 50) -> List[int]:
+    if not norm:
+        return []
+    exact = session.execute(select(model.id).where(model.name_norm == norm)).scalars().all()
+    if exact:
+        return list(exact)
+    # 前缀：name_norm >= p AND name_norm < p + U+FFFF，可用唯一索引做范围扫描
+    return list(session.execute(
+        select(model.id)
+        .where(model.name_norm >= norm, model.name_norm < norm + "\uffff")
+        .order_by(model.name_norm)
+        .limit(limit)
+    ).scalars())
+
+
+def resolve_author_ids(session, name: str) -> List[int]:
+    return _resolve(session, Author, normalize_author(name))
+
+
+def resolve_publisher_ids(session, name: str) -> List[int]:
+    return _resolve(session, Publisher, normalize_publisher(name))
+
+
+def author_names(session, book_id: int) -> List[str]:
+    """某本书的作者（按次序），供 UI 生成“同作者”链接。"""
+    return list(session.execute(
+        select(Author.name).join(BookAuthor, BookAuthor.author_id == Author.id)
+        .where(BookAuthor.book_id == book_id).order_by(BookAuthor.position)
+    ).scalars())
+
+
+def dims_stats(session) -> dict:
+    return {
+        "authors": session.execute(select(func.count()).select_from(Author)).scalar() or 0,
+        "publishers": session.execute(select(func.count()).select_from(Publisher)).scalar() or 0,
+        "book_author_links": session.execute(select(func.count()).select_from(BookAuthor)).scalar() or 0,
+    }
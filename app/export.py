@@ -0,0 +1,183 @@
+# app/export.py
+"""
+书目导出：流式写出 JSONL / CSV / Parquet。
+
+- iter_books() 用 yield_per 分批从游标里取行，不把整张表读进内存；
+  with_source=True 时附带每本书最近一条 Source（按 sources.book_id 索引取 max(id)）；
+- columns 选列（缺省 EXPORT_COLUMNS），filters 为分面筛选（见 app/facets.py），
+  since 只导出 updated_at 晚于该时刻的书（增量导出）；
+- export() 按扩展名或 fmt 选择格式，返回行数和本次的水位线（最大 updated_at），
+  下次把水位线作为 since 传入即可只导出变化的部分（scripts/export.py 会自动记到 .watermark 文件）；
+- Parquet 需要 pyarrow（可选依赖），按批写成 row group。
+"""
+from __future__ import annotations
+
+import csv
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, Integer, func, select
+
+from .db import Book, SessionLocal, Source
+from .facets import facet_conditions
+
+try:  # 可选依赖
+    import pyarrow as _pa
+    import pyarrow.parquet as _pq
+except ImportError:  # pragma: no cover
+    _pa = _pq = None
+
+EXPORT_BATCH = 1000
+FORMATS = ("jsonl", "csv", "parquet")
+
+EXPORT_COLUMNS = (
+    "id", "isbn", "isbn13", "title_std", "authors_std", "publisher", "pub_year",
+    "edition", "pages", "language", "cip", "clc", "summary", "author_bio",
+    "cover_path", "created_at", "updated_at",
+)
+# with_source=True 时追加的列（最近一条来源）
+SOURCE_COLUMNS = ("source_site", "source_url", "source_fetched_at", "source_extracted")
+
+
+def _select(columns: Sequence[str], with_source: bool):
+    table = Book.__table__
+    unknown = [c for c in columns if c not in table.c]
+    if unknown:
+        raise ValueError(f"未知的列：{', '.join(unknown)}")
+    cols = [table.c[c] for c in columns]
+    if not with_source:
+        return select(*cols)
+    latest_id = (select(func.max(Source.id)).where(Source.book_id == Book.id)
+                 .correlate(Book).scalar_subquery())
+    return (
+        select(*cols,
+               Source.site.label("source_site"),
+               Source.url.label("source_url"),
+               Source.created_at.label("source_fetched_at"),
+               Source.extracted.label("source_extracted"))
+        .select_from(Book)
+        .outerjoin(Source, Source.id == latest_id)
+    )
+
+
+def iter_books(
+    session,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Mapping[str, str]] = None,
+    since: Optional[datetime] = None,
+    with_source: bool = False,
+    batch: int = EXPORT_BATCH,
+) -> Iterator[List[dict]]:
+    """按 (updated_at, id) 顺序分批产出 dict 行；内存占用只与 batch 有关。"""
+    columns = list(columns or EXPORT_COLUMNS)
+    q = _select(columns, with_source).where(*facet_conditions(filters))
+    if since is not None:
+        q = q.where(Book.updated_at > since)
+    q = q.order_by(Book.updated_at, Book.id).execution_options(yield_per=batch)
+    for part in session.execute(q).mappings().partitions():
+        yield [dict(r) for r in part]
+
+
+# ---------- 各格式的写出 ----------
+def _plain(v):
+    return v.isoformat(sep=" ") if isinstance(v, datetime) else v
+
+
+def _write_jsonl(path: Path, batches, on_batch) -> None:
+    with path.open("w", encoding="utf-8") as f:
+        for rows in batches:
+            for r in rows:
+                if r.get("source_extracted"):
+                    try:
+                        r["source_extracted"] = json.loads(r["source_extracted"])
+                    except ValueError:
+                        pass
+                f.write(json.dumps({k: _plain(v) for k, v in r.items()}, ensure_ascii=False))
+                f.write("\n")
+            on_batch(rows)
+
+
+def _write_csv(path: Path, batches, on_batch, fieldnames: List[str]) -> None:
+    # utf-8-sig：Excel 直接打开不乱码
+    with path.open("w", encoding="utf-8-sig", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w.writeheader()
+        for rows in batches:
+            w.writerows({k: _plain(v) for k, v in r.items()} for r in rows)
+            on_batch(rows)
+
+
+def _arrow_schema(fieldnames: List[str]):
+    table = Book.__table__
+    fields = []
+    for name in fieldnames:
+        col = table.c.get(name)
+        if name == "source_fetched_at" or (col is not None and isinstance(col.type, DateTime)):
+            typ = _pa.timestamp("us")
+        elif col is not None and isinstance(col.type, Integer):
+            typ = _pa.int64()
+        else:
+            typ = _pa.string()
+        fields.append(_pa.field(name, typ))
+    return _pa.schema(fields)
+
+
+def _write_parquet(path: Path, batches, on_batch, fieldnames: List[str]) -> None:
+    if _pa is None:
+        raise RuntimeError("导出 Parquet 需要安装 pyarrow（pip install pyarrow）")
+    schema = _arrow_schema(fieldnames)
+    writer = _pq.ParquetWriter(str(path), schema, compression="zstd")
+    try:
+        for rows in batches:
+            writer.write_table(_pa.Table.from_pylist(rows, schema=schema))
+            on_batch(rows)
+    finally:
+        writer.close()
+
+
+def export(
+    path,
+    fmt: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Mapping[str, str]] = None,
+    since: Optional[datetime] = None,
+    with_source: bool = False,
+    batch: int = EXPORT_BATCH,
+) -> Tuple[int, Optional[datetime]]:
+    """导出到 path，返回 (行数, 水位线)；没有新数据时水位线为 since。"""
+    path = Path(path)
+    fmt = (fmt or path.suffix.lstrip(".")).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式：{fmt}（可选 {', '.join(FORMATS)}）")
+    fieldnames = list(columns or EXPORT_COLUMNS) + (list(SOURCE_COLUMNS) if with_source else [])
+    # 水位线要用 updated_at；没选这一列时也照样取，写出前去掉
+    query_cols = list(columns or EXPORT_COLUMNS)
+    drop_updated = "updated_at" not in query_cols
+    if drop_updated:
+        query_cols.append("updated_at")
+
+    state: Dict[str, object] = {"n": 0, "mark": since}
+
+    def on_batch(rows):
+        state["n"] += len(rows)
+
+    def batches():
+        with SessionLocal() as s:
+            for rows in iter_books(s, query_cols, filters, since, with_source, batch):
+                # 按 updated_at 升序取，本批最后一行即当前最大值
+                state["mark"] = rows[-1]["updated_at"]
+                if drop_updated:
+                    for r in rows:
+                        del r["updated_at"]
+                yield rows
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "jsonl":
+        _write_jsonl(path, batches(), on_batch)
+    elif fmt == "csv":
+        _write_csv(path, batches(), on_batch, fieldnames)
+    else:
+        _write_parquet(path, batches(), on_batch, fieldnames)
+    return state["n"], state["mark"]
@@ -0,0 +1,128 @@
+# app/facets.py
+"""
+分面浏览：按大类 / CLC 门类 / 年代 / 出版社 / 语种筛选与计数。
+
+- 计数读 facet_counts 表（books 上的触发器增量维护，见 db._FACET_EXPRS），
+  侧栏每次重绘只是几十行的小表查询，与库的大小无关；
+- “大类”（bucket）不单独计数，由 clc 首字母的计数按 clctree 的门类→大类映射汇总
+  （不是有效门类的首字母归“未分类”）；门类名也取自类目表；
+- facet_conditions(filters) 把 {facet: value} 翻译成走索引的 WHERE 条件，
+  由 app/readmodel.py 拼进列表/搜索分页；
+- 统计对不上时（例如手工改过库）运行 scripts/rebuild_facets.py 重算。
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional
+
+from sqlalchemy import func, literal_column, or_, select
+
+from .classify import CLC_BUCKETS, UNCLASSIFIED, bucket_heads, clc_bucket
+from .clctree import get_clc_tree
+from .db import Book, FacetCount, Publisher
+
+# 侧栏显示顺序与标题
+FACETS: Dict[str, str] = {
+    "bucket": "类别",
+    "clc": "中图法门类",
+    "decade": "年代",
+    "publisher": "出版社",
+    "language": "语种",
+}
+
+# 与 db._FACET_INDEXES 里的索引表达式逐字一致
+_CLC_HEAD = literal_column("upper(substr(books.clc, 1, 1))")
+
+
+@dataclass(frozen=True)
+class FacetValue:
+    value: str        # 传回 facet_conditions 的取值；"" 表示字段为空
+    label: str
+    count: int
+
+
+def _label(facet: str, value: str, names: Mapping[str, str]) -> str:
+    if facet == "clc":
+        return f"{value} {get_clc_tree().label(value, '')}".strip() if value else UNCLASSIFIED
+    if facet == "decade":
+        return f"{value} 年代" if value else "年份不详"
+    if facet == "publisher":
+        return names.get(value) or "未知出版社"
+    if facet == "language":
+        return value or "未知"
+    return value or UNCLASSIFIED
+
+
+def facet_counts(session, facet: str, limit: Optional[int] = None) -> List[FacetValue]:
+    """某个分面的取值与书目数（按数量降序；limit 只截取前若干项）。"""
+    if facet not in FACETS:
+        raise ValueError(f"unknown facet: {facet}")
+    if facet == "bucket":
+        merged: Dict[str, int] = {}
+        for v in facet_counts(session, "clc"):
+            name = clc_bucket(v.value)
+            merged[name] = merged.get(name, 0) + v.count
+        out = [FacetValue(name, name, n) for name, n in merged.items()]
+        out.sort(key=lambda v: (-v.count, v.value))
+        return out[:limit] if limit else out
+
+    q = (select(FacetCount.value, FacetCount.n)
+         .where(FacetCount.facet == facet, FacetCount.n > 0)
+         .order_by(FacetCount.n.desc(), FacetCount.value))
+    if limit:
+        q = q.limit(limit)
+    rows = session.execute(q).all()
+    names: Dict[str, str] = {}
+    if facet == "publisher":
+        ids = [int(v) for v, _n in rows if v]
+        if ids:
+            names = {str(i): name for i, name in session.execute(
+                select(Publisher.id, Publisher.name).where(Publisher.id.in_(ids)))}
+    return [FacetValue(v, _label(facet, v, names), n) for v, n in rows]
+
+
+def all_facets(session, limit: int = 30) -> Dict[str, List[FacetValue]]:
+    return {facet: facet_counts(session, facet, limit) for facet in FACETS}
+
+
+def facet_conditions(filters: Optional[Mapping[str, str]]) -> list:
+    """{facet: value} → WHERE 条件列表（各条件 AND）；value 为 None 的项忽略。"""
+    conds = []
+    for facet, value in (filters or {}).items():
+        if value is None:
+            continue
+        if facet == "bucket":
+            heads = bucket_heads(value)
+            if value == UNCLASSIFIED:
+                conds.append(or_(Book.clc.is_(None), Book.clc == "", _CLC_HEAD.notin_(list(CLC_BUCKETS))))
+            else:
+                conds.append(_CLC_HEAD.in_(heads))
+        elif facet == "clc":
+            conds.append(or_(Book.clc.is_(None), Book.clc == "") if not value else _CLC_HEAD == value)
+        elif facet == "decade":
+            if value:
+                conds.append(Book.pub_year.between(int(value), int(value) + 9))
+            else:
+                conds.append(or_(Book.pub_year.is_(None), Book.pub_year == 0))
+        elif facet == "publisher":
+            conds.append(Book.publisher_id == int(value) if value else Book.publisher_id.is_(None))
+        elif facet == "language":
+            conds.append(Book.language == value if value else or_(Book.language.is_(None), Book.language == ""))
+        else:
+            raise ValueError(f"unknown facet: {facet}")
+    return conds
+
+
+def filtered_count(session, filters: Optional[Mapping[str, str]]) -> int:
+    """满足筛选条件的书目数：单个分面直接读计数表，多个分面组合时走索引 COUNT。"""
+    active = {f: v for f, v in (filters or {}).items() if v is not None}
+    if len(active) == 1:
+        (facet, value), = active.items()
+        for v in facet_counts(session, facet):
+            if v.value == value:
+                return v.count
+        return 0
+    q = select(func.count()).select_from(Book)
+    for cond in facet_conditions(active):
+        q = q.where(cond)
+    return session.execute(q).scalar() or 0
@@ -0,0 +1,305 @@
+# app/httpcache.py
+"""
+所有 provider 共用的 HTTP 响应缓存。
+
+- 存储：data/http_cache.db（标准库 sqlite3），以 "METHOD URL" 为键，正文 zlib 压缩；
+- 有效期：按 config.HTTP_CACHE_TTLS 的 URL 片段匹配，未匹配的 URL 直接走网络；
+- 过期后若有 ETag / Last-Modified，带条件请求复验，304 时沿用旧正文；
+- 总大小超过 HTTP_CACHE_MAX_BYTES 时按最近访问时间淘汰（LRU）；
+- 命中/未命中等计数见 cache_stats()。
+
+接入方式：cached_session() 返回挂载了 CachingAdapter 的 requests.Session，
+用法与普通 Session 一致。
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .config import (
+    HTTP_CACHE_ENABLED, HTTP_CACHE_PATH, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_TTLS,
+)
+from .ratelimit import limiter_for, site_for_url
+from .breaker import breaker_for, CircuitOpenError
+
+# 不随正文一起缓存的响应头（正文已解压、长度会变）
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+
+def ttl_for(url: str) -> int:
+    """按 URL 片段查 TTL（秒）；0 表示不缓存。"""
+    for frag, ttl in HTTP_CACHE_TTLS:
+        if frag in url:
+            return int(ttl)
+    return 0
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    expires_at: float
+
+
+class HttpCache:
+    """线程安全的 SQLite 响应缓存（单连接 + 锁）。"""
+
+    def __init__(self, path=HTTP_CACHE_PATH, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key           TEXT PRIMARY KEY,
+                url           TEXT NOT NULL,
+                status        INTEGER NOT NULL,
+                headers       TEXT NOT NULL,
+                body          BLOB NOT NULL,
+                etag          TEXT,
+                last_modified TEXT,
+                stored_at     REAL NOT NULL,
+                expires_at    REAL NOT NULL,
+                accessed_at   REAL NOT NULL,
+                size          INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_accessed ON responses(accessed_at)")
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        self._total = int(row[0])
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+        self._stat_lock = threading.Lock()
+
+    @staticmethod
+    def key(method: str, url: str) -> str:
+        return f"{method.upper()} {url}"
+
+    def _count(self, name: str, n: int = 1):
+        with self._stat_lock:
+            self.counters[name] += n
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status, headers, body, etag, last_modified, expires_at "
+                "FROM responses WHERE key = ?", (key,),
+            ).fetchone()
+            if not row:
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        url, status, headers, body, etag, lm, expires_at = row
+        return CacheEntry(
+            url=url, status=status, headers=json.loads(headers),
+            body=zlib.decompress(body), etag=etag, last_modified=lm, expires_at=expires_at,
+        )
+
+    def put(self, key: str, url: str, status: int, headers: Dict[str, str], body: bytes, ttl: int):
+        now = time.time()
+        headers = CaseInsensitiveDict(headers)     # 经 HTTP/2 前端的响应头常是小写的 etag/last-modified
+        hdrs = {k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS}
+        blob = zlib.compress(body, 6)
+        size = len(blob) + len(url) + 256
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, url, status, headers, body, etag, last_modified, stored_at, expires_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, status, json.dumps(hdrs, ensure_ascii=False), blob,
+                 headers.get("ETag"), headers.get("Last-Modified"), now, now + ttl, now, size),
+            )
+            self._total += size - (old[0] if old else 0)
+            self._count("stores")
+            if self._total > self.max_bytes:
+                self._evict_locked()
+            self._conn.commit()
+
+    def touch(self, key: str, ttl: int):
+        """复验成功（304）：顺延有效期。"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?", (now + ttl, now, key)
+            )
+            self._conn.commit()
+
+    def _evict_locked(self):
+        # 淘汰到上限的 90%，避免每次写入都触发
+        target = int(self.max_bytes * 0.9)
+        cur = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC")
+        victims, freed = [], 0
+        for key, size in cur:
+            if self._total - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self._total -= freed
+        self._count("evictions", len(victims))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            n = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        with self._stat_lock:
+            out = dict(self.counters)
+        out["entries"] = n
+        out["bytes"] = self._total
+        # 省下的网络请求：直接命中 + 304 复验（后者仍有一次往返，但不再传正文）
+        out["saved"] = out["hits"] + out["revalidated"]
+        return out
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[HttpCache]:
+    """进程内单例；HTTP_CACHE_ENABLED=False 时返回 None。"""
+    global _cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
+
+
+def cache_stats() -> Dict[str, int]:
+    c = get_cache()
+    return c.stats() if c else {}
+
+
+def describe_stats() -> str:
+    """一行中文摘要，供脚本结束时打印。"""
+    st = cache_stats()
+    if not st:
+        return "HTTP 缓存：未启用"
+    return (f"HTTP 缓存：命中 {st['hits']} / 复验 {st['revalidated']} / 未命中 {st['misses']}，"
+            f"省下 {st['saved']} 次网络请求；缓存 {st['entries']} 条，{st['bytes'] / 1048576:.1f} MB")
+
+
+# 当前线程遇到的传输层错误次数（超时/连接失败/5xx/429）。
+# provider 会吞掉 RequestException 只返回 None，流水线靠它区分“没有结果”和“请求失败”。
+_tls = threading.local()
+
+
+def http_error_count() -> int:
+    return getattr(_tls, "errors", 0)
+
+
+def _note_http_error():
+    _tls.errors = getattr(_tls, "errors", 0) + 1
+
+
+class CachingAdapter(HTTPAdapter):
+    """在 HTTPAdapter.send 外面包一层缓存；只缓存 GET 且 200 的非流式响应。"""
+
+    def send(self, request, stream=False, **kwargs):
+        try:
+            resp = self._send(request, stream=stream, **kwargs)
+        except requests.RequestException:
+            _note_http_error()
+            raise
+        if resp.status_code >= 500 or resp.status_code == 429:
+            _note_http_error()
+        return resp
+
+    def _network_send(self, request, **kwargs):
+        """
+        真正走网络的出口：熔断判断 → 按站点限速 → 发送；
+        再按响应调整速率并记熔断计数（超时/连接失败/5xx/429/403 记失败）。
+        """
+        site = site_for_url(request.url or "")
+        breaker = breaker_for(site)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{site}: circuit open, request skipped", request=request)
+        limiter = limiter_for(site)
+        limiter.acquire()
+        try:
+            resp = super().send(request, **kwargs)
+        except BaseException:
+            breaker.record_failure()
+            raise
+        limiter.observe(resp.status_code, resp.headers)
+        if resp.status_code >= 500 or resp.status_code in (429, 403):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return resp
+
+    def _send(self, request, stream=False, **kwargs):
+        cache = get_cache()
+        ttl = ttl_for(request.url or "")
+        if cache is None or request.method != "GET" or ttl <= 0 or stream:
+            return self._network_send(request, stream=stream, **kwargs)
+
+        key = HttpCache.key(request.method, request.url)
+        entry = cache.get(key)
+        if entry and entry.expires_at > time.time():
+            cache._count("hits")
+            return self._from_entry(request, entry)
+
+        if entry:
+            if entry.etag:
+                request.headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request.headers["If-Modified-Since"] = entry.last_modified
+
+        resp = self._network_send(request, stream=stream, **kwargs)
+        if resp.status_code == 304 and entry:
+            cache.touch(key, ttl)
+            cache._count("revalidated")
+            return self._from_entry(request, entry)
+
+        cache._count("misses")
+        if resp.status_code == 200:
+            cache.put(key, request.url, resp.status_code, resp.headers, resp.content, ttl)
+        return resp
+
+    def _from_entry(self, request, entry: CacheEntry) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = entry.status
+        resp.headers = CaseInsensitiveDict(entry.headers)
+        resp._content = entry.body
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.url = request.url
+        resp.reason = "OK"
+        resp.request = request
+        resp.connection = self
+        resp.from_cache = True
+        return resp
+
+
+def cached_session(headers: Optional[Dict[str, str]] = None, retry=None) -> requests.Session:
+    """新建挂载 CachingAdapter 的 Session；retry 为 urllib3 Retry（可选）。"""
+    s = requests.Session()
+    if headers:
+        s.headers.update(headers)
+    adapter = CachingAdapter(max_retries=retry) if retry is not None else CachingAdapter()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
@@ -0,0 +1,105 @@
+# app/isbn.py
+"""
+ISBN 工具：去分隔符、校验位验证、ISBN-10 ↔ ISBN-13 转换。
+
+库里以 books.isbn13 作为规范键（同一本书不论以 10 位还是 13 位录入都落到同一行）；
+books.isbn 仍保留来源给出的写法用于展示。
+"""
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+# 去掉常见分隔符与前缀（"ISBN", "ISBN-13:" 等）
+_SEP_RE = re.compile(r"[\s\-‐‑–—_.]")
+_PREFIX_RE = re.compile(r"^ISBN(?:-?1[03])?[:：]?", re.I)
+# 文本里找候选：13 位 978/979 开头，或 10 位（末位可为 X）；数字之间可夹一个分隔符。
+# 分隔符只在一个候选内部才跳过，不会把前面的“2008 ”之类拼进来
+_S = r"[\s\-‐‑–—]?"
+_CANDIDATE_RE = re.compile(
+    rf"(?<![0-9])(9{_S}7{_S}[89]{_S}(?:[0-9]{_S}){{9}}[0-9]|(?:[0-9]{_S}){{9}}[0-9Xx])(?![0-9])")
+
+
+class InvalidISBN(ValueError):
+    """形如 ISBN 但校验位不对（或位数不对）。"""
+
+
+def clean(s: Optional[str]) -> str:
+    """去前缀和分隔符、转大写；不做校验。"""
+    s = _SEP_RE.sub("", (s or "").strip())
+    return _PREFIX_RE.sub("", s).upper()
+
+
+def _check10(body9: str) -> str:
+    r = (11 - sum((10 - i) * int(c) for i, c in enumerate(body9)) % 11) % 11
+    return "X" if r == 10 else str(r)
+
+
+def _check13(body12: str) -> str:
+    return str((10 - sum((3 if i % 2 else 1) * int(c) for i, c in enumerate(body12)) % 10) % 10)
+
+
+def is_valid_isbn10(s: str) -> bool:
+    s = clean(s)
+    return bool(re.fullmatch(r"[0-9]{9}[0-9X]", s)) and _check10(s[:9]) == s[9]
+
+
+def is_valid_isbn13(s: str) -> bool:
+    s = clean(s)
+    return bool(re.fullmatch(r"97[89][0-9]{10}", s)) and _check13(s[:12]) == s[12]
+
+
+def is_valid(s: str) -> bool:
+    return is_valid_isbn13(s) or is_valid_isbn10(s)
+
+
+def isbn10_to_13(s: str) -> str:
+    s = clean(s)
+    if not is_valid_isbn10(s):
+        raise InvalidISBN(f"无效的 ISBN-10：{s}")
+    body = "978" + s[:9]
+    return body + _check13(body)
+
+
+def isbn13_to_10(s: str) -> Optional[str]:
+    """979 开头的 ISBN-13 没有对应的 ISBN-10，返回 None。"""
+    s = clean(s)
+    if not is_valid_isbn13(s):
+        raise InvalidISBN(f"无效的 ISBN-13：{s}")
+    if not s.startswith("978"):
+        return None
+    return s[3:12] + _check10(s[3:12])
+
+
+def to_isbn13(s: Optional[str]) -> Optional[str]:
+    """规范化为 ISBN-13；空值或校验不通过返回 None。"""
+    s = clean(s)
+    if is_valid_isbn13(s):
+        return s
+    if is_valid_isbn10(s):
+        return isbn10_to_13(s)
+    return None
+
+
+def looks_like_isbn(s: Optional[str]) -> bool:
+    """整串去分隔符后是 10/13 位（末位可为 X）——用于判断用户是否“本意输入 ISBN”。"""
+    return bool(re.fullmatch(r"[0-9]{9}[0-9X]|[0-9]{13}", clean(s)))
+
+
+def find_isbn13(text: Optional[str]) -> Optional[str]:
+    """在任意文本里找第一个校验通过的 ISBN，返回其 ISBN-13 形式。"""
+    if not text:
+        return None
+    for m in _CANDIDATE_RE.finditer(text):
+        code = to_isbn13(m.group(1))
+        if code:
+            return code
+    return None
+
+
+def same_isbn(a: Optional[str], b: Optional[str]) -> bool:
+    """两种写法是否同一本书（均无效时退回去分隔符后比较）。"""
+    ca, cb = to_isbn13(a), to_isbn13(b)
+    if ca and cb:
+        return ca == cb
+    return clean(a) == clean(b)
@@ -0,0 +1,88 @@
+# app/kwmatch.py
+"""
+多模式关键词匹配（Aho–Corasick）。
+
+规则分类原先对每个关键词做一次 `kw in text`，关键词表越补越长，分类就越慢。
+这里把全部关键词编进一个自动机，一遍扫描文本就能找出所有命中（含重叠命中，
+如“生态”与“生态保护”），耗时只与文本长度和命中数有关，与关键词个数基本无关。
+
+    m = KeywordMatcher({"T": ["计算机", "算法"], "O": ["数学"]})
+    m.find("算法与数学")     # → [(0, "算法", ("T",)), (3, "数学", ("O",))]
+    m.hits("算法与数学")     # → {"T": {"算法": [0]}, "O": {"数学": [3]}}
+
+匹配前统一转小写（关键词与文本都是），与原先 kw.lower() in text.lower() 等价。
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+
+class KeywordMatcher:
+    def __init__(self, groups: Mapping[str, Iterable[str]]):
+        # 状态 0 为根；_goto[s]: {字符: 下一状态}；_out[s]: 在该状态结束的 (关键词, 所属组…)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, Tuple[str, ...]]]] = [[]]
+        owners: Dict[str, List[str]] = {}
+        for group, kws in groups.items():
+            for kw in kws:
+                kw = (kw or "").lower()
+                if kw and group not in owners.setdefault(kw, []):
+                    owners[kw].append(group)
+        for kw, gs in owners.items():
+            self._add(kw, tuple(gs))
+        self._alphabet = frozenset(ch for kw in owners for ch in kw)
+        self._build()
+        self.size = len(owners)
+
+    def _add(self, kw: str, groups: Tuple[str, ...]):
+        s = 0
+        for ch in kw:
+            nxt = self._goto[s].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[s][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            s = nxt
+        self._out[s].append((kw, groups))
+
+    def _build(self):
+        # BFS 求失败指针，并把失败状态的输出并进来（这样扫描时不必再沿失败链找输出）
+        q = deque(self._goto[0].values())     # 深度 1 的状态失败指针为根
+        while q:
+            s = q.popleft()
+            for ch, nxt in self._goto[s].items():
+                q.append(nxt)
+                f = self._fail[s]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[int, str, Tuple[str, ...]]]:
+        """所有命中：(起始位置, 关键词, 所属组)，按结束位置排序。"""
+        goto, fail, out, alphabet = self._goto, self._fail, self._out, self._alphabet
+        hits = []
+        s = 0
+        for i, ch in enumerate((text or "").lower()):
+            if ch not in alphabet:
+                s = 0
+                continue
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            if out[s]:
+                for kw, groups in out[s]:
+                    hits.append((i - len(kw) + 1, kw, groups))
+        return hits
+
+    def hits(self, text: str) -> Dict[str, Dict[str, List[int]]]:
+        """{组: {关键词: [起始位置…]}}，用于解释分类依据。"""
+        res: Dict[str, Dict[str, List[int]]] = {}
+        for pos, kw, groups in self.find(text):
+            for g in groups:
+                res.setdefault(g, {}).setdefault(kw, []).append(pos)
+        return res
@@ -0,0 +1,150 @@
+# app/llm.py
+"""
+LLM 调用层：OpenAI 兼容的 /chat/completions 客户端 + 持久结果缓存。
+
+- chat()：直接用 requests POST {LLM_BASE_URL}/chat/completions，不依赖 openai SDK；
+  LLM_BASE_URL 指向本地的 OpenAI 兼容替身服务即可离线测试；
+- LLMCache：data/llm_cache.db（标准库 sqlite3），键由调用方用 cache_key() 生成
+  （模型、提示版本与输入内容的 sha256），值为 JSON；同一本书再分类不再花钱花时间；
+- llm_stats()：调用次数、缓存命中等计数。
+
+提示词与结果解析在使用方（如 app/classify.py），这里不关心具体任务。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from .config import LLM_API_KEY, LLM_BASE_URL, LLM_CACHE_PATH, LLM_MODEL, LLM_TIMEOUT
+
+
+class LLMError(RuntimeError):
+    """接口返回错误或响应格式不对。"""
+
+
+_counters = {"calls": 0, "errors": 0, "cache_hits": 0, "cache_misses": 0, "prompt_tokens": 0, "completion_tokens": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str, n: int = 1):
+    with _counters_lock:
+        _counters[name] += n
+
+
+def llm_configured() -> bool:
+    return bool(LLM_API_KEY and LLM_BASE_URL)
+
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    # requests.Session 不保证线程安全：每个线程一个
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = _local.session = requests.Session()
+    return s
+
+
+def chat(messages: List[dict], model: str = LLM_MODEL, temperature: float = 0.0,
+         timeout=LLM_TIMEOUT, **extra) -> str:
+    """发一次 chat completion，返回第一条回复的文本；失败抛 LLMError。"""
+    url = LLM_BASE_URL.rstrip("/") + "/chat/completions"
+    payload = {"model": model, "messages": messages, "temperature": temperature, **extra}
+    _count("calls")
+    try:
+        resp = _session().post(
+            url, json=payload, timeout=timeout,
+            headers={"Authorization": f"Bearer {LLM_API_KEY}"},
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        usage = data.get("usage") or {}
+        _count("prompt_tokens", int(usage.get("prompt_tokens") or 0))
+        _count("completion_tokens", int(usage.get("completion_tokens") or 0))
+        return data["choices"][0]["message"]["content"] or ""
+    except (requests.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+        _count("errors")
+        raise LLMError(f"LLM 请求失败：{e}") from e
+
+
+def cache_key(model: str, prompt_version: str, *parts) -> str:
+    raw = json.dumps([model, prompt_version, *parts], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """线程安全的 SQLite 结果缓存（单连接 + 锁）；结果不过期，换模型或提示版本即自然失效。"""
+
+    def __init__(self, path=LLM_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key        TEXT PRIMARY KEY,
+                model      TEXT NOT NULL,
+                version    TEXT NOT NULL,
+                value      TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, object]:
+        keys = list(dict.fromkeys(keys))
+        out: Dict[str, object] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                out.update((k, json.loads(v)) for k, v in rows)
+        _count("cache_hits", len(out))
+        _count("cache_misses", len(keys) - len(out))
+        return out
+
+    def put_many(self, items: Dict[str, object], model: str, version: str):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (key, model, version, value, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(k, model, version, json.dumps(v, ensure_ascii=False), now) for k, v in items.items()],
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            n = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {"entries": n}
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def llm_stats() -> Dict[str, int]:
+    with _counters_lock:
+        out = dict(_counters)
+    if _cache is not None:
+        out.update(_cache.stats())
+    return out
@@ -0,0 +1,234 @@
+# app/llm_stage.py
+"""
+LLM 分类：独立于入库事务的异步阶段。
+
+原先 classify_clc 在写线程的事务里同步调 LLM，一次请求几秒到几十秒，整段时间都占着
+SQLite 写锁，别的入库全在排队；接口一慢或挂掉，入库就跟着卡住。现在：
+
+- 入库时只用 CIP + 规则法（classify_clc(..., use_llm=False)），先把规则结果写进 Book.clc；
+- 规则法拿不准的（置信度 < CLC_RULE_CONFIDENT），在事务提交后用 defer_clc() 投进这里；
+- 后台线程里跑一个 asyncio 事件循环：攒批（LLM_BATCH_SIZE 本或等 LLM_LINGER 秒）→ 查持久缓存 →
+  未命中的发一次批量提示；同时在途的请求不超过 LLM_CONCURRENCY（asyncio.Semaphore）；
+- 每次请求限时 LLM_CALL_DEADLINE 秒，失败或超时按“全抖动”指数退避重试 LLM_RETRIES 次，
+  超时只是不再等它，并发名额要等执行请求的线程真正返回才归还（线程里的 HTTP 还在跑）；
+  仍不行就保留规则法结果（计入 fallback），不影响入库；
+- 结果经单写线程回填，只在 clc 仍是当初的规则结果时才改（用户已手工改过的不覆盖）。
+
+HTTP 仍是同步的 requests（项目没有异步 HTTP 依赖），用 run_in_executor 放进线程执行，
+并发与时限由事件循环统一控制。命令行脚本结束前调用 get_llm_stage().drain() 等待剩余请求。
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import random
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import or_, update
+
+from .classify import CLC_RULE_CONFIDENT, LLMInput, llm_enabled, llm_lookup, llm_request
+from .config import (
+    LLM_BATCH_SIZE, LLM_CALL_DEADLINE, LLM_CONCURRENCY, LLM_LINGER,
+    LLM_RETRIES, LLM_RETRY_BACKOFF, LLM_TIMEOUT,
+)
+from .db import Book
+from .llm import LLMError
+from .writer import get_writer
+
+# (book_id, 已写入的规则结果, 书)
+DeferredItem = Tuple[int, str, LLMInput]
+
+
+def should_defer(result: Tuple[str, str, float, str]) -> bool:
+    """classify_clc(..., use_llm=False) 的结果是否还值得交给 LLM 复核。"""
+    return result[3] == "rule" and result[2] < CLC_RULE_CONFIDENT and llm_enabled()
+
+
+def _apply_codes(session, updates: List[Tuple[int, str, str]]) -> int:
+    """写线程里执行：clc 仍为规则结果（或为空）时才改成 LLM 结果。返回实际改动行数。"""
+    n = 0
+    for book_id, provisional, code in updates:
+        res = session.execute(
+            update(Book)
+            .where(Book.id == book_id,
+                   or_(Book.clc == provisional, Book.clc.is_(None), Book.clc == ""))
+            .values(clc=code)
+        )
+        n += res.rowcount or 0
+    return n
+
+
+class LLMStage:
+    """后台事件循环 + 攒批 + 并发上限 + 限时重试。"""
+
+    def __init__(self, concurrency: int = LLM_CONCURRENCY, batch: int = LLM_BATCH_SIZE,
+                 linger: float = LLM_LINGER, deadline: float = LLM_CALL_DEADLINE,
+                 retries: int = LLM_RETRIES, backoff: float = LLM_RETRY_BACKOFF):
+        self.concurrency = max(1, int(concurrency))
+        self.batch = max(1, int(batch))
+        self.linger = float(linger)
+        self.deadline = float(deadline)
+        self.retries = max(0, int(retries))
+        self.backoff = float(backoff)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._outstanding = 0             # 已投递、尚未处理完的书
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        # 以下只在事件循环线程里访问
+        self._buf: List[DeferredItem] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.counters = {"queued": 0, "cache_hits": 0, "requests": 0, "retries": 0, "timeouts": 0,
+                         "errors": 0, "updated": 0, "unchanged": 0, "fallback": 0, "inflight": 0}
+
+    # ---------- 生产者 ----------
+    def submit(self, items: Sequence[DeferredItem]) -> int:
+        """投递一批 (book_id, 规则结果, (title, authors, summary))，立即返回投递数。"""
+        items = [it for it in items if it[0]]
+        if not items:
+            return 0
+        loop = self._ensure_loop()
+        with self._lock:
+            self._outstanding += len(items)
+            self.counters["queued"] += len(items)
+        loop.call_soon_threadsafe(self._enqueue, items)
+        return len(items)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                ready = threading.Event()
+                self._thread = threading.Thread(target=self._run_loop, args=(ready,),
+                                                name="llm-stage", daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run_loop(self, ready: threading.Event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._loop = loop
+        ready.set()
+        loop.run_forever()
+
+    # ---------- 事件循环线程 ----------
+    def _enqueue(self, items: List[DeferredItem]):
+        self._buf.extend(items)
+        if len(self._buf) >= self.batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(self.linger, self._flush)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        buf, self._buf = self._buf, []
+        for i in range(0, len(buf), self.batch):
+            self._loop.create_task(self._process(buf[i:i + self.batch]))
+
+    async def _process(self, part: List[DeferredItem]):
+        try:
+            keys, codes = await asyncio.to_thread(llm_lookup, [book for _id, _p, book in part])
+            self._count("cache_hits", sum(1 for k in set(keys) if k in codes))
+            todo = {k: book for k, (_id, _p, book) in zip(keys, part) if k not in codes}
+            if todo:
+                codes.update(await self._request(list(todo.items())))
+            updates = [(book_id, provisional, codes[k])
+                       for k, (book_id, provisional, _b) in zip(keys, part)
+                       if k in codes and codes[k] != provisional]
+            self._count("fallback", sum(1 for k in keys if k not in codes))
+            self._count("unchanged", sum(1 for k, (_i, p, _b) in zip(keys, part) if codes.get(k) == p))
+            if updates:
+                n = await asyncio.wrap_future(get_writer().submit(_apply_codes, updates))
+                self._count("updated", n)
+                self._count("unchanged", len(updates) - n)
+        except Exception as e:                  # 兜底：后台阶段出错只丢掉这一批的 LLM 结果
+            print("[llm-stage] batch failed:", e)
+            self._count("errors", 1)
+            self._count("fallback", len(part))
+        finally:
+            with self._lock:
+                self._outstanding -= len(part)
+                if self._outstanding <= 0:
+                    self._idle.notify_all()
+
+    async def _request(self, part: List[Tuple[str, LLMInput]]) -> Dict[str, str]:
+        """带并发上限、单次时限和抖动退避的批量请求；重试用尽返回 {}。"""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries", 1)
+                # 全抖动：在 [0, backoff·2^(n-1)] 里随机等，避免一起失败的请求又一起重试
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            await self._sem.acquire()
+            self._count("requests", 1)
+            self._count("inflight", 1)
+            # requests 自己的读超时也收紧到 deadline，超时后的线程不会一直挂着
+            timeout = (LLM_TIMEOUT[0], min(LLM_TIMEOUT[1], self.deadline))
+            fut = self._loop.run_in_executor(None, functools.partial(llm_request, part, timeout=timeout))
+            # 名额随线程结束归还，而不是随 wait_for 超时归还：超时的请求仍占着名额，
+            # 线程里同时跑的 HTTP 请求才真正不超过 concurrency
+            fut.add_done_callback(self._release)
+            try:
+                return await asyncio.wait_for(asyncio.shield(fut), self.deadline)
+            except asyncio.TimeoutError:
+                self._count("timeouts", 1)
+                print(f"[llm-stage] 请求超时（{self.deadline:g}s），第 {attempt + 1} 次")
+            except LLMError as e:
+                self._count("errors", 1)
+                print(f"[llm-stage] 第 {attempt + 1} 次请求失败：", e)
+        return {}
+
+    def _release(self, fut: asyncio.Future):
+        if not fut.cancelled():
+            fut.exception()                 # 超时后才失败的请求：取走异常，免得报“从未取用”
+        self._count("inflight", -1)
+        self._sem.release()
+
+    def _count(self, name: str, n: int):
+        if n:
+            with self._lock:
+                self.counters[name] += n
+
+    # ---------- 状态 ----------
+    def pending(self) -> int:
+        with self._lock:
+            return self._outstanding
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """等待已投递的书全部处理完（含回填提交）；超时返回 False。"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding <= 0, timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.counters)
+            out["pending"] = self._outstanding
+        out["concurrency"] = self.concurrency
+        out["deadline_s"] = self.deadline
+        return out
+
+
+_stage: Optional[LLMStage] = None
+_stage_lock = threading.Lock()
+
+
+def get_llm_stage() -> LLMStage:
+    global _stage
+    with _stage_lock:
+        if _stage is None:
+            _stage = LLMStage()
+        return _stage
+
+
+def defer_clc(items: Sequence[DeferredItem]) -> int:
+    """
+    事务提交后调用：把规则法拿不准的书交给后台 LLM 阶段。
+    LLM 未配置/未启用时什么也不做（规则结果就是最终结果），返回投递数。
+    """
+    if not items or not llm_enabled():
+        return 0
+    return get_llm_stage().submit(items)
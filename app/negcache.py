@@ -0,0 +1,83 @@
+# app/negcache.py
+"""
+未命中缓存：记住“哪个查询在哪个 provider 上查不到”，有效期内再次导入直接跳过，
+不再白白等一遍超时链。force=True 的调用（界面上的“强制重试”/“刷新”）会忽略它。
+
+原因（reason）及有效期见 config.NEGATIVE_CACHE_TTL：
+- no_result      站点没有结果
+- isbn_mismatch  搜到的书 ISBN 与输入不一致
+- http_error     超时/连接失败/5xx 等
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .config import NEGATIVE_CACHE_TTL
+from .db import NegativeCache
+from .utils import find_isbn, normalize_whitespace
+
+NO_RESULT = "no_result"
+ISBN_MISMATCH = "isbn_mismatch"
+HTTP_ERROR = "http_error"
+
+
+def normalize_query(query: str) -> str:
+    """能识别出 ISBN 就以其 ISBN-13 为键（10/13 位写法共用记录），否则折叠空白并转小写。"""
+    isbn = find_isbn(query or "")
+    if isbn:
+        return isbn.upper()
+    return normalize_whitespace(query).lower()
+
+
+def known_misses(session, query_norm: str, sites: Iterable[str]) -> Dict[str, str]:
+    """返回仍在有效期内的 {site: reason}。"""
+    sites = list(sites)
+    if not query_norm or not sites:
+        return {}
+    rows = session.execute(
+        select(NegativeCache.provider, NegativeCache.reason).where(
+            NegativeCache.query_norm == query_norm,
+            NegativeCache.provider.in_(sites),
+            NegativeCache.expires_at > datetime.utcnow(),
+        )
+    ).all()
+    return {site: reason for site, reason in rows}
+
+
+def record_misses(session, query_norm: str, misses: Dict[str, str]) -> None:
+    """写入/刷新若干 (query, site) 的未命中记录（调用方负责提交）。"""
+    if not query_norm or not misses:
+        return
+    now = datetime.utcnow()
+    for site, reason in misses.items():
+        ttl = NEGATIVE_CACHE_TTL.get(reason, NEGATIVE_CACHE_TTL.get(NO_RESULT, 0))
+        if ttl <= 0:
+            continue
+        values = dict(query_norm=query_norm, provider=site, reason=reason,
+                      created_at=now, expires_at=now + timedelta(seconds=ttl))
+        stmt = sqlite_insert(NegativeCache).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["query_norm", "provider"],
+            set_={"reason": reason, "created_at": now, "expires_at": values["expires_at"]},
+        )
+        session.execute(stmt)
+
+
+def forget(session, query_norm: Optional[str] = None, site: Optional[str] = None) -> int:
+    """删除未命中记录；都不给则清空全部。返回删除条数（调用方负责提交）。"""
+    stmt = delete(NegativeCache)
+    if query_norm:
+        stmt = stmt.where(NegativeCache.query_norm == query_norm)
+    if site:
+        stmt = stmt.where(NegativeCache.provider == site)
+    return session.execute(stmt).rowcount or 0
+
+
+def purge_expired(session) -> int:
+    return session.execute(
+        delete(NegativeCache).where(NegativeCache.expires_at <= datetime.utcnow())
+    ).rowcount or 0
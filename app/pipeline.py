@@ -1,72 +1,70 @@
 # app/pipeline.py
-import json
-import requests
+import threading
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, Future
 from time import perf_counter
-from typing import Optional
-from slugify import slugify
+from typing import Iterable, Iterator, Optional, Tuple, Any
 from sqlalchemy.exc import IntegrityError
-from pathlib import Path
 
-from .db import SessionLocal, init_db, Book, Source
+from .db import SessionLocal, Book
+from .registry import get_registry
 from .nlp import split_title_author
 from .utils import find_isbn
-from .config import COVERS_DIR, PROVIDERS, USER_AGENT, REQUEST_TIMEOUT
+from .isbn import InvalidISBN, to_isbn13, same_isbn, looks_like_isbn, is_valid as is_valid_isbn
+from .config import (
+    PROVIDERS, INGEST_WORKERS, BULK_CHUNK, SITE_CONCURRENCY, SITE_CONCURRENCY_DEFAULT, PROVIDER_FANOUT,
+)
 from .classify import classify_clc
+from .llm_stage import defer_clc, should_defer
+from .covers import fetch_cover, get_cover_queue  # noqa: F401  fetch_cover 保持原导入路径可用
+from .httpcache import http_error_count
+from .breaker import breaker_for
+from .writer import run_write
+from .bulk import bulk_ingest
+from .sources import add_sources, source_row
+from .dims import sync_book_dims
+from . import negcache
 
 
 # ---------- Provider 装载 ----------
 def get_providers():
     """
-    从 app/providers 子包按 config.PROVIDERS 顺序装载。
+    按 config.PROVIDERS 顺序新建一组 provider（每次都是新实例、新 Session）。
+    流水线本身改用 registry.get_registry().providers()，按线程复用实例；
+    这里保留给自检脚本等需要“全新一组”的场合。
     """
-    prov_map = {}
-    try:
-        from .providers.douban import DoubanProvider
-        prov_map["douban"] = DoubanProvider
-    except Exception as e:
-        print("[prov] douban load failed:", e)
-
-    try:
-        from .providers.jd import JDProvider
-        prov_map["jd"] = JDProvider
-    except Exception as e:
-        print("[prov] jd load failed:", e)
-
-    loaded = [prov_map[name]() for name in PROVIDERS if name in prov_map]
+    loaded = [cls() for cls in get_registry().provider_classes()]
     print("[pipeline] providers:", [p.__class__.__name__ for p in loaded])
     return loaded
 
 
-# ---------- 封面抓取（返回“相对路径”） ----------
-def fetch_cover(url: Optional[str]) -> str:
-    """
-    下载封面到 data/covers 下，返回相对路径 'covers/<file>.jpg'。
-    若失败返回空字符串。
-    """
-    if not url:
-        return ""
-    try:
-        r = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=REQUEST_TIMEOUT)
-        r.raise_for_status()
-        # 文件名尽量稳定，控制长度
-        fname = slugify(url)[:80] + ".jpg"
-        abs_path = COVERS_DIR / fname
-        abs_path.write_bytes(r.content)
-        # ★ 关键：返回相对路径
-        return f"covers/{fname}"
-    except Exception as e:
-        print("[cover] fetch failed:", e)
-        return ""
+# ---------- 并发控制：站点并发上限 ----------
+_site_sems: dict = {}
+_site_sems_lock = threading.Lock()
+
+
+def _site_slot(site: str) -> threading.BoundedSemaphore:
+    """站点级信号量：同一站点同时在途的查询数不超过 SITE_CONCURRENCY。"""
+    with _site_sems_lock:
+        sem = _site_sems.get(site)
+        if sem is None:
+            n = SITE_CONCURRENCY.get(site, SITE_CONCURRENCY_DEFAULT)
+            sem = _site_sems[site] = threading.BoundedSemaphore(max(1, int(n)))
+        return sem
 
 
 # ---------- 写入/更新 ----------
 def _get_or_create_book_by_detail(d, session: SessionLocal) -> Book:
     """
-    有 ISBN 按 ISBN 定位并更新；无 ISBN 新建，避免按标题误合并。
+    有 ISBN 按规范 ISBN-13（books.isbn13）定位并更新——10 位/13 位写法落到同一行；
+    校验不过的 ISBN 退回按原样匹配；无 ISBN 新建，避免按标题误合并。
     """
     isbn = (d.isbn or "").strip() or None
     if isbn:
-        b = session.query(Book).filter(Book.isbn == isbn).first()
+        code = to_isbn13(isbn)
+        q = session.query(Book)
+        b = (q.filter(Book.isbn13 == code) if code else q.filter(Book.isbn == isbn)).first()
         if not b:
             b = Book(isbn=isbn, title_std=d.title or "", authors_std=",".join(d.authors or []))
             session.add(b)
@@ -113,108 +111,383 @@ def _get_or_create_book_by_detail(d, session: SessionLocal) -> Book:
     return b
 
 
+def _write_detail(session, detail, site: str, query_norm: str, force: bool, deferred: Optional[list] = None):
+    """
+    写线程里执行：合并书目、按需自动分类、记一条 Source。
+    返回 (book_id, 是否已有封面)——只回传普通值，不把 ORM 对象带出写线程。
+    规则法拿不准、需要 LLM 复核的书追加到 deferred，由调用方在提交后交给 defer_clc()。
+    """
+    book = _get_or_create_book_by_detail(detail, session)
+
+    # ---- 自动分类（clc 为空时）：事务里只用 CIP + 规则法，LLM 放到提交之后 ----
+    if not getattr(book, "clc", None):
+        title = book.title_std or ""
+        authors = (book.authors_std or "").split(",") if book.authors_std else []
+        summary = book.summary or ""
+        res = classify_clc(title=title, authors=authors, summary=summary,
+                           cip=getattr(book, "cip", None), use_llm=False)
+        code = (res[0] or "").strip()
+        if code:
+            book.clc = code
+            if deferred is not None and should_defer(res):
+                deferred.append((book.id, code, (title, authors, summary)))
+
+    session.flush()
+    # 来源记录：内容未变不追加，只留最近 N 条（app/sources.py）
+    add_sources(session, [source_row(book.id, site, detail)])
+    # 作者/出版社维表
+    sync_book_dims(session, [book.id])
+
+    # 强制重试成功：清掉该站点过期前的未命中记录
+    if force:
+        negcache.forget(session, query_norm, site)
+
+    session.flush()
+    return book.id, bool(book.cover_path)
+
+
+# ---------- 单个 provider 查询 ----------
+def _lookup(p, isbn_input: Optional[str], search_candidates: list,
+            cancel: Optional[threading.Event] = None):
+    """
+    ISBN 直查优先，其次按候选关键词逐个搜索；返回 BookDetail 或 None。
+    cancel 被置位时在下一个检查点放弃（并行查询时已有更高优先级结果）。
+    """
+    detail = None
+    # 1) ISBN 直查
+    if isbn_input and hasattr(p, "get_by_isbn"):
+        detail = p.get_by_isbn(isbn_input)
+
+    # 2) 关键词（多路兜底）
+    if not detail and hasattr(p, "search"):
+        for q in search_candidates:
+            if cancel is not None and cancel.is_set():
+                return None
+            res = p.search(q)
+            if res:
+                if cancel is not None and cancel.is_set():
+                    return None
+                if hasattr(p, "get_detail") and getattr(res[0], "url", None):
+                    detail = p.get_detail(res[0].url)
+                elif hasattr(p, "get_by_isbn") and getattr(res[0], "isbn", None):
+                    detail = p.get_by_isbn(res[0].isbn)
+            if detail:
+                break
+    return detail
+
+
+def _timed_lookup(p, isbn_input: Optional[str], search_candidates: list,
+                  cancel: Optional[threading.Event] = None, misses: Optional[dict] = None):
+    """
+    带站点并发上限与日志的 _lookup；异常吞掉并视为无结果。
+    misses 非空时记下未命中原因（请求出错 → http_error，否则 no_result）。
+    """
+    t0 = perf_counter()
+    site = getattr(p, "site", p.__class__.__name__)
+    # 熔断中：整站跳过（不记入未命中缓存，站点恢复后照常查询）
+    if breaker_for(site).is_open():
+        print(f"[{p.__class__.__name__}] circuit open, skipped")
+        return None
+    detail = None
+    errors_before = http_error_count()
+    failed = False
+    try:
+        # 同一 provider 实例同一时刻只跑一个查询（被丢弃的并行查询可能尚未退出）
+        with _provider_lock(p), _site_slot(site):
+            detail = _lookup(p, isbn_input, search_candidates, cancel)
+    except Exception as e:
+        failed = True
+        print(f"[{p.__class__.__name__}] exception:", e)
+    if not detail and not (cancel is not None and cancel.is_set()):
+        print(f"[{p.__class__.__name__}] no result ({perf_counter()-t0:.1f}s), next…")
+        if misses is not None:
+            failed = failed or http_error_count() > errors_before
+            misses[site] = negcache.HTTP_ERROR if failed else negcache.NO_RESULT
+    return detail
+
+
+def _provider_lock(p) -> threading.Lock:
+    return p.__dict__.setdefault("_lookup_lock", threading.Lock())
+
+
+def _accept_detail(p, detail, isbn_input: Optional[str], misses: Optional[dict] = None) -> bool:
+    """ISBN 一致性保护；provider 没给 ISBN 而我们按 ISBN 入库时回填。"""
+    if not detail:
+        return False
+    if isbn_input and getattr(detail, "isbn", None):
+        if not same_isbn(detail.isbn, isbn_input):
+            print(f"[{p.__class__.__name__}] isbn mismatch: got {detail.isbn} expect {isbn_input}")
+            if misses is not None:
+                misses[getattr(p, "site", p.__class__.__name__)] = negcache.ISBN_MISMATCH
+            return False
+    if isbn_input and not getattr(detail, "isbn", None):
+        detail.isbn = isbn_input
+    return True
+
+
+_fanout_pool: Optional[ThreadPoolExecutor] = None
+_fanout_pool_lock = threading.Lock()
+
+
+def _get_fanout_pool() -> ThreadPoolExecutor:
+    global _fanout_pool
+    with _fanout_pool_lock:
+        if _fanout_pool is None:
+            _fanout_pool = ThreadPoolExecutor(
+                max_workers=max(4, len(PROVIDERS) * INGEST_WORKERS),
+                thread_name_prefix="fanout",
+            )
+        return _fanout_pool
+
+
+def _iter_details(providers, isbn_input: Optional[str], search_candidates: list, fanout: bool,
+                  misses: Optional[dict] = None):
+    """
+    按 provider 优先级依次产出 (provider, detail)，只产出通过校验的结果。
+    - 串行：逐个 provider 查询；
+    - 并行（fanout）：同时发起全部查询，仍按优先级顺序等待——最高优先级的有效
+      结果一到就产出；调用方不再迭代时，低优先级的查询被取消（未开始）或丢弃（在途）。
+    misses 收集各 provider 的未命中原因（被取消/丢弃的不计）。
+    """
+    if not fanout or len(providers) <= 1:
+        for p in providers:
+            detail = _timed_lookup(p, isbn_input, search_candidates, misses=misses)
+            if _accept_detail(p, detail, isbn_input, misses):
+                yield p, detail
+        return
+
+    cancel = threading.Event()
+    pool = _get_fanout_pool()
+    futs: list[Future] = [
+        pool.submit(_timed_lookup, p, isbn_input, search_candidates, cancel, misses) for p in providers
+    ]
+    try:
+        for p, fut in zip(providers, futs):
+            detail = fut.result()
+            if _accept_detail(p, detail, isbn_input, misses):
+                yield p, detail
+    finally:
+        cancel.set()
+        for fut in futs:
+            fut.cancel()
+
+
 # ---------- 主流程 ----------
-def search_and_ingest(query: str):
+def _prepare_query(session, query: str, providers, force: bool):
+    """
+    解析查询并去掉未命中缓存里仍有效的 provider。
+    返回 (providers, isbn_input, search_candidates, query_norm)；providers 可能为空。
+    整串看起来就是 ISBN 但校验位不对时抛 InvalidISBN——不为笔误白跑一轮网络请求。
+    """
+    if looks_like_isbn(query) and not is_valid_isbn(query):
+        raise InvalidISBN(f"ISBN 校验位不正确：{query.strip()}")
+    registry = get_registry()
+    registry.ensure_db()
+    if providers is None:
+        providers = registry.providers()
+
+    title, authors = split_title_author(query)
+    isbn_input = find_isbn(query)
+    author1 = (authors[0] if authors else "").strip()
+
+    # 多路候选：标题 → 标题+第一作者 → 原始输入
+    search_candidates = []
+    if title:
+        search_candidates.append(title)
+    if title and author1:
+        search_candidates.append(f"{title} {author1}")
+    search_candidates.append(query)
+
+    # ---- 未命中缓存：有效期内已知查不到的 provider 直接跳过 ----
+    query_norm = negcache.normalize_query(query)
+    if not force:
+        with session.begin():
+            skip = negcache.known_misses(
+                session, query_norm, [getattr(p, "site", p.__class__.__name__) for p in providers]
+            )
+        if skip:
+            print(f"[negcache] skip {query_norm!r}: {skip}")
+            providers = [p for p in providers if getattr(p, "site", p.__class__.__name__) not in skip]
+    return providers, isbn_input, search_candidates, query_norm
+
+
+def lookup_detail(query: str, providers=None, fanout: Optional[bool] = None, force: bool = False):
+    """
+    只查询、不写库：返回 (query_norm, site, BookDetail)，供批量写库（app/bulk.py）使用。
+    全部 provider 都未命中时记入未命中缓存并返回 None。
+    """
+    session = SessionLocal()
+    try:
+        providers, isbn_input, search_candidates, query_norm = _prepare_query(
+            session, query, providers, force)
+    finally:
+        session.close()
+    if not providers:
+        return None
+    if fanout is None:
+        fanout = PROVIDER_FANOUT
+    misses: dict = {}
+    with closing(_iter_details(providers, isbn_input, search_candidates, fanout, misses)) as details:
+        for p, detail in details:
+            return query_norm, getattr(p, "site", p.__class__.__name__), detail
+    if misses:
+        run_write(negcache.record_misses, query_norm, misses)
+    return None
+
+
+def search_and_ingest(query: str, providers=None, fanout: Optional[bool] = None, force: bool = False):
     """
     1) 解析 ISBN/标题；
     2) 依次尝试 providers（失败快）；
-    3) 写书目 + 封面（★ 以相对路径保存）；
+    3) 写书目；封面在提交后交给后台队列（app/covers.py，★ 以相对路径保存）；
     4) 若 clc 为空则自动分类；
     5) 记一条 Source。
+    3)~5) 在单写线程里执行（app/writer.py），与其它线程的入库结果合并成小批量事务提交。
+
+    providers 可由调用方传入，缺省取注册表里当前线程的一组（进程内复用，保持长连接）。
+    fanout=True 时并行查询所有 provider（见 _iter_details），缺省取 config.PROVIDER_FANOUT。
+    未命中缓存（app/negcache.py）里仍有效的 provider 会被跳过；force=True 时忽略并重新查询。
     """
-    init_db()
-    providers = get_providers()
     session = SessionLocal()
 
     try:
-        title, authors = split_title_author(query)
-        isbn_input = find_isbn(query)
-        author1 = (authors[0] if authors else "").strip()
-
-        # 多路候选：标题 → 标题+第一作者 → 原始输入
-        search_candidates = []
-        if title:
-            search_candidates.append(title)
-        if title and author1:
-            search_candidates.append(f"{title} {author1}")
-        search_candidates.append(query)
+        providers, isbn_input, search_candidates, query_norm = _prepare_query(
+            session, query, providers, force)
+        if not providers:
+            return None
+        if fanout is None:
+            fanout = PROVIDER_FANOUT
+        misses: dict = {}
 
-        for p in providers:
-            t0 = perf_counter()
-            detail = None
-            try:
-                # 1) ISBN 直查
-                if isbn_input and hasattr(p, "get_by_isbn"):
-                    detail = p.get_by_isbn(isbn_input)
-
-                # 2) 关键词（多路兜底）
-                if not detail and hasattr(p, "search"):
-                    for q in search_candidates:
-                        res = p.search(q)
-                        if res:
-                            if hasattr(p, "get_detail") and getattr(res[0], "url", None):
-                                detail = p.get_detail(res[0].url)
-                            elif hasattr(p, "get_by_isbn") and getattr(res[0], "isbn", None):
-                                detail = p.get_by_isbn(res[0].isbn)
-                        if detail:
-                            break
-            except Exception as e:
-                session.rollback()
-                print(f"[{p.__class__.__name__}] exception:", e)
-
-            if not detail:
-                print(f"[{p.__class__.__name__}] no result ({perf_counter()-t0:.1f}s), next…")
-                continue
-
-            # ★ ISBN 一致性保护
-            if isbn_input and getattr(detail, "isbn", None):
-                if detail.isbn.replace("-", "").upper() != isbn_input.replace("-", "").upper():
-                    print(f"[{p.__class__.__name__}] isbn mismatch: got {detail.isbn} expect {isbn_input}")
-                    continue
-
-            # 若 provider 没给 ISBN，但我们是 ISBN 入库，回填
-            if isbn_input and not getattr(detail, "isbn", None):
-                detail.isbn = isbn_input
-
-            try:
-                with session.begin():
-                    book = _get_or_create_book_by_detail(detail, session)
-
-                    # ---- 封面：保存为相对路径 ----
-                    rel_cover = fetch_cover(getattr(detail, "cover_url", None))
-                    if rel_cover and not book.cover_path:
-                        book.cover_path = rel_cover  # e.g. "covers/xxxx.jpg"
-
-                    # ---- 自动分类（clc 为空时）----
-                    if not getattr(book, "clc", None):
-                        code, _, _, _ = classify_clc(
-                            title=book.title_std or "",
-                            authors=(book.authors_std or "").split(",") if book.authors_std else [],
-                            summary=book.summary or "",
-                            cip=getattr(book, "cip", None),
-                        )
-                        if code and code.strip():
-                            book.clc = code.strip()
-
-                    s = Source(
-                        book_id=book.id,
-                        site=getattr(p, "site", p.__class__.__name__),
-                        url=getattr(detail, "url", ""),
-                        extracted=json.dumps(detail.__dict__, ensure_ascii=False),
-                    )
-                    session.add(s)
-
-                return book.id
-
-            except IntegrityError as ie:
-                session.rollback()
-                print("[DB] IntegrityError:", ie)
-                if getattr(detail, "isbn", None):
-                    existing = session.query(Book).filter(Book.isbn == detail.isbn).first()
-                    if existing:
-                        return existing.id
+        # closing()：提前 return 时立即取消/丢弃其余并行查询
+        with closing(_iter_details(providers, isbn_input, search_candidates, fanout, misses)) as details:
+            for p, detail in details:
+                site = getattr(p, "site", p.__class__.__name__)
+                try:
+                    # 写库交给单写线程（与其它线程的入库结果合并提交）
+                    deferred: list = []
+                    book_id, has_cover = run_write(_write_detail, detail, site, query_norm, force, deferred)
+
+                    # ---- LLM 复核分类：同样在提交后异步进行 ----
+                    defer_clc(deferred)
+
+                    # ---- 封面：元数据已提交，交给后台队列下载（不占写事务）----
+                    if not has_cover:
+                        get_cover_queue().submit(book_id, getattr(detail, "cover_url", None))
+
+                    return book_id
+
+                except IntegrityError as ie:
+                    print("[DB] IntegrityError:", ie)
+                    if getattr(detail, "isbn", None):
+                        code = to_isbn13(detail.isbn)
+                        existing = session.query(Book.id).filter(
+                            Book.isbn13 == code if code else Book.isbn == detail.isbn
+                        ).scalar()
+                        if existing:
+                            return existing
 
+        # 全部 provider 都没拿到：记下各自的原因，下次导入直接跳过
+        if misses:
+            run_write(negcache.record_misses, query_norm, misses)
         return None
 
     finally:
         session.close()
+
+
+# ---------- 批量入库 ----------
+def search_and_ingest_many(
+    queries: Iterable[Any],
+    max_workers: Optional[int] = None,
+    fanout: Optional[bool] = None,
+    force: bool = False,
+    bulk: bool = False,
+    chunk: Optional[int] = None,
+) -> Iterator[Tuple[Any, Optional[int], Optional[Exception]]]:
+    """
+    批量入库：在有界线程池中并发执行 search_and_ingest，按输入顺序逐条产出
+    (row, book_id, error)。
+
+    - queries 的元素可以是查询串，也可以是 (row, query) 二元组；
+      纯字符串时 row 为从 1 开始的序号。row 原样回传，便于调用方记录行号/原文。
+    - 同时在途的任务不超过 max_workers*2，超大 CSV 也不会整体读入内存。
+    - 各站点的并发另受 SITE_CONCURRENCY 限制；工作线程常驻，各自复用注册表里的 provider/Session。
+    - 单条失败不会中断批次：异常放在 error 里返回，book_id 为 None。
+    - bulk=True：工作线程只查询（lookup_detail），查到的详情每攒 chunk 条（缺省 BULK_CHUNK）
+      用 app/bulk.py 批量 upsert 一次；结果在所在块提交后才产出。
+    """
+    get_registry().ensure_db()
+    workers = max(1, int(max_workers or INGEST_WORKERS))
+    pool = _get_ingest_pool(workers)
+
+    def _run(q: str):
+        if bulk:
+            return lookup_detail(q, fanout=fanout, force=force)
+        return search_and_ingest(q, fanout=fanout, force=force)
+
+    def _collect(row, fut):
+        try:
+            return row, fut.result(), None
+        except Exception as e:
+            return row, None, e
+
+    def _ordered():
+        pending = deque()
+        for i, item in enumerate(queries, 1):
+            row, q = item if isinstance(item, tuple) else (i, item)
+            pending.append((row, pool.submit(_run, q)))
+            while len(pending) >= workers * 2:
+                yield _collect(*pending.popleft())
+        while pending:
+            yield _collect(*pending.popleft())
+
+    if not bulk:
+        yield from _ordered()
+        return
+
+    size = max(1, int(chunk or BULK_CHUNK))
+    buf = []
+    found = 0
+    for row, res, err in _ordered():
+        buf.append((row, res, err))
+        found += res is not None
+        if found >= size:
+            yield from _flush_bulk(buf, force)
+            buf, found = [], 0
+    yield from _flush_bulk(buf, force)
+
+
+def _flush_bulk(buf: list, force: bool):
+    """把一块查询结果批量写库，再按原顺序产出 (row, book_id, error)。"""
+    items = [res for _row, res, _err in buf if res is not None]
+    ids, error = [], None
+    if items:
+        try:
+            ids = bulk_ingest(items, chunk=len(items), force=force)
+        except Exception as e:
+            print("[bulk] chunk failed:", e)
+            error = e
+    it = iter(ids)
+    for row, res, err in buf:
+        if res is None:
+            yield row, None, err
+        elif error is not None:
+            yield row, None, error
+        else:
+            yield row, next(it), None
+
+
+# 入库线程池按大小常驻：线程不退出，线程里的 provider/Session（见 registry）就一直复用
+_ingest_pools: dict = {}
+_ingest_pools_lock = threading.Lock()
+
+
+def _get_ingest_pool(workers: int) -> ThreadPoolExecutor:
+    with _ingest_pools_lock:
+        pool = _ingest_pools.get(workers)
+        if pool is None:
+            pool = _ingest_pools[workers] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=f"ingest{workers}"
+            )
+        return pool
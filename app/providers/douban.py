@@ -1,7 +1,6 @@
 # app/providers/douban.py
 import re, random, json
 import requests
-from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 from urllib.parse import quote
@@ -9,23 +8,25 @@ from typing import Optional, List
 
 from ..config import USER_AGENT, REQUEST_TIMEOUT, REQUEST_TIMEOUT_FAST
 from .base import Provider, SearchResult, BookDetail
+from ..httpcache import cached_session
 
 BASE = "https://book.douban.com"
 
 def _mk_session():
-    s = requests.Session()
-    s.headers.update({
+    headers = {
         "User-Agent": USER_AGENT,
         "Accept-Language": "zh-CN,zh;q=0.9",
         "Referer": BASE + "/",
         # 随机 bid，豆瓣更容易给 200
         "Cookie": f"bid={''.join(random.choices('abcdefghijklmnopqrstuvwxyz0123456789', k=11))};"
-    })
+    }
+    # 429/403 不在这里重试，也不按 Retry-After 睡：urllib3 的重试绕过站点限速器，
+    # 交给 AdaptiveLimiter 看到原始响应后降速（见 app/ratelimit.py）
     retry = Retry(total=2, connect=1, read=1, backoff_factor=0.3,
-                  status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
-    s.mount("https://", HTTPAdapter(max_retries=retry))
-    s.mount("http://", HTTPAdapter(max_retries=retry))
-    return s
+                  status_forcelist=[500, 502, 503, 504], raise_on_status=False,
+                  respect_retry_after_header=False)
+    # 经 HTTP 缓存（app/httpcache.py）发请求；重复导入/刷新可直接命中
+    return cached_session(headers, retry=retry)
 
 class DoubanProvider(Provider):
     site = "douban"
@@ -1,7 +1,7 @@
-import requests
 from typing import Optional
 from ..config import USER_AGENT, REQUEST_TIMEOUT
 from .base import Provider, SearchResult, BookDetail
+from ..httpcache import cached_session
 
 API = "https://www.googleapis.com/books/v1/volumes"
 
@@ -9,9 +9,13 @@ class GoogleBooksProvider(Provider):
     site = "googlebooks"
     headers = {"User-Agent": USER_AGENT}
 
+    def __init__(self):
+        # 经 HTTP 缓存发请求（原先是裸 requests.get，每次都新建连接）
+        self.sess = cached_session(self.headers)
+
     def search(self, query: str):
         params = {"q": query, "maxResults": 5, "printType": "books"}
-        r = requests.get(API, params=params, headers=self.headers, timeout=REQUEST_TIMEOUT)
+        r = self.sess.get(API, params=params, timeout=REQUEST_TIMEOUT)
         r.raise_for_status()
         data = r.json()
         out = []
@@ -32,7 +36,7 @@ class GoogleBooksProvider(Provider):
 
     def get_by_isbn(self, isbn: str) -> Optional[BookDetail]:
         params = {"q": f"isbn:{isbn}", "maxResults": 1}
-        r = requests.get(API, params=params, headers=self.headers, timeout=REQUEST_TIMEOUT)
+        r = self.sess.get(API, params=params, timeout=REQUEST_TIMEOUT)
         if r.status_code != 200:
             return None
         data = r.json()
@@ -42,7 +46,7 @@ class GoogleBooksProvider(Provider):
         return self._to_detail(items[0])
 
     def get_detail(self, url: str) -> Optional[BookDetail]:
-        r = requests.get(url, headers=self.headers, timeout=REQUEST_TIMEOUT)
+        r = self.sess.get(url, timeout=REQUEST_TIMEOUT)
         if r.status_code != 200:
             return None
         return self._to_detail(r.json())
@@ -6,6 +6,7 @@ from rapidfuzz import fuzz
 from ..config import DATA_DIR
 from .base import Provider, SearchResult, BookDetail
 from ..nlp import clean_line
+from ..isbn import to_isbn13
 
 # 离线 JSON 文件路径
 CATALOG_PATH = (DATA_DIR / "offline_catalog.json").resolve()
@@ -64,9 +65,12 @@ class LocalJSONProvider(Provider):
         )]
 
     def get_by_isbn(self, isbn: str) -> Optional[BookDetail]:
+        code = to_isbn13(isbn)
+        if not code:
+            return None
         items = self._load()
         for it in items:
-            if it.get("isbn") and it["isbn"].replace("-", "") == isbn.replace("-", ""):
+            if it.get("isbn") and to_isbn13(it["isbn"]) == code:
                 return self._to_detail(it)
         return None
 
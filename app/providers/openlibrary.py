@@ -1,7 +1,7 @@
-import requests
 from typing import Optional
 from ..config import USER_AGENT, REQUEST_TIMEOUT
 from .base import Provider, SearchResult, BookDetail
+from ..httpcache import cached_session
 
 BASE = "https://openlibrary.org"
 
@@ -9,8 +9,12 @@ class OpenLibraryProvider(Provider):
     site = "openlibrary"
     headers = {"User-Agent": USER_AGENT}
 
+    def __init__(self):
+        # 经 HTTP 缓存发请求（原先是裸 requests.get，每次都新建连接）
+        self.sess = cached_session(self.headers)
+
     def search(self, query: str):
-        r = requests.get(f"{BASE}/search.json", params={"title": query}, headers=self.headers, timeout=REQUEST_TIMEOUT)
+        r = self.sess.get(f"{BASE}/search.json", params={"title": query}, timeout=REQUEST_TIMEOUT)
         r.raise_for_status()
         data = r.json()
         out = []
@@ -24,7 +28,7 @@ class OpenLibraryProvider(Provider):
         return out
 
     def get_by_isbn(self, isbn: str) -> Optional[BookDetail]:
-        r = requests.get(f"{BASE}/isbn/{isbn}.json", headers=self.headers, timeout=REQUEST_TIMEOUT)
+        r = self.sess.get(f"{BASE}/isbn/{isbn}.json", timeout=REQUEST_TIMEOUT)
         if r.status_code != 200:
             return None
         d = r.json()
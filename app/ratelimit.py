@@ -0,0 +1,162 @@
+# app/ratelimit.py
+"""
+按站点的自适应令牌桶限速。
+
+- TokenBucket：线程安全，rate（令牌/秒）+ burst（桶容量）；线程里用 acquire()，
+  asyncio 里用 await acquire_async()——两者共用同一只桶；
+- AdaptiveLimiter：遇到 429/403 时速率减半（不低于 min_rate），若有 Retry-After
+  则在那之前整站暂停；之后每次成功按 base_rate 的一小步慢慢恢复（AIMD）。
+
+所有 provider 的 HTTP 请求都经 httpcache.CachingAdapter 发出，在真正走网络前调用
+limiter_for_url(url).acquire()，拿到响应后 observe(status, headers)；命中缓存不消耗令牌。
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from .config import RATE_LIMITS, SITE_HOSTS
+
+# Retry-After 最长只认这么久，防止对方给个离谱的值把整站卡死
+MAX_RETRY_AFTER = 300.0
+
+
+class TokenBucket:
+    """线程安全令牌桶（预约式：先扣令牌再睡到该轮到自己的时刻）。"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill_locked(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def _reserve(self, n: float = 1.0) -> float:
+        """扣掉 n 个令牌，返回需要等待的秒数。"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill_locked(now)
+            self._tokens -= n
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self, n: float = 1.0) -> float:
+        wait = self._reserve(n)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, n: float = 1.0) -> float:
+        wait = self._reserve(n)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    # 兼容旧接口 utils.RateLimiter.wait()
+    wait = acquire
+
+
+class AdaptiveLimiter(TokenBucket):
+    def __init__(self, site: str, rate: float, burst: int = 1,
+                 min_rate: Optional[float] = None, recover_step: float = 0.05):
+        super().__init__(rate, burst)
+        self.site = site
+        self.base_rate = float(rate)
+        self.min_rate = float(min_rate if min_rate is not None else rate / 16)
+        self.recover_step = float(recover_step)
+        self.throttled = 0          # 累计被限流（429/403）次数
+        self.last_throttle_at: Optional[float] = None
+
+    def penalize(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill_locked(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + min(retry_after, MAX_RETRY_AFTER))
+            self.throttled += 1
+            self.last_throttle_at = time.time()
+        print(f"[ratelimit] {self.site} throttled → {self.rate:.2f} req/s"
+              + (f", pause {retry_after:.0f}s" if retry_after else ""))
+
+    def reward(self):
+        if self.rate >= self.base_rate:
+            return
+        with self._lock:
+            self._refill_locked(time.monotonic())
+            self.rate = min(self.base_rate, self.rate + self.base_rate * self.recover_step)
+
+    def observe(self, status: int, headers=None):
+        """根据响应调整速率：429/403 退避，其它非 5xx 视为成功。"""
+        if status in (429, 403):
+            self.penalize(parse_retry_after((headers or {}).get("Retry-After")))
+        elif status < 500:
+            self.reward()
+
+    def state(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "rate": round(self.rate, 3),
+                "base_rate": self.base_rate,
+                "burst": self.burst,
+                "tokens": round(min(self.burst, self._tokens + (now - self._last) * self.rate), 2),
+                "paused_s": round(max(0.0, self._blocked_until - now), 1),
+                "throttled": self.throttled,
+            }
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Retry-After 可以是秒数，也可以是 HTTP 日期。"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def site_for_url(url: str) -> str:
+    """按 config.SITE_HOSTS 把主机名归到站点；未登记的主机各自一个桶。"""
+    host = (urlsplit(url).hostname or "").lower()
+    for site, suffixes in SITE_HOSTS.items():
+        if any(host == s or host.endswith("." + s) for s in suffixes):
+            return site
+    return host or "default"
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(site: str) -> AdaptiveLimiter:
+    with _limiters_lock:
+        lim = _limiters.get(site)
+        if lim is None:
+            cfg = RATE_LIMITS.get(site) or RATE_LIMITS["default"]
+            lim = _limiters[site] = AdaptiveLimiter(site, cfg["rate"], cfg["burst"])
+        return lim
+
+
+def limiter_for_url(url: str) -> AdaptiveLimiter:
+    return limiter_for(site_for_url(url))
+
+
+def limiter_states() -> Dict[str, dict]:
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {site: lim.state() for site, lim in items}
@@ -0,0 +1,171 @@
+# app/readmodel.py
+"""
+列表读模型：两个 UI 共用的分页查询。
+
+- 只查列表需要的列（id/标题/作者/ISBN/CLC/封面），不再把 summary/author_bio 整行读出来；
+- 浏览：按 id 倒序的 keyset 分页（WHERE id < :cursor），翻到第几页都是一次索引范围扫描；
+- 搜索：按相关度排序（app/search.py），结果 id 列表封顶 SEARCH_MAX_RESULTS，按偏移翻页；
+- “作者:xxx” / “出版社:xxx”：经 authors/publishers 维表的索引定位（app/dims.py），同样 keyset 分页；
+- filters：分面筛选 {facet: value}（app/facets.py），可与以上任一种组合；
+- count_estimate()：总数，缓存 COUNT_CACHE_TTL 秒（列表页每次重绘不必都 COUNT 一遍）。
+
+Page.cursor 是下一页的游标（浏览为本页最后一个 id，搜索为偏移量），None 表示没有下一页。
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from sqlalchemy import func, select
+
+from .db import Book, BookAuthor
+from .dims import resolve_author_ids, resolve_publisher_ids
+from .facets import facet_conditions, filtered_count
+from .search import search_book_ids
+
+PAGE_SIZE = 50
+SEARCH_MAX_RESULTS = 1000
+COUNT_CACHE_TTL = 30.0
+
+LIST_COLUMNS = (Book.id, Book.title_std, Book.authors_std, Book.isbn, Book.clc, Book.cover_path)
+
+
+@dataclass(frozen=True)
+class BookRow:
+    id: int
+    title: str
+    authors: Optional[str]
+    isbn: Optional[str]
+    clc: Optional[str]
+    cover_path: Optional[str]
+
+
+@dataclass
+class Page:
+    rows: List[BookRow]
+    cursor: Optional[int] = None      # 下一页游标；None 表示已到最后
+    total: Optional[int] = None       # 搜索/筛选时为命中数（搜索封顶 SEARCH_MAX_RESULTS）
+
+
+def list_page(session, cursor: Optional[int] = None, limit: int = PAGE_SIZE,
+              filters: Optional[dict] = None) -> Page:
+    """按 id 倒序浏览；cursor 为上一页最后一个 id。"""
+    pg = _ids_page(session, select(*LIST_COLUMNS).where(*facet_conditions(filters)), cursor, limit)
+    if filters:
+        pg.total = filtered_count(session, filters)
+    return pg
+
+
+def rows_by_ids(session, ids: Sequence[int]) -> List[BookRow]:
+    """按给定顺序取若干本书的列表行。"""
+    if not ids:
+        return []
+    by_id = {r[0]: BookRow(*r) for r in session.execute(select(*LIST_COLUMNS).where(Book.id.in_(list(ids))))}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def search_page(session, kw: str, cursor: Optional[int] = None, limit: int = PAGE_SIZE,
+                filters: Optional[dict] = None) -> Page:
+    """按相关度排序的搜索结果分页；cursor 为偏移量。"""
+    offset = int(cursor or 0)
+    ids = search_book_ids(session, kw, limit=SEARCH_MAX_RESULTS)
+    conds = facet_conditions(filters)
+    if conds and ids:
+        keep = set()
+        for i in range(0, len(ids), 500):
+            keep.update(session.execute(
+                select(Book.id).where(Book.id.in_(ids[i:i + 500]), *conds)).scalars())
+        ids = [i for i in ids if i in keep]
+    page_ids = ids[offset:offset + limit]
+    nxt = offset + limit if offset + limit < len(ids) else None
+    return Page(rows_by_ids(session, page_ids), nxt, total=len(ids))
+
+
+def _ids_page(session, base, cursor: Optional[int], limit: int) -> Page:
+    """base 为已带过滤条件的 select(LIST_COLUMNS)；按 id 倒序 keyset 分页。"""
+    q = base.order_by(Book.id.desc()).limit(limit + 1)
+    if cursor is not None:
+        q = q.where(Book.id < cursor)
+    rows = [BookRow(*r) for r in session.execute(q)]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return Page(rows, rows[-1].id if more and rows else None)
+
+
+def author_page(session, name: str, cursor: Optional[int] = None, limit: int = PAGE_SIZE,
+                filters: Optional[dict] = None) -> Page:
+    """某作者的书：规范名 → authors 唯一索引 → book_authors(author_id, book_id) 索引。"""
+    ids = resolve_author_ids(session, name)
+    if not ids:
+        return Page([], None, total=0)
+    conds = facet_conditions(filters)
+    base = (select(*LIST_COLUMNS).join(BookAuthor, BookAuthor.book_id == Book.id)
+            .where(BookAuthor.author_id.in_(ids), *conds).distinct())
+    pg = _ids_page(session, base, cursor, limit)
+    pg.total = session.execute(
+        select(func.count(func.distinct(BookAuthor.book_id)))
+        .join(Book, Book.id == BookAuthor.book_id)
+        .where(BookAuthor.author_id.in_(ids), *conds)
+    ).scalar() or 0
+    return pg
+
+
+def publisher_page(session, name: str, cursor: Optional[int] = None, limit: int = PAGE_SIZE,
+                   filters: Optional[dict] = None) -> Page:
+    """某出版社的书：规范名 → publishers 唯一索引 → books.publisher_id 索引。"""
+    ids = resolve_publisher_ids(session, name)
+    if not ids:
+        return Page([], None, total=0)
+    conds = facet_conditions(filters)
+    base = select(*LIST_COLUMNS).where(Book.publisher_id.in_(ids), *conds)
+    pg = _ids_page(session, base, cursor, limit)
+    pg.total = session.execute(
+        select(func.count()).select_from(Book).where(Book.publisher_id.in_(ids), *conds)
+    ).scalar() or 0
+    return pg
+
+
+# 搜索框前缀：“作者:xxx” / “出版社:xxx” 走维表索引
+AUTHOR_PREFIXES = ("作者:", "作者：", "author:")
+PUBLISHER_PREFIXES = ("出版社:", "出版社：", "publisher:")
+
+
+def _strip_prefix(kw: str, prefixes) -> Optional[str]:
+    low = kw.lower()
+    for p in prefixes:
+        if low.startswith(p):
+            return kw[len(p):].strip()
+    return None
+
+
+def page(session, kw: str = "", cursor: Optional[int] = None, limit: int = PAGE_SIZE,
+         filters: Optional[dict] = None) -> Page:
+    """“作者:”/“出版社:”前缀走维表；其它关键字走全文搜索；空关键字按 id 倒序浏览。filters 为分面筛选。"""
+    kw = (kw or "").strip()
+    if kw:
+        name = _strip_prefix(kw, AUTHOR_PREFIXES)
+        if name is not None:
+            return author_page(session, name, cursor, limit, filters)
+        name = _strip_prefix(kw, PUBLISHER_PREFIXES)
+        if name is not None:
+            return publisher_page(session, name, cursor, limit, filters)
+        return search_page(session, kw, cursor, limit, filters)
+    return list_page(session, cursor, limit, filters)
+
+
+_count = {"value": 0, "at": 0.0}
+_count_lock = threading.Lock()
+
+
+def count_estimate(session, max_age: float = COUNT_CACHE_TTL) -> int:
+    """书目总数（最多 max_age 秒前的值）。"""
+    now = time.monotonic()
+    with _count_lock:
+        if _count["at"] and now - _count["at"] < max_age:
+            return _count["value"]
+    n = session.execute(select(func.count()).select_from(Book)).scalar() or 0
+    with _count_lock:
+        _count.update(value=n, at=now)
+    return n
@@ -0,0 +1,138 @@
+# app/registry.py
+"""
+进程级 provider 注册表 + 一次性建库。
+
+原先每次 search_and_ingest 都会 init_db()（create_all 元数据检查）并通过
+get_providers() 重新 import、重新 new 出 requests.Session——批量导入时书与书之间
+无法复用 TCP/TLS 连接。这里改为：
+
+- provider 类按 config.PROVIDERS 只解析一次；
+- provider 实例（及其 Session）按线程各建一份、之后一直复用
+  （requests.Session 不保证线程安全，线程内复用即可保持 keep-alive）；
+- init_db() 每个进程只跑一次；
+- reload() 显式重建（改了 config/provider 代码后用），state() 返回当前状态。
+
+Streamlit 端再用 st.cache_resource 包一层，保证每个 server 进程只有一份。
+"""
+from __future__ import annotations
+
+import importlib
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .config import PROVIDERS
+from .db import init_db
+
+# site 名 → (模块, 类名)
+PROVIDER_CLASSES = {
+    "douban": ("app.providers.douban", "DoubanProvider"),
+    "jd": ("app.providers.jd", "JDProvider"),
+    "openlibrary": ("app.providers.openlibrary", "OpenLibraryProvider"),
+    "googlebooks": ("app.providers.googlebooks", "GoogleBooksProvider"),
+    "localjson": ("app.providers.localjson", "LocalJSONProvider"),
+}
+
+
+class ProviderRegistry:
+    def __init__(self, names: Optional[List[str]] = None):
+        self.names = list(names or PROVIDERS)
+        self._lock = threading.Lock()
+        self._tls = threading.local()
+        self._classes: Optional[list] = None
+        self._load_errors: Dict[str, str] = {}
+        self._generation = 0
+        self._db_ready = False
+        self._db_ready_at: Optional[float] = None
+        self._builds = 0                      # 累计建过几组 provider（每线程每代一组）
+        self._threads: Dict[int, int] = {}    # 线程 ident → 该线程实例所属的代
+        self._created_at = time.time()
+
+    # ---------- 建库 ----------
+    def ensure_db(self):
+        if self._db_ready:
+            return
+        with self._lock:
+            if not self._db_ready:
+                init_db()
+                self._db_ready = True
+                self._db_ready_at = time.time()
+
+    # ---------- provider ----------
+    def provider_classes(self, reload_modules: bool = False) -> list:
+        with self._lock:
+            if self._classes is None or reload_modules:
+                classes, errors = [], {}
+                for name in self.names:
+                    spec = PROVIDER_CLASSES.get(name)
+                    if not spec:
+                        errors[name] = "unknown provider"
+                        continue
+                    try:
+                        mod = importlib.import_module(spec[0])
+                        if reload_modules:
+                            mod = importlib.reload(mod)
+                        classes.append(getattr(mod, spec[1]))
+                    except Exception as e:
+                        errors[name] = str(e)
+                        print(f"[prov] {name} load failed:", e)
+                self._classes, self._load_errors = classes, errors
+            return list(self._classes)
+
+    def providers(self) -> list:
+        """当前线程的一组 provider 实例；首次调用（或 reload 之后）才创建。"""
+        gen = self._generation
+        cached = getattr(self._tls, "providers", None)
+        if cached is not None and cached[0] == gen:
+            return cached[1]
+        provs = [cls() for cls in self.provider_classes()]
+        self._tls.providers = (gen, provs)
+        with self._lock:
+            self._builds += 1
+            self._threads[threading.get_ident()] = gen
+        print(f"[registry] providers for {threading.current_thread().name}:",
+              [p.__class__.__name__ for p in provs])
+        return provs
+
+    def reload(self, reload_modules: bool = False, reinit_db: bool = False):
+        """
+        让所有线程在下次取用时重建 provider/Session。
+        reload_modules=True 时同时 importlib.reload provider 模块；reinit_db=True 时重跑 init_db。
+        """
+        with self._lock:
+            self._generation += 1
+            self._classes = None
+            if reinit_db:
+                self._db_ready = False
+        self.provider_classes(reload_modules=reload_modules)
+        if reinit_db:
+            self.ensure_db()
+
+    def state(self) -> dict:
+        alive = {t.ident for t in threading.enumerate()}
+        with self._lock:
+            for ident in [i for i in self._threads if i not in alive]:
+                self._threads.pop(ident, None)
+            return {
+                "providers": [c.__name__ for c in (self._classes or [])],
+                "configured": list(self.names),
+                "load_errors": dict(self._load_errors),
+                "generation": self._generation,
+                "builds": self._builds,
+                "threads": sum(1 for g in self._threads.values() if g == self._generation),
+                "db_ready": self._db_ready,
+                "db_ready_at": self._db_ready_at,
+                "uptime_s": round(time.time() - self._created_at, 1),
+            }
+
+
+_registry: Optional[ProviderRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ProviderRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProviderRegistry()
+        return _registry
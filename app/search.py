@@ -0,0 +1,89 @@
+# app/search.py
+"""
+书目检索：优先走 books_fts（FTS5 trigram + bm25 排序），避免 '%kw%' 全表扫描。
+
+- 关键字按空白切成若干词，词与词之间为 AND；
+- trigram 只能匹配 ≥3 个字符的词；更短的词（如两字人名“鲁迅”）在 FTS 结果上
+  再用 LIKE 过滤——仍然只扫命中的行；所有词都太短时才退回旧的 LIKE 查询；
+- 排序：bm25 加权（标题/ISBN > 作者 > 出版社 > 简介），同分按 id 倒序。
+"""
+from __future__ import annotations
+
+from typing import List
+
+from sqlalchemy import text
+
+from .db import Book, fts_available
+from .isbn import looks_like_isbn, to_isbn13
+
+MIN_FTS_TERM = 3
+
+# bm25 列权重，顺序同 db.FTS_COLUMNS：title_std, authors_std, isbn, publisher, summary
+BM25_WEIGHTS = (10.0, 5.0, 10.0, 2.0, 1.0)
+
+# 旧的 LIKE 检索列（退回时使用）
+_LIKE_COLUMNS = ("title_std", "authors_std", "isbn")
+
+_fts_ready = False
+
+
+def _has_fts() -> bool:
+    # 只缓存“可用”：init_db() 之前调用时不会把“不可用”永久记住
+    global _fts_ready
+    if not _fts_ready:
+        _fts_ready = fts_available()
+    return _fts_ready
+
+
+def split_terms(kw: str) -> List[str]:
+    return [t for t in (kw or "").split() if t]
+
+
+def _quote(term: str) -> str:
+    """FTS5 字符串字面量：双引号包裹、内部双引号加倍，避免 AND/OR/* 等被当成语法。"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_book_ids(session, kw: str, limit: int = 300) -> List[int]:
+    """返回按相关度排序的 book.id 列表。"""
+    terms = split_terms(kw)
+    if not terms:
+        return []
+    # 整串就是一个有效 ISBN（10/13 位、带不带横线均可）：走 isbn13 唯一索引
+    if looks_like_isbn(kw):
+        code = to_isbn13(kw)
+        if code:
+            return [r[0] for r in session.execute(
+                text("SELECT id FROM books WHERE isbn13 = :code"), {"code": code})]
+    long_terms = [t for t in terms if len(t) >= MIN_FTS_TERM]
+    short_terms = [t for t in terms if len(t) < MIN_FTS_TERM]
+    params = {"limit": int(limit)}
+
+    if long_terms and _has_fts():
+        params["match"] = " AND ".join(_quote(t) for t in long_terms)
+        where = ["books_fts MATCH :match"]
+        for i, t in enumerate(short_terms):
+            params[f"s{i}"] = f"%{t}%"
+            where.append("(" + " OR ".join(f"books_fts.{c} LIKE :s{i}" for c in _LIKE_COLUMNS) + ")")
+        sql = (
+            "SELECT rowid FROM books_fts WHERE " + " AND ".join(where)
+            + f" ORDER BY bm25(books_fts, {', '.join(map(str, BM25_WEIGHTS))}), rowid DESC"
+            + " LIMIT :limit"
+        )
+    else:
+        where = []
+        for i, t in enumerate(terms):
+            params[f"s{i}"] = f"%{t}%"
+            where.append("(" + " OR ".join(f"{c} LIKE :s{i}" for c in _LIKE_COLUMNS) + ")")
+        sql = "SELECT id FROM books WHERE " + " AND ".join(where) + " ORDER BY id DESC LIMIT :limit"
+
+    return [r[0] for r in session.execute(text(sql), params)]
+
+
+def search_books(session, kw: str, limit: int = 300) -> List[Book]:
+    """按相关度返回 Book 对象（空关键字返回空列表，由调用方决定是否列出全部）。"""
+    ids = search_book_ids(session, kw, limit)
+    if not ids:
+        return []
+    by_id = {b.id: b for b in session.query(Book).filter(Book.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id]
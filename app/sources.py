@@ -0,0 +1,186 @@
+# app/sources.py
+"""
+来源记录（sources）的写入与保留策略。
+
+每次入库/“刷新”都会追加一条 Source（含完整简介的原始 JSON），原先从不清理。现在：
+
+- extracted 压缩存储、延迟加载（见 db.CompressedText）；content_hash 为其 sha1；
+- 写入时：与同一 (book, site) 最近一条内容相同则不追加（SOURCE_SKIP_UNCHANGED），
+  追加后只保留最近 SOURCE_KEEP_LATEST 条；
+- compact()：压缩旧的明文行、补 hash、删掉“内容未变”的重复行、按保留条数裁剪，
+  最后 VACUUM 回收空间（scripts/compact_db.py）。
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, select, text, update
+
+from .compress import decompress_text
+from .config import DB_PATH, SOURCE_KEEP_LATEST, SOURCE_SKIP_UNCHANGED
+from .db import SessionLocal, Source, engine
+from .utils import sha1
+
+
+def extracted_json(detail) -> str:
+    return json.dumps(detail.__dict__, ensure_ascii=False)
+
+
+def content_hash(extracted: Optional[str]) -> Optional[str]:
+    """按键排序后再取 hash，字段顺序不同不算变化。"""
+    if extracted is None:
+        return None
+    try:
+        canon = json.dumps(json.loads(extracted), ensure_ascii=False, sort_keys=True)
+    except ValueError:
+        canon = extracted
+    return sha1(canon)
+
+
+def source_row(book_id: int, site: str, detail) -> dict:
+    payload = extracted_json(detail)
+    return {
+        "book_id": book_id,
+        "site": site,
+        "url": getattr(detail, "url", ""),
+        "extracted": payload,
+        "content_hash": content_hash(payload),
+    }
+
+
+def latest_hashes(session, pairs: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], Optional[str]]:
+    """{(book_id, site): 最近一条的 content_hash}。"""
+    book_ids = sorted({b for b, _ in pairs})
+    if not book_ids:
+        return {}
+    latest = (
+        select(Source.book_id, Source.site, Source.content_hash)
+        .where(Source.id.in_(
+            select(func.max(Source.id))
+            .where(Source.book_id.in_(book_ids))
+            .group_by(Source.book_id, Source.site)
+        ))
+    )
+    return {(b, s): h for b, s, h in session.execute(latest)}
+
+
+def add_sources(session, rows: List[dict]) -> int:
+    """
+    按保留策略写入一批 Source 行（调用方负责事务），返回实际追加条数。
+    rows 由 source_row() 构造。
+    """
+    if not rows:
+        return 0
+    pairs = {(r["book_id"], r["site"]) for r in rows}
+    if SOURCE_SKIP_UNCHANGED:
+        last = latest_hashes(session, pairs)
+        keep = []
+        for r in rows:
+            key = (r["book_id"], r["site"])
+            if r["content_hash"] and last.get(key) == r["content_hash"]:
+                continue
+            last[key] = r["content_hash"]
+            keep.append(r)
+        rows = keep
+    if rows:
+        session.execute(Source.__table__.insert(), rows)
+    prune_sources(session, sorted({b for b, _ in pairs}))
+    return len(rows)
+
+
+def prune_sources(session, book_ids: Optional[List[int]] = None, keep: Optional[int] = None) -> int:
+    """每个 (book, site) 只留最近 keep 条（缺省 SOURCE_KEEP_LATEST，0 为不限），返回删除条数。"""
+    keep = SOURCE_KEEP_LATEST if keep is None else keep
+    if keep <= 0:
+        return 0
+    where = ""
+    params = {"keep": int(keep)}
+    if book_ids is not None:
+        if not book_ids:
+            return 0
+        where = "WHERE book_id IN :ids"
+        params["ids"] = list(book_ids)
+    stmt = text(f"""
+        DELETE FROM sources WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY book_id, site ORDER BY id DESC) AS rn
+                FROM sources {where}
+            ) WHERE rn > :keep
+        )
+    """)
+    if book_ids is not None:
+        stmt = stmt.bindparams(bindparam("ids", expanding=True))
+    return session.execute(stmt, params).rowcount or 0
+
+
+# ---------- 压缩整理 ----------
+def recompress_legacy(batch: int = 1000) -> int:
+    """把旧的明文 extracted 压缩并补 content_hash（按 id 分批，各自一个事务）。返回处理条数。"""
+    done, last_id = 0, 0
+    while True:
+        with SessionLocal() as s, s.begin():
+            rows = s.execute(text(
+                "SELECT id, extracted FROM sources "
+                "WHERE id > :last AND (typeof(extracted) = 'text' OR content_hash IS NULL) "
+                "ORDER BY id LIMIT :n"
+            ), {"last": last_id, "n": batch}).all()
+            if not rows:
+                return done
+            updates = []
+            for sid, raw in rows:
+                value = decompress_text(raw)
+                updates.append({"id": sid, "extracted": value, "content_hash": content_hash(value)})
+            s.execute(update(Source), updates)
+            last_id = rows[-1][0]
+            done += len(rows)
+
+
+def dedupe_unchanged() -> int:
+    """删除与同一 (book, site) 上一条内容相同的行（保留最早的一条）。"""
+    with SessionLocal() as s, s.begin():
+        return s.execute(text("""
+            DELETE FROM sources WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, content_hash,
+                           LAG(content_hash) OVER (PARTITION BY book_id, site ORDER BY id) AS prev
+                    FROM sources
+                ) WHERE content_hash IS NOT NULL AND content_hash = prev
+            )
+        """)).rowcount or 0
+
+
+def db_size() -> int:
+    total = 0
+    for suffix in ("", "-wal"):
+        p = f"{DB_PATH}{suffix}"
+        if os.path.exists(p):
+            total += os.path.getsize(p)
+    return total
+
+
+def vacuum():
+    """WAL 检查点 + VACUUM（不能在事务里执行，走原始连接）。"""
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cur.execute("VACUUM")
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cur.close()
+    finally:
+        raw.close()
+
+
+def compact(keep: Optional[int] = None, dedupe: bool = True, do_vacuum: bool = True) -> dict:
+    before = db_size()
+    out = {"recompressed": recompress_legacy()}
+    out["deduped"] = dedupe_unchanged() if dedupe else 0
+    with SessionLocal() as s, s.begin():
+        out["pruned"] = prune_sources(s, keep=keep)
+    if do_vacuum:
+        vacuum()
+    out["bytes_before"] = before
+    out["bytes_after"] = db_size()
+    return out
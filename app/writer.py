@@ -0,0 +1,190 @@
+# app/writer.py
+"""
+单写线程：进程内所有入库写操作排队交给一个线程，攒成小批量事务提交。
+
+SQLite 同一时刻只允许一个写者；原先 Streamlit、桌面后台线程、批量导入的工作线程
+各自开事务抢锁，并发一高就 "database is locked"。现在：
+
+- 生产者（任意线程）调用 run_write(fn) / submit(fn)，fn(session) 在写线程里执行；
+- 写线程一次取最多 WRITER_BATCH 个任务（已有任务排队时最多再等 WRITER_LINGER 秒凑批），
+  每个任务包在 SAVEPOINT 里（单个失败只回滚它自己），整批一个 BEGIN IMMEDIATE 事务提交；
+- fn 的返回值/异常通过 Future 交回生产者；请只返回普通值（id 等），不要返回 ORM 对象；
+- 跨进程的争用由 WAL + busy_timeout 处理（见 config.SQLITE_PRAGMAS）。
+
+stats() 给出队列深度、批大小和提交耗时（平均 / p95）。
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from .config import WRITER_BATCH, WRITER_LINGER, WRITER_QUEUE_MAX
+from .db import SessionLocal, engine
+
+_write_engine = engine.execution_options(sqlite_begin="IMMEDIATE")
+
+
+class DBWriter:
+    def __init__(self, batch: int = WRITER_BATCH, linger: float = WRITER_LINGER,
+                 maxsize: int = WRITER_QUEUE_MAX):
+        self.batch = max(1, int(batch))
+        self.linger = float(linger)
+        self._q: queue.Queue = queue.Queue(maxsize=max(0, int(maxsize)))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._commit_ms: deque = deque(maxlen=500)
+        self._wait_ms: deque = deque(maxlen=500)
+        self.counters = {"jobs": 0, "failed": 0, "commits": 0, "commit_errors": 0, "max_depth": 0}
+        self.last_batch = 0
+
+    # ---------- 生产者 ----------
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """投递写任务 fn(session, *args, **kwargs)，返回 Future。"""
+        fut: Future = Future()
+        if threading.current_thread() is self._thread:
+            # 写线程里再投递会自己等自己：直接开一个短事务执行
+            try:
+                with SessionLocal(bind=_write_engine) as s, s.begin():
+                    fut.set_result(fn(s, *args, **kwargs))
+            except BaseException as e:
+                fut.set_exception(e)
+            return fut
+        self._ensure_thread()
+        self._q.put((fn, args, kwargs, fut, time.perf_counter()))
+        depth = self._q.qsize()
+        if depth > self.counters["max_depth"]:
+            with self._lock:
+                self.counters["max_depth"] = max(self.counters["max_depth"], depth)
+        return fut
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """投递并等待结果（异常原样抛出）。"""
+        return self.submit(fn, *args, **kwargs).result(timeout=timeout)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+
+    # ---------- 写线程 ----------
+    def _take_batch(self) -> list:
+        jobs = [self._q.get()]
+        if self._q.empty():
+            # 只有一个生产者在等：立即提交，不为凑批空等 linger
+            return jobs
+        deadline = time.perf_counter() + self.linger
+        while len(jobs) < self.batch:
+            left = deadline - time.perf_counter()
+            try:
+                jobs.append(self._q.get_nowait() if left <= 0 else self._q.get(timeout=left))
+            except queue.Empty:
+                break
+        return jobs
+
+    def _loop(self):
+        while True:
+            jobs = self._take_batch()
+            try:
+                self._commit_batch(jobs)
+            except BaseException as e:       # 兜底：写线程不能死
+                print("[writer] batch crashed:", e)
+                for *_, fut, _t in jobs:
+                    if not fut.done():
+                        fut.set_exception(e)
+            finally:
+                for _ in jobs:
+                    self._q.task_done()
+
+    def _commit_batch(self, jobs: list):
+        results = []
+        t0 = time.perf_counter()
+        session = SessionLocal(bind=_write_engine)
+        try:
+            with session.begin():
+                for fn, args, kwargs, fut, _t in jobs:
+                    if not fut.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with session.begin_nested():
+                            results.append((fut, fn(session, *args, **kwargs), None))
+                    except Exception as e:
+                        results.append((fut, None, e))
+        except Exception as e:
+            # 整批提交失败：本批所有任务都算失败
+            with self._lock:
+                self.counters["commit_errors"] += 1
+            print("[writer] commit failed:", e)
+            results = [(fut, None, err or e) for fut, _r, err in results]
+        finally:
+            session.close()
+
+        done = time.perf_counter()
+        with self._lock:
+            self._commit_ms.append((done - t0) * 1000)
+            self.counters["commits"] += 1
+            self.counters["jobs"] += len(results)
+            self.counters["failed"] += sum(1 for *_, err in results if err is not None)
+            self.last_batch = len(results)
+            for *_, t_enq in jobs:
+                self._wait_ms.append((done - t_enq) * 1000)
+        for fut, res, err in results:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(res)
+
+    # ---------- 状态 ----------
+    def depth(self) -> int:
+        return self._q.qsize()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待目前已投递的写任务全部完成；超时返回 False。"""
+        fut = self.submit(lambda _s: None)
+        try:
+            fut.result(timeout=timeout)
+            return True
+        except Exception:
+            return fut.done()
+
+    def stats(self) -> dict:
+        def _pct(values, q):
+            if not values:
+                return 0.0
+            vals = sorted(values)
+            return round(vals[min(len(vals) - 1, int(q * len(vals)))], 2)
+
+        with self._lock:
+            commit_ms, wait_ms = list(self._commit_ms), list(self._wait_ms)
+            out = dict(self.counters)
+            out["last_batch"] = self.last_batch
+        out["queue_depth"] = self.depth()
+        out["avg_batch"] = round(out["jobs"] / out["commits"], 2) if out["commits"] else 0.0
+        out["commit_ms_avg"] = round(sum(commit_ms) / len(commit_ms), 2) if commit_ms else 0.0
+        out["commit_ms_p95"] = _pct(commit_ms, 0.95)
+        out["wait_ms_p95"] = _pct(wait_ms, 0.95)
+        out["alive"] = bool(self._thread and self._thread.is_alive())
+        return out
+
+
+_writer: Optional[DBWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> DBWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = DBWriter()
+        return _writer
+
+
+def run_write(fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+    """在写线程里执行 fn(session, ...) 并返回其结果。"""
+    return get_writer().run(fn, *args, timeout=timeout, **kwargs)
@@ -1,28 +1,120 @@
 # scripts/backfill_clc.py
+"""
+给 clc 为空的书补中图法分类（可中断、可续跑）
+- 按 id keyset 分块读取（不一次性 .all()），每块交给线程池里的 classify_clc_many() 批量分类；
+- 分类结果按块序经写线程提交（每块一个事务），提交后把进度写进检查点文件；
+- 中断后再运行会从检查点之后继续；--restart 从头开始。
+用法：
+    python scripts/backfill_clc.py [--chunk 500] [--workers 4] [--limit N] [--no-llm] [--restart]
+"""
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import bindparam, or_, select, update
+
+from app.config import DATA_DIR
 from app.db import SessionLocal, Book, init_db
-from app.classify import classify_clc
+from app.classify import classify_clc_many
+from app.writer import run_write
+
+CHECKPOINT = DATA_DIR / "backfill_clc.checkpoint.json"
+
+def load_checkpoint() -> dict:
+    try:
+        return json.loads(CHECKPOINT.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"last_id": 0, "scanned": 0, "written": 0}
+
+def save_checkpoint(state: dict):
+    tmp = CHECKPOINT.with_name(CHECKPOINT.name + ".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    tmp.replace(CHECKPOINT)
+
+def read_chunk(last_id: int, size: int) -> list:
+    with SessionLocal() as s:
+        return s.execute(
+            select(Book.id, Book.title_std, Book.authors_std, Book.summary, Book.cip)
+            .where(Book.id > last_id, or_(Book.clc.is_(None), Book.clc == ""))
+            .order_by(Book.id)
+            .limit(size)
+        ).all()
+
+def classify_chunk(rows: list, use_llm: bool) -> list:
+    results = classify_clc_many(
+        [(r.title_std or "", r.authors_std.split(",") if r.authors_std else [], r.summary or "", r.cip)
+         for r in rows],
+        use_llm=use_llm,
+    )
+    return [{"b_id": r.id, "b_clc": code.strip()}
+            for r, (code, _l, _s, _src) in zip(rows, results) if code and code.strip()]
+
+def _write_chunk(session, updates: list) -> int:
+    # 只改仍为空的：回填期间用户在 UI 里手工填了的不覆盖
+    stmt = (
+        update(Book)
+        .where(Book.id == bindparam("b_id"), or_(Book.clc.is_(None), Book.clc == ""))
+        .values(clc=bindparam("b_clc"))
+    )
+    return session.connection().execute(stmt, updates).rowcount if updates else 0
+
+def main():
+    ap = argparse.ArgumentParser(description="回填中图法分类")
+    ap.add_argument("--chunk", type=int, default=500, help="每块书目数（一块一个事务）")
+    ap.add_argument("--workers", type=int, default=4, help="分类线程数")
+    ap.add_argument("--limit", type=int, default=0, help="本次最多处理多少本（0 为不限）")
+    ap.add_argument("--no-llm", action="store_true", help="只用 CIP + 规则法")
+    ap.add_argument("--restart", action="store_true", help="忽略检查点，从头开始")
+    args = ap.parse_args()
 
-def main(limit=5000):
     init_db()
-    s = SessionLocal()
-    rows = s.query(Book).filter((Book.clc == None) | (Book.clc == "")).order_by(Book.id.asc()).limit(limit).all()
-    print(f"待回填：{len(rows)}")
-    n_ok = 0
-    for b in rows:
-        code, label, score, src = classify_clc(
-            title=b.title_std or "",
-            authors=(b.authors_std or "").split(",") if b.authors_std else [],
-            summary=b.summary or "",
-            cip=b.cip,
-        )
-        if code and code.strip():
-            b.clc = code.strip()
-            s.add(b)
-            n_ok += 1
-            print(f"[{b.id}] {b.title_std} -> CLC={b.clc} (src={src}, score={score:.2f})")
-    s.commit()
-    s.close()
-    print(f"完成：写入 {n_ok} 条")
+    state = {"last_id": 0, "scanned": 0, "written": 0} if args.restart else load_checkpoint()
+    if state["last_id"]:
+        print(f"从检查点继续：id > {state['last_id']}（已扫描 {state['scanned']}，已写入 {state['written']}）")
+
+    t0 = time.perf_counter()
+    scanned = written = 0
+    cursor = state["last_id"]
+    pending = deque()          # (块内最大 id, 块大小, Future)，按块序提交
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="clc") as pool:
+        exhausted = False
+        while pending or not exhausted:
+            # 预读并投递，最多 2×workers 块在途
+            while not exhausted and len(pending) < 2 * max(1, args.workers):
+                size = args.chunk
+                if args.limit:
+                    size = min(size, args.limit - scanned - sum(n for _i, n, _f in pending))
+                rows = read_chunk(cursor, size) if size > 0 else []
+                if not rows:
+                    exhausted = True
+                    break
+                cursor = rows[-1].id
+                pending.append((cursor, len(rows), pool.submit(classify_chunk, rows, not args.no_llm)))
+
+            if not pending:
+                break
+            last_id, n, fut = pending.popleft()
+            updates = fut.result()
+            w = run_write(_write_chunk, updates)
+            scanned += n
+            written += w
+            state = {"last_id": last_id, "scanned": state["scanned"] + n, "written": state["written"] + w}
+            save_checkpoint(state)
+            rate = scanned / max(time.perf_counter() - t0, 1e-9)
+            print(f"  … id ≤ {last_id}：本次扫描 {scanned}，写入 {written}（{rate:.0f} 本/秒）")
+
+    print(f"完成：本次扫描 {scanned} 本，写入 {written} 条，用时 {time.perf_counter() - t0:.1f}s")
+    if not args.limit or scanned < args.limit:
+        # 全部跑完：清掉检查点，下次从头扫描新入库的书
+        CHECKPOINT.unlink(missing_ok=True)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,49 @@
+# scripts/backfill_dims.py
+"""
+回填作者 / 出版社维表（authors、book_authors、publishers 与 books.publisher_id）
+旧库升级后运行一次；可重复运行（按 books 当前内容重建关联）。
+用法：
+    python scripts/backfill_dims.py [--batch 1000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import select
+
+from app.db import SessionLocal, Book, init_db
+from app.dims import sync_book_dims, dims_stats
+
+def main():
+    ap = argparse.ArgumentParser(description="回填作者/出版社维表")
+    ap.add_argument("--batch", type=int, default=1000, help="每个事务处理的书目数")
+    args = ap.parse_args()
+
+    init_db()
+    t0 = time.perf_counter()
+    done, last_id = 0, 0
+    while True:
+        # 按 id keyset 分批，每批一个事务
+        with SessionLocal() as s, s.begin():
+            ids = s.execute(
+                select(Book.id).where(Book.id > last_id).order_by(Book.id).limit(args.batch)
+            ).scalars().all()
+            if not ids:
+                break
+            sync_book_dims(s, ids)
+        last_id = ids[-1]
+        done += len(ids)
+        print(f"  … {done} 本")
+
+    with SessionLocal() as s:
+        stats = dims_stats(s)
+    print(f"✅ 回填完成：{done} 本，用时 {time.perf_counter() - t0:.2f}s")
+    print(f"   作者 {stats['authors']} 位，出版社 {stats['publishers']} 家，作者关联 {stats['book_author_links']} 条")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# scripts/backup_db.py
+"""
+在线热备份 app.db（应用运行中也可执行），并增量备份封面
+用法：
+    python scripts/backup_db.py [--dest DIR] [--keep N] [--no-covers] [--pages N]
+    python scripts/backup_db.py --verify data/backups/app-20240101-120000.db
+    --dest：备份目录（缺省 data/backups）
+    --keep：保留最近 N 份快照（缺省 config.BACKUP_KEEP，0 为不删）
+    --no-covers：只备份数据库
+    --verify FILE：只校验某个快照文件
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import backup as bk
+
+def _progress(done: int, total: int):
+    pct = done * 100 // total if total else 100
+    print(f"\r  复制页 {done}/{total}（{pct}%）", end="", flush=True)
+
+def main():
+    ap = argparse.ArgumentParser(description="在线备份数据库与封面")
+    ap.add_argument("--dest", help="备份目录")
+    ap.add_argument("--keep", type=int, help="保留最近 N 份快照")
+    ap.add_argument("--no-covers", action="store_true", help="不备份封面")
+    ap.add_argument("--pages", type=int, help="每步复制的页数")
+    ap.add_argument("--verify", metavar="FILE", help="只对快照做 integrity_check")
+    args = ap.parse_args()
+
+    if args.verify:
+        problems = bk.verify(args.verify)
+        if problems:
+            print("❌ 校验失败：")
+            for p in problems[:20]:
+                print("   ", p)
+            sys.exit(1)
+        print("✅ integrity_check: ok")
+        return
+
+    try:
+        out = bk.backup(args.dest, args.keep, covers=not args.no_covers,
+                        progress=_progress, pages=args.pages or bk.BACKUP_STEP_PAGES)
+    except bk.BackupError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+    print()
+    print(f"✅ 快照：{out['snapshot']}（{out['bytes'] / 1024 / 1024:.1f} MB，{out['snapshot_s']}s，integrity_check ok）")
+    if "covers_copied" in out:
+        print(f"   封面：新增 {out['covers_copied']} 个（{out['covers_bytes'] / 1024:.0f} KB），源文件缺失 {out['covers_missing']} 个")
+    if out["rotated"]:
+        print(f"   轮转删除：{', '.join(out['rotated'])}；清理封面 {out['covers_pruned']} 个")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# scripts/bench_clc_model.py
+"""
+本地分类模型 vs 规则法：准确率与吞吐
+- 用库里 CIP 标注的书，留出 --holdout 做验证（模型只在其余部分上临时训练，不覆盖 data/ 里的模型）；
+- 吞吐：逐本 predict 与整批向量化 predict 对比，规则法逐本。
+用法：
+    python scripts/bench_clc_model.py [--holdout 0.2] [--epochs 20] [--batch 512]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.config import CLC_MODEL_CONFIDENT
+from app.db import SessionLocal, init_db
+from app.classify import classify_rule_based
+from app.clcmodel import evaluate, labelled_books, np, split_holdout, train, training_labels
+
+def _rate(n, seconds):
+    return n / seconds if seconds > 0 else float("inf")
+
+def main():
+    ap = argparse.ArgumentParser(description="本地分类模型基准")
+    ap.add_argument("--holdout", type=float, default=0.2)
+    ap.add_argument("--epochs", type=int, default=20)
+    ap.add_argument("--batch", type=int, default=512, help="批量推理每批书目数")
+    args = ap.parse_args()
+
+    if np is None:
+        sys.exit("需要先安装 numpy：pip install numpy")
+    init_db()
+    with SessionLocal() as s:
+        texts, codes = labelled_books(s)
+    labels = training_labels(codes)
+    data = [(t, c, lb) for t, c, lb in zip(texts, codes, labels) if lb]
+    if len(data) < 20:
+        sys.exit("带 CIP 的样本太少")
+    tr, va = split_holdout(len(data), args.holdout)
+    va_texts = [data[i][0] for i in va]
+    va_codes = [data[i][1] for i in va]
+
+    t0 = time.perf_counter()
+    model = train([data[i][0] for i in tr], [data[i][2] for i in tr], epochs=args.epochs)
+    print(f"训练 {len(tr)} 本 / {model.meta['classes']} 类：{time.perf_counter() - t0:.1f}s")
+
+    res = evaluate(model, va_texts, va_codes, CLC_MODEL_CONFIDENT)
+    # 规则法只输出门类；texts 是 book_text() 拼好的串，整串当标题交给规则法即可
+    rule_ok = sum(classify_rule_based(t, [], "")[0][:1] == c[:1].upper() for t, c in zip(va_texts, va_codes))
+    print(f"验证 {res['n']} 本：")
+    print(f"   模型   门类准确率 {res['head_acc']:.1%}（细类 {res['acc']:.1%}）；"
+          f"概率 ≥ {CLC_MODEL_CONFIDENT}：覆盖 {res['coverage']:.1%}，准确率 {res['confident_acc']:.1%}")
+    print(f"   规则法 门类准确率 {rule_ok / len(va):.1%}（只分到门类首字母）")
+
+    t0 = time.perf_counter()
+    for t in va_texts:
+        model.predict([t])
+    single = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(0, len(va_texts), args.batch):
+        model.predict(va_texts[i:i + args.batch])
+    batched = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for t in va_texts:
+        classify_rule_based(t, [], "")
+    rule = time.perf_counter() - t0
+    n = len(va_texts)
+    print(f"吞吐：模型逐本 {_rate(n, single):.0f} 本/秒，批量 {_rate(n, batched):.0f} 本/秒"
+          f"（{single / batched if batched else 0:.1f}×），规则法 {_rate(n, rule):.0f} 本/秒")
+
+if __name__ == "__main__":
+    main()
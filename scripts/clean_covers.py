@@ -1,23 +1,33 @@
 # scripts/clean_covers.py
+"""
+封面垃圾回收（内容寻址存储，见 app/covers.py）
+- 默认：只处理 refcount 归零的封面（代价与变更量成正比）
+- --migrate：先把历史平铺文件 covers/<slug>.jpg 迁入分片目录
+- --recount：按 books 重新计算引用计数（触发器之外的兜底）
+- --full：再全量扫描 data/covers，删掉无人引用、也未登记的散落文件（慢）
+用法：
+    python scripts/clean_covers.py [--migrate] [--recount] [--full]
+"""
+import sys
 from pathlib import Path
-from app.db import SessionLocal, Book
-from app.config import COVERS_DIR
 
-def main():
-    session = SessionLocal()
-    used_covers = {
-        Path(b.cover_path).name
-        for b in session.query(Book).filter(Book.cover_path.isnot(None))
-    }
-    session.close()
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
 
-    deleted_count = 0
-    for f in Path(COVERS_DIR).glob("*"):
-        if f.is_file() and f.name not in used_covers:
-            f.unlink()
-            deleted_count += 1
+from app.db import init_db
+from app.covers import gc_covers, migrate_legacy_covers, recount_refs, sweep_untracked
 
-    print(f"✅ 已删除 {deleted_count} 个无用封面文件。")
+def main(argv):
+    init_db()
+    if "--migrate" in argv:
+        print(f"📦 已迁移 {migrate_legacy_covers()} 本书的历史封面。")
+    if "--recount" in argv:
+        print(f"🔢 已重算 {recount_refs()} 个封面的引用计数。")
+    n, freed = gc_covers()
+    print(f"✅ 已删除 {n} 个无用封面文件，释放 {freed / 1024:.1f} KB。")
+    if "--full" in argv:
+        print(f"🧹 全量扫描删除 {sweep_untracked()} 个散落文件。")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -0,0 +1,42 @@
+# scripts/compact_db.py
+"""
+整理 sources 表并回收空间：
+  1) 旧的明文 extracted 压缩存储、补 content_hash；
+  2) 删除与同一 (书, 站点) 上一条内容相同的重复记录；
+  3) 每本书每个站点只留最近 N 条（缺省 config.SOURCE_KEEP_LATEST）；
+  4) WAL 检查点 + VACUUM。
+用法：
+    python scripts/compact_db.py [--keep N] [--no-dedupe] [--no-vacuum]
+VACUUM 期间数据库被独占，请先关闭 Web/桌面端。
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db import init_db
+from app.compress import CODEC
+from app.sources import compact
+
+def _mb(n: int) -> str:
+    return f"{n / 1024 / 1024:.1f} MB"
+
+def main():
+    ap = argparse.ArgumentParser(description="整理 sources 表并回收空间")
+    ap.add_argument("--keep", type=int, help="每本书每个站点保留最近 N 条（缺省 config.SOURCE_KEEP_LATEST）")
+    ap.add_argument("--no-dedupe", action="store_true", help="不删除内容重复的记录")
+    ap.add_argument("--no-vacuum", action="store_true", help="不做检查点与 VACUUM")
+    args = ap.parse_args()
+
+    init_db()
+    t0 = time.perf_counter()
+    out = compact(keep=args.keep, dedupe=not args.no_dedupe, do_vacuum=not args.no_vacuum)
+    print(f"压缩（{CODEC}）：{out['recompressed']} 条｜去重：{out['deduped']} 条｜裁剪：{out['pruned']} 条")
+    print(f"数据库：{_mb(out['bytes_before'])} → {_mb(out['bytes_after'])}，用时 {time.perf_counter() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,10 @@ if str(ROOT) not in sys.path:
 
 from app.db import SessionLocal, Book, init_db
 from app.pipeline import search_and_ingest
+from app.isbn import InvalidISBN
+from app.httpcache import describe_stats
+from app.covers import get_cover_queue
+from app.llm_stage import get_llm_stage
 
 def looks_inconsistent(b: Book) -> bool:
     """
@@ -35,8 +39,14 @@ def main(limit=2000):
     for (bid, isbn, old_title) in bad:
         print(f" -> fix #{bid} {isbn} {old_title}")
         # 重新按 ISBN 抓并覆盖（会走我们加的 ISBN 强覆盖逻辑）
-        search_and_ingest(isbn)
+        try:
+            search_and_ingest(isbn, force=True)
+        except InvalidISBN as e:        # 旧数据里校验位不对的 ISBN：跳过这本，继续修其余的
+            print(f"    skip #{bid}: {e}")
     s.close()
+    get_cover_queue().drain()
+    get_llm_stage().drain()
+    print(describe_stats())
 
 if __name__ == "__main__":
     main()
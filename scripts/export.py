@@ -0,0 +1,69 @@
+# scripts/export.py
+"""
+导出书目为 JSONL / CSV / Parquet（流式，内存占用与库大小无关）
+用法：
+    python scripts/export.py out/books.jsonl
+    python scripts/export.py out/books.csv --columns id,isbn13,title_std,authors_std,clc
+    python scripts/export.py out/books.parquet --with-source --filter bucket=文学类 --filter decade=2010
+    python scripts/export.py out/delta.jsonl --incremental      # 只导出上次之后有变化的书
+    --format：不写时按扩展名判断
+    --since：只导出 updated_at 晚于该时刻（ISO 格式，如 2024-06-01T00:00:00）的书
+    --incremental：水位线记在 <输出文件>.watermark，每次导出后更新
+    Parquet 需要 pip install pyarrow
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db import init_db
+from app.export import export, EXPORT_BATCH, FORMATS
+
+def main():
+    ap = argparse.ArgumentParser(description="导出书目")
+    ap.add_argument("out", help="输出文件路径")
+    ap.add_argument("--format", choices=FORMATS, help="输出格式（缺省按扩展名）")
+    ap.add_argument("--columns", help="逗号分隔的列名（缺省导出常用列）")
+    ap.add_argument("--filter", action="append", default=[], metavar="FACET=VALUE",
+                    help="分面筛选，可重复：bucket/clc/decade/publisher/language")
+    ap.add_argument("--since", help="只导出 updated_at 晚于该时刻的书（ISO 格式）")
+    ap.add_argument("--incremental", action="store_true", help="从 <out>.watermark 读水位线并在导出后更新")
+    ap.add_argument("--with-source", action="store_true", help="附带每本书最近一条来源记录")
+    ap.add_argument("--batch", type=int, default=EXPORT_BATCH, help="每批读取的行数")
+    args = ap.parse_args()
+
+    filters = {}
+    for item in args.filter:
+        facet, sep, value = item.partition("=")
+        if not sep:
+            ap.error(f"--filter 格式应为 FACET=VALUE：{item}")
+        filters[facet.strip()] = value.strip()
+
+    out = Path(args.out)
+    mark_file = out.with_name(out.name + ".watermark")
+    since = datetime.fromisoformat(args.since) if args.since else None
+    if args.incremental and since is None and mark_file.exists():
+        since = datetime.fromisoformat(mark_file.read_text(encoding="utf-8").strip())
+
+    init_db()
+    t0 = time.perf_counter()
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()] if args.columns else None
+    try:
+        n, mark = export(out, args.format, columns, filters, since, args.with_source, args.batch)
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ 已导出 {n} 本 → {out}，用时 {time.perf_counter() - t0:.2f}s")
+    if since:
+        print(f"   增量起点：{since.isoformat()}")
+    if args.incremental and mark is not None:
+        mark_file.write_text(mark.isoformat(), encoding="utf-8")
+        print(f"   水位线：{mark.isoformat()}（{mark_file.name}）")
+
+if __name__ == "__main__":
+    main()
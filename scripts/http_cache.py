@@ -0,0 +1,29 @@
+# scripts/http_cache.py
+"""
+查看 / 清空 HTTP 响应缓存（data/http_cache.db）
+用法：
+    python scripts/http_cache.py          # 查看统计
+    python scripts/http_cache.py clear    # 清空
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.httpcache import get_cache, describe_stats
+
+def main():
+    cache = get_cache()
+    if cache is None:
+        print("HTTP 缓存未启用（config.HTTP_CACHE_ENABLED=False）")
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+        print("✅ 已清空 HTTP 缓存")
+        return
+    print(describe_stats())
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,11 @@ CSV 批量导入图书
     2) 否则 (title + authors)
     3) 否则 query
     4) 否则 第一列原始行
-- 然后调用 search_and_ingest() 入库
+- 然后交给 search_and_ingest_many() 并发入库（结果按行序输出）
 用法：
-    python scripts/import_from_csv.py samples/books.csv
+    python scripts/import_from_csv.py samples/books.csv [并发数] [--force] [--bulk]
+    --force：忽略“查不到”缓存，重新查询近期未命中的行
+    --bulk：查到的详情按 BULK_CHUNK 条一批 upsert（大批量导入更快，结果按块输出）
 """
 
 from __future__ import annotations
@@ -23,7 +25,12 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from app.pipeline import search_and_ingest
+from app.pipeline import search_and_ingest_many
+from app.httpcache import describe_stats
+from app.covers import get_cover_queue
+from app.llm_stage import get_llm_stage
+from app.writer import get_writer
+from app.bulk import bulk_stats
 from app.nlp import split_title_author
 
 # 允许的列名别名（大小写不敏感，读取后统一小写比较）
@@ -85,7 +92,7 @@ def _sniff_dialect(sample: str) -> csv.Dialect:
         return _Fallback()
 
 
-def import_csv(path: str) -> None:
+def import_csv(path: str, workers: int | None = None, force: bool = False, bulk: bool = False) -> None:
     p = Path(path)
     if not p.exists():
         print(f"❌ 文件不存在: {p}")
@@ -116,78 +123,101 @@ def import_csv(path: str) -> None:
                 yield {"__raw__": cols[0]}
 
     total = ok = fail = 0
-    for row in _iter_rows():
-        total += 1
-
-        isbn = ""
-        title = ""
-        authors = ""
-        query = ""
-
-        # 有表头场景下的取值
-        if "__raw__" not in row:
-            # 找到真实字段名（可能是中文）
-            fn = list(row.keys())
-            k_title = _pick(fn, {k.lower() for k in TITLE_KEYS})
-            k_author = _pick(fn, {k.lower() for k in AUTHOR_KEYS})
-            k_isbn = _pick(fn, {k.lower() for k in ISBN_KEYS})
-            k_query = _pick(fn, {k.lower() for k in QUERY_KEYS})
-
-            title = _normalize(row.get(k_title, "")) if k_title else ""
-            authors = _normalize(row.get(k_author, "")) if k_author else ""
-            isbn = _normalize(row.get(k_isbn, "")) if k_isbn else ""
-            query = _normalize(row.get(k_query, "")) if k_query else ""
-
-            # 如果没有 query，但有 title/author，就构造一个 query 方便日志与兜底
-            if not query:
-                if title and authors:
-                    query = f"{title} {authors}"
-                elif title:
-                    query = title
-                elif authors:
-                    query = authors
-        else:
-            # 无表头：把第一列当原始行
-            raw = (row.get("__raw__") or "").strip()
-            # 让规则/NER 先尝试拆分，便于后续 provider 命中
-            t, as_ = split_title_author(raw)
-            title = _normalize(t)
-            authors = _normalize(",".join(as_))
-            query = raw
-
-        # 构造最终用于检索的 q：
-        # 优先 ISBN，其次 title+authors，再次 query
-        if isbn:
-            q = isbn
-        elif title and authors:
-            q = f"{title} {authors}"
-        elif title:
-            q = title
-        elif query:
-            q = query
-        else:
-            print(f">>> (第{total}行) 空行或无法解析，跳过")
-            fail += 1
-            continue
 
-        print(f">>> (第{total}行) {q}")
-        bid = search_and_ingest(q)
+    def _iter_queries():
+        nonlocal total, fail
+        for row in _iter_rows():
+            total += 1
+
+            isbn = ""
+            title = ""
+            authors = ""
+            query = ""
+
+            # 有表头场景下的取值
+            if "__raw__" not in row:
+                # 找到真实字段名（可能是中文）
+                fn = list(row.keys())
+                k_title = _pick(fn, {k.lower() for k in TITLE_KEYS})
+                k_author = _pick(fn, {k.lower() for k in AUTHOR_KEYS})
+                k_isbn = _pick(fn, {k.lower() for k in ISBN_KEYS})
+                k_query = _pick(fn, {k.lower() for k in QUERY_KEYS})
+
+                title = _normalize(row.get(k_title, "")) if k_title else ""
+                authors = _normalize(row.get(k_author, "")) if k_author else ""
+                isbn = _normalize(row.get(k_isbn, "")) if k_isbn else ""
+                query = _normalize(row.get(k_query, "")) if k_query else ""
+
+                # 如果没有 query，但有 title/author，就构造一个 query 方便日志与兜底
+                if not query:
+                    if title and authors:
+                        query = f"{title} {authors}"
+                    elif title:
+                        query = title
+                    elif authors:
+                        query = authors
+            else:
+                # 无表头：把第一列当原始行
+                raw = (row.get("__raw__") or "").strip()
+                # 让规则/NER 先尝试拆分，便于后续 provider 命中
+                t, as_ = split_title_author(raw)
+                title = _normalize(t)
+                authors = _normalize(",".join(as_))
+                query = raw
+
+            # 构造最终用于检索的 q：
+            # 优先 ISBN，其次 title+authors，再次 query
+            if isbn:
+                q = isbn
+            elif title and authors:
+                q = f"{title} {authors}"
+            elif title:
+                q = title
+            elif query:
+                q = query
+            else:
+                print(f">>> (第{total}行) 空行或无法解析，跳过")
+                fail += 1
+                continue
+
+            yield (total, q), q
+
+    for (lineno, q), bid, err in search_and_ingest_many(_iter_queries(), max_workers=workers, force=force, bulk=bulk):
+        print(f">>> (第{lineno}行) {q}")
         if bid:
             print(f"  -> ✅ OK id={bid}")
             ok += 1
         else:
-            print("  -> ❌ 未找到")
+            print(f"  -> ❌ 出错：{err}" if err else "  -> ❌ 未找到")
             fail += 1
 
+    if get_cover_queue().pending():
+        print("⌛ 等待封面下载完成…")
+        get_cover_queue().drain()
+    if get_llm_stage().pending():
+        print("⌛ 等待 LLM 分类复核完成…")
+        get_llm_stage().drain()
+
     print("\n====== 导入完成 ======")
     print(f"总计: {total} | 成功: {ok} | 失败: {fail}")
+    print(describe_stats())
+    w = get_writer().stats()
+    print(f"写库：{w['commits']} 次提交 / {w['jobs']} 条（平均每批 {w['avg_batch']}），"
+          f"提交耗时 avg {w['commit_ms_avg']}ms p95 {w['commit_ms_p95']}ms，队列峰值 {w['max_depth']}")
+    if bulk:
+        b = bulk_stats()
+        print(f"批量写库：{b['rows']} 行 / {b['chunks']} 块，写库耗时 {b['seconds']}s，{b['rows_per_s']} rows/s")
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("用法: python scripts/import_from_csv.py <csv文件路径>")
+    args = [a for a in sys.argv[1:] if a not in ("--force", "--bulk")]
+    force = "--force" in sys.argv[1:]
+    bulk = "--bulk" in sys.argv[1:]
+    if not args:
+        print("用法: python scripts/import_from_csv.py <csv文件路径> [并发数] [--force] [--bulk]")
         sys.exit(1)
-    import_csv(sys.argv[1])
+    workers = int(args[1]) if len(args) > 1 else None
+    import_csv(args[0], workers=workers, force=force, bulk=bulk)
 
 
 if __name__ == "__main__":
@@ -1,21 +1,27 @@
 # scripts/import_from_txt.py
 import sys, pathlib
-from app.pipeline import search_and_ingest
+from app.pipeline import search_and_ingest_many
+from app.httpcache import describe_stats
+from app.covers import get_cover_queue
+from app.llm_stage import get_llm_stage
 
-def main(path: str):
+def main(path: str, force: bool = False):
     if path == "-":
         content = sys.stdin.read()
     else:
         p = pathlib.Path(path)
         content = p.read_text(encoding="utf-8")
     lines = [l.strip() for l in content.splitlines() if l.strip()]
-    for ln in lines:
+    for ln, bid, err in search_and_ingest_many(((ln, ln) for ln in lines), force=force):
         print(">>>", ln)
-        bid = search_and_ingest(ln)
-        print("  ->", "OK id="+str(bid) if bid else "未找到")
+        print("  ->", "OK id="+str(bid) if bid else (f"出错：{err}" if err else "未找到"))
+    get_cover_queue().drain()
+    get_llm_stage().drain()
+    print(describe_stats())
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("用法: python scripts/import_from_txt.py <txt文件路径>  或  '-' (从stdin读)")
+    args = [a for a in sys.argv[1:] if a != "--force"]
+    if not args:
+        print("用法: python scripts/import_from_txt.py <txt文件路径>  或  '-' (从stdin读)  [--force 忽略“查不到”缓存]")
         sys.exit(1)
-    main(sys.argv[1])
+    main(args[0], force="--force" in sys.argv[1:])
@@ -7,6 +7,7 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from app.pipeline import search_and_ingest
+from app.covers import get_cover_queue
 from app.db import SessionLocal, Book, init_db
 
 TEST_ISBNS = [
@@ -26,6 +27,8 @@ def main():
         if not bid:
             print("  -> 未找到")
             continue
+        get_cover_queue().drain(timeout=30)  # 封面是后台下载的，等它落盘再看
+        s.expire_all()
         b = s.query(Book).get(bid)
         print(f"  -> OK id={bid} | 标题={b.title_std} | ISBN={b.isbn} | 封面={'有' if b.cover_path else '无'}")
         time.sleep(1)
@@ -0,0 +1,24 @@
+# scripts/rebuild_facets.py
+"""
+重算分面计数 facet_counts（触发器平时会增量维护；手工改过库或怀疑计数不准时运行）
+用法：
+    python scripts/rebuild_facets.py
+"""
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db import init_db, rebuild_facets
+
+def main():
+    init_db()
+    t0 = time.perf_counter()
+    n = rebuild_facets()
+    print(f"✅ 已重算分面计数：{n} 本，用时 {time.perf_counter() - t0:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+# scripts/rebuild_fts.py
+"""
+重建全文检索索引 books_fts（旧库升级后、或怀疑索引与 books 不一致时运行）
+用法：
+    python scripts/rebuild_fts.py
+"""
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db import init_db, fts_available, rebuild_fts
+
+def main():
+    init_db()
+    if not fts_available():
+        print("❌ 当前 SQLite 不支持 FTS5/trigram（需 3.34+），搜索将使用 LIKE")
+        return
+    t0 = time.perf_counter()
+    n = rebuild_fts()
+    print(f"✅ 已重建全文索引：{n} 本，用时 {time.perf_counter() - t0:.2f}s")
+
+if __name__ == "__main__":
+    main()
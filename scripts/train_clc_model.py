@@ -0,0 +1,64 @@
+# scripts/train_clc_model.py
+"""
+用库里 CIP 给出的分类号训练本地中图法分类模型（app/clcmodel.py，需 numpy），存到 data/clc_model.npz
+- 先留出 --holdout 比例做验证并打印准确率，再用全部样本重新训练后保存；
+- 运行中的应用下次分类时会自动加载新模型。
+用法：
+    python scripts/train_clc_model.py [--epochs 20] [--holdout 0.1] [--min-class 5] [--all-labels]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.config import CLC_MODEL_CONFIDENT, CLC_MODEL_PATH
+from app.db import SessionLocal, init_db
+from app.clcmodel import evaluate, labelled_books, np, split_holdout, train, training_labels
+
+def main():
+    ap = argparse.ArgumentParser(description="训练本地中图法分类模型")
+    ap.add_argument("--epochs", type=int, default=20)
+    ap.add_argument("--lr", type=float, default=0.05)
+    ap.add_argument("--holdout", type=float, default=0.1, help="验证集比例（0 为不验证）")
+    ap.add_argument("--min-class", type=int, default=None, help="每个类别至少的样本数（缺省取 config）")
+    ap.add_argument("--all-labels", action="store_true", help="也用 clc 已有值的书（不只 CIP）")
+    ap.add_argument("--out", default=str(CLC_MODEL_PATH))
+    args = ap.parse_args()
+
+    if np is None:
+        sys.exit("需要先安装 numpy：pip install numpy")
+    init_db()
+    with SessionLocal() as s:
+        texts, codes = labelled_books(s, all_labels=args.all_labels)
+    kw = {} if args.min_class is None else {"min_class": args.min_class}
+    labels = training_labels(codes, **kw)
+    data = [(t, c, lb) for t, c, lb in zip(texts, codes, labels) if lb]
+    print(f"样本 {len(texts)} 本，可用 {len(data)} 本，{len({lb for _t, _c, lb in data})} 个类别")
+    if len(data) < 20:
+        sys.exit("带分类号的样本太少，先多导入一些有 CIP 的书")
+
+    def _progress(epoch, loss):
+        print(f"  epoch {epoch:>3}  loss {loss:.4f}")
+
+    if args.holdout > 0:
+        tr, va = split_holdout(len(data), args.holdout)
+        t0 = time.perf_counter()
+        m = train([data[i][0] for i in tr], [data[i][2] for i in tr], epochs=args.epochs, lr=args.lr,
+                  progress=_progress)
+        print(f"训练 {len(tr)} 本用时 {time.perf_counter() - t0:.1f}s")
+        res = evaluate(m, [data[i][0] for i in va], [data[i][1] for i in va], CLC_MODEL_CONFIDENT)
+        print(f"验证 {res['n']} 本：门类准确率 {res['head_acc']:.1%}，细类准确率 {res['acc']:.1%}；"
+              f"概率 ≥ {CLC_MODEL_CONFIDENT} 的覆盖 {res['coverage']:.1%}，其中门类准确率 {res['confident_acc']:.1%}")
+
+    t0 = time.perf_counter()
+    model = train([t for t, _c, _l in data], [lb for _t, _c, lb in data], epochs=args.epochs, lr=args.lr)
+    path = model.save(args.out)
+    print(f"已保存 {path}（{model.meta['features']} 个特征，{model.meta['classes']} 个类别，"
+          f"{path.stat().st_size / 1024:.0f} KB，用时 {time.perf_counter() - t0:.1f}s）")
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,23 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 import streamlit as st
-from app.db import SessionLocal, init_db, Book
-from app.pipeline import search_and_ingest
+from app.db import SessionLocal, Book
+from app.pipeline import search_and_ingest, search_and_ingest_many
+from app.isbn import InvalidISBN
 from app.nlp import split_title_author
-from app.classify import CLC_LABELS
-from app.config import COVERS_DIR  # ★ 用于把相对路径解析成绝对路径
+from app.classify import clc_bucket
+from app.clctree import get_clc_tree
+from app.facets import FACETS, all_facets
+from app.registry import get_registry
+from app.httpcache import cache_stats
+from app.ratelimit import limiter_states
+from app.breaker import breaker_states
+from app.readmodel import page as read_page, count_estimate, SEARCH_MAX_RESULTS
+from app.dims import author_names, sync_book_dims
+from app.writer import get_writer
+from app.covers import get_cover_queue, resolve_cover_path
+from app.llm_stage import get_llm_stage
+from app.llm import llm_stats
 
 # ---- rerun 兼容处理 ----
 try:
@@ -48,23 +60,6 @@ def auto_jump_refresh():
         unsafe_allow_html=True
     )
 
-# ====== CLC → 人话大类 ======
-def clc_bucket(clc_code: str | None) -> str:
-    if not clc_code:
-        return "未分类"
-    head = clc_code[0].upper()
-    if head in {"T","O","Q","R","P","S","X","N","U","V"}: return "科学技术类"
-    if head == "K": return "历史类"
-    if head == "J": return "艺术类"
-    if head == "I": return "文学类"
-    if head == "H": return "语言类"
-    if head == "F": return "经济管理类"
-    if head == "G": return "教育文化类"
-    if head == "B": return "哲学宗教类"
-    if head in {"C","D"}: return "社会政治类"
-    if head in {"A","Z"}: return "综合/知识类"
-    return CLC_LABELS.get(head, "未分类")
-
 # ===== CSV 导入工具 =====
 TITLE_KEYS = {"title", "书名", "标题", "name", "book", "book_title"}
 AUTHOR_KEYS = {"author", "authors", "作者", "作者们", "author_name", "author_names"}
@@ -114,7 +109,7 @@ def _sniff_dialect(sample: str) -> csv.Dialect:
             quoting = csv.QUOTE_MINIMAL
         return _Fallback()
 
-def import_csv_bytes(data: bytes) -> tuple[int, int, int]:
+def import_csv_bytes(data: bytes, force: bool = False) -> tuple[int, int, int]:
     buf = _decode_bytes(data)
     sample = buf.read(4096); buf.seek(0)
     dialect = _sniff_dialect(sample)
@@ -134,44 +129,49 @@ def import_csv_bytes(data: bytes) -> tuple[int, int, int]:
 
     total = ok = fail = 0
     progress = st.progress(0, text="正在导入…")
-    for row in _iter_rows():
-        total += 1
-        isbn = title = authors = query = ""
-
-        if "__raw__" not in row:
-            fn = list(row.keys())
-            k_title = _pick(fn, {k.lower() for k in TITLE_KEYS})
-            k_author = _pick(fn, {k.lower() for k in AUTHOR_KEYS})
-            k_isbn = _pick(fn, {k.lower() for k in ISBN_KEYS})
-            k_query = _pick(fn, {k.lower() for k in QUERY_KEYS})
-            title   = _normalize(row.get(k_title, "")) if k_title else ""
-            authors = _normalize(row.get(k_author, "")) if k_author else ""
-            isbn    = _normalize(row.get(k_isbn, "")) if k_isbn else ""
-            query   = _normalize(row.get(k_query, "")) if k_query else ""
-            if not query:
-                query = (f"{title} {authors}".strip() or title or authors)
-        else:
-            raw = (row.get("__raw__") or "").strip()
-            t, as_ = split_title_author(raw)
-            title = _normalize(t)
-            authors = _normalize(",".join(as_))
-            query = raw
-
-        q = isbn or (f"{title} {authors}".strip()) or title or query
-        if not q:
-            st.write(f">>> (第{total}行) 空行或无法解析，跳过")
-            fail += 1
-            progress.progress(0.0, text=f"正在导入… {ok} 成功 / {fail} 失败")
-            continue
 
-        st.write(f">>> (第{total}行) {q}")
-        bid = search_and_ingest(q)
+    def _iter_queries():
+        nonlocal total, fail
+        for row in _iter_rows():
+            total += 1
+            isbn = title = authors = query = ""
+
+            if "__raw__" not in row:
+                fn = list(row.keys())
+                k_title = _pick(fn, {k.lower() for k in TITLE_KEYS})
+                k_author = _pick(fn, {k.lower() for k in AUTHOR_KEYS})
+                k_isbn = _pick(fn, {k.lower() for k in ISBN_KEYS})
+                k_query = _pick(fn, {k.lower() for k in QUERY_KEYS})
+                title   = _normalize(row.get(k_title, "")) if k_title else ""
+                authors = _normalize(row.get(k_author, "")) if k_author else ""
+                isbn    = _normalize(row.get(k_isbn, "")) if k_isbn else ""
+                query   = _normalize(row.get(k_query, "")) if k_query else ""
+                if not query:
+                    query = (f"{title} {authors}".strip() or title or authors)
+            else:
+                raw = (row.get("__raw__") or "").strip()
+                t, as_ = split_title_author(raw)
+                title = _normalize(t)
+                authors = _normalize(",".join(as_))
+                query = raw
+
+            q = isbn or (f"{title} {authors}".strip()) or title or query
+            if not q:
+                st.write(f">>> (第{total}行) 空行或无法解析，跳过")
+                fail += 1
+                progress.progress(0.0, text=f"正在导入… {ok} 成功 / {fail} 失败")
+                continue
+            yield (total, q), q
+
+    # 并发抓取，结果按行序回到主线程再渲染（Streamlit 组件只能在脚本线程里调用）
+    for (lineno, q), bid, err in search_and_ingest_many(_iter_queries(), force=force):
+        st.write(f">>> (第{lineno}行) {q}")
         if bid:
             ok += 1
             st.write(f"  -> ✅ OK id={bid}")
         else:
             fail += 1
-            st.write("  -> ❌ 未找到")
+            st.write(f"  -> ❌ 出错：{err}" if err else "  -> ❌ 未找到")
         progress.progress(0.0, text=f"正在导入… {ok} 成功 / {fail} 失败")
     progress.empty()
     return total, ok, fail
@@ -179,25 +179,40 @@ def import_csv_bytes(data: bytes) -> tuple[int, int, int]:
 # ============ 页面 & 初始化 ============
 st.set_page_config(page_title="BookMeta 个人版", layout="wide")
 st.title("📚 BookMeta 个人版")
-init_db()
+
+# provider/Session 与建库：每个 Streamlit server 进程只做一次，rerun 不再重复
+@st.cache_resource
+def provider_registry():
+    reg = get_registry()
+    reg.ensure_db()
+    return reg
+
+registry = provider_registry()
 
 # ============ 侧边栏：新增图书 + 批量导入 ============
 with st.sidebar:
     st.header("新增图书")
     st.caption("输入书名/作者/ISBN，点击抓取并入库。建议优先用 ISBN，命中率最高。")
     add_q = st.text_input("书名/作者/ISBN", key="add-query")
+    force_retry = st.checkbox("强制重试（忽略“查不到”缓存）", key="force-retry",
+                              help="默认会跳过近期已确认查不到的书，勾选后重新向各数据源查询。")
     add_btn = st.button("抓取并入库", use_container_width=True, key="add-button")
     if add_btn:
         text = (add_q or "").strip()
         if not text:
             st.warning("请输入内容后再点击。")
         else:
-            bid = search_and_ingest(text)
-            if bid:
-                st.success(f"✅ 已入库（ID={bid}）")
-                auto_jump_refresh()
+            try:
+                bid = search_and_ingest(text, force=force_retry)
+            except InvalidISBN as e:
+                st.error(str(e))   # 校验位不对，未发起任何网络请求
             else:
-                st.warning("未从任何数据源获取到元数据。")
+                if bid:
+                    get_cover_queue().drain(timeout=10)  # 封面在后台下载，稍等片刻再刷新页面
+                    st.success(f"✅ 已入库（ID={bid}）")
+                    auto_jump_refresh()
+                else:
+                    st.warning("未从任何数据源获取到元数据。")
 
     st.divider()
     st.header("批量导入（CSV）")
@@ -209,25 +224,85 @@ with st.sidebar:
         if start:
             with st.spinner("正在批量导入，请稍候…"):
                 data = up.read()
-                total, ok, fail = import_csv_bytes(data)
+                total, ok, fail = import_csv_bytes(data, force=force_retry)
+                get_cover_queue().drain(timeout=60)
             st.success(f"导入完成：总计 {total}，成功 {ok}，失败 {fail}")
             auto_jump_refresh()
 
+    st.divider()
+    st.header("分类浏览")
+    # 计数来自 facet_counts 表（触发器增量维护），库再大侧栏也是即时的
+    _fs = SessionLocal()
+    facet_values = all_facets(_fs)
+    _fs.close()
+    facet_filters = {}
+    for facet, title in FACETS.items():
+        vals = {v.value: f"{v.label}（{v.count}）" for v in facet_values[facet]}
+        chosen = st.session_state.get(f"facet-{facet}")
+        if chosen is not None and chosen not in vals:
+            vals[chosen] = chosen or "（空）"
+        facet_filters[facet] = st.selectbox(
+            title, [None, *vals], key=f"facet-{facet}",
+            format_func=lambda v, vals=vals: "全部" if v is None else vals[v],
+        )
+    facet_filters = {f: v for f, v in facet_filters.items() if v is not None}
+
+    st.divider()
+    for site, br in breaker_states().items():
+        if br["state"] != "closed":
+            st.warning(f"数据源 {site} 暂时熔断（{br['state']}），约 {br['retry_in_s'] or 0:.0f}s 后重试。")
+    with st.expander("运行状态", expanded=False):
+        st.caption("数据源注册表")
+        st.json(registry.state(), expanded=False)
+        st.caption("HTTP 缓存")
+        st.json(cache_stats(), expanded=False)
+        st.caption("封面下载队列")
+        st.json(get_cover_queue().stats(), expanded=False)
+        st.caption("站点限速")
+        st.json(limiter_states(), expanded=False)
+        st.caption("站点熔断")
+        st.json(breaker_states(), expanded=False)
+        st.caption("写库队列（单写线程）")
+        st.json(get_writer().stats(), expanded=False)
+        st.caption("LLM 分类（入库后异步复核）")
+        st.json({**get_llm_stage().stats(), **{f"api_{k}": v for k, v in llm_stats().items()}}, expanded=False)
+        if st.button("重新装载数据源", use_container_width=True, key="reload-providers"):
+            registry.reload()
+            st.success("已重新装载，后续请求会新建连接。")
+
 # ============ 顶部搜索 ============
-kw = st.text_input("搜索（标题/作者/ISBN）", key="global-search")
+kw = st.text_input("搜索（标题/作者/ISBN/出版社/简介，空格分隔多个词）", key="global-search",
+                   help="“作者:刘慈欣” / “出版社:人民文学出版社” 只查该作者/出版社名下的书（走索引，不做子串匹配）。")
+
+# ============ DB 查询（keyset 分页，只取列表列；见 app/readmodel.py） ============
+PAGE_SIZE = 30
+page_key = (kw, tuple(sorted(facet_filters.items())))
+if st.session_state.get("page-kw") != page_key:
+    # 关键字或筛选条件变了：回到第一页
+    st.session_state["page-kw"] = page_key
+    st.session_state["page-stack"] = []      # 之前各页的游标，用于“上一页”
+    st.session_state["page-cursor"] = None
 
-# ============ DB 查询（稳定排序） ============
 session = SessionLocal()
-query = session.query(Book)
-if kw:
-    like = f"%{kw}%"
-    query = query.filter(
-        (Book.title_std.like(like)) |
-        (Book.authors_std.like(like)) |
-        (Book.isbn.like(like))
-    )
-rows = query.order_by(Book.id.desc(), Book.created_at.desc()).limit(300).all()
+# 有关键字：全文检索（FTS5 + bm25 相关度排序）；否则按 id 倒序浏览；侧栏分面条件叠加在上面
+pg = read_page(session, kw, st.session_state["page-cursor"], PAGE_SIZE, facet_filters)
+total = pg.total if pg.total is not None else count_estimate(session)
 session.close()
+rows = pg.rows
+
+
+def render_pager(where: str):
+    stack = st.session_state["page-stack"]
+    c1, c2, c3 = st.columns([1, 3, 1], vertical_alignment="center")
+    if c1.button("◀ 上一页", disabled=not stack, key=f"page-prev-{where}", use_container_width=True):
+        st.session_state["page-cursor"] = stack.pop()
+        rerun()
+    more = "+" if kw.strip() and total >= SEARCH_MAX_RESULTS else ""
+    c2.caption(f"第 {len(stack) + 1} 页 · 共 {total}{more} 本")
+    if c3.button("下一页 ▶", disabled=pg.cursor is None, key=f"page-next-{where}", use_container_width=True):
+        stack.append(st.session_state["page-cursor"])
+        st.session_state["page-cursor"] = pg.cursor
+        rerun()
 
 # ============ 每本书独立分片渲染 ============
 try:
@@ -236,35 +311,13 @@ except AttributeError:
     fragment = st.experimental_fragment
 
 def _resolve_cover_path(cover_path: str | None) -> str | None:
-    """把 DB 中保存的封面路径解析为本机绝对路径。
-    - 支持 'covers/xxx.jpg' 相对路径
-    - 兼容历史绝对路径（存在就直接用）
-    - 若文件不存在，尝试按文件名在 COVERS_DIR 下寻找/模糊匹配
-    """
-    if not cover_path:
-        return None
-    p = Path(cover_path)
-    # 相对路径：以当前 data/covers 为准
-    if not p.is_absolute():
-        abs_path = COVERS_DIR / p.name
-        if abs_path.exists():
-            return str(abs_path)
-        # 模糊：slug 可能被截断
-        cand = list(COVERS_DIR.glob(p.stem + "*"))
-        if cand:
-            return str(cand[0])
-        return None
-    # 绝对路径（历史数据）
-    if p.exists():
-        return str(p)
-    # 绝对路径失效：按文件名到当前 covers 下找
-    alt = COVERS_DIR / p.name
-    if alt.exists():
-        return str(alt)
-    cand = list(COVERS_DIR.glob(p.stem + "*"))
-    if cand:
-        return str(cand[0])
-    return None
+    """把 DB 中保存的封面路径解析为本机绝对路径（只 stat，不再 glob 目录）。"""
+    p = resolve_cover_path(cover_path)
+    return str(p) if p else None
+
+def _search_for(query: str):
+    # on_click 回调里改搜索框的值（控件实例化之后不能直接赋值）
+    st.session_state["global-search"] = query
 
 @fragment
 def render_card(book_id: int):
@@ -275,7 +328,7 @@ def render_card(book_id: int):
         return
 
     bucket = clc_bucket(b.clc)
-    clc_show = b.clc or "—"
+    clc_show = f"{b.clc} {get_clc_tree().label(b.clc, '')}".strip() if b.clc else "—"
     bucket_show = bucket or "未分类"
 
     with st.container(key=f"card-{b.id}", border=True):
@@ -283,7 +336,8 @@ def render_card(book_id: int):
         st.caption(
             f"作者：{b.authors_std or '未知'}｜出版社：{b.publisher or '未知'}｜"
             f"年份：{b.pub_year or '—'}｜ISBN：{b.isbn or '—'}｜"
-            f"CLC：{clc_show}｜类别：{bucket_show}"
+            f"CLC：{clc_show}｜类别：{bucket_show}",
+            help=get_clc_tree().path_label(b.clc) or None,
         )
         col1, col2 = st.columns([1, 3], vertical_alignment="top")
         with col1:
@@ -300,14 +354,33 @@ def render_card(book_id: int):
             refresh_clicked = ops_cols[1].button("刷新", key=f"btn-refresh-{b.id}")
             delete_clicked = ops_cols[2].button("删除", key=f"btn-del-{b.id}")
 
-            if refresh_clicked and b.isbn:
-                bid2 = search_and_ingest(b.isbn)
-                if bid2:
-                    st.success("已刷新该书元数据。")
+            names = author_names(S, b.id)
+            if names or b.publisher:
+                dim_cols = st.columns(len(names[:3]) + (1 if b.publisher else 0) + 1)
+                jump = False
+                for i, name in enumerate(names[:3]):
+                    jump |= dim_cols[i].button(f"同作者：{name}", key=f"btn-author-{b.id}-{i}",
+                                               on_click=_search_for, args=(f"作者:{name}",))
+                if b.publisher:
+                    jump |= dim_cols[len(names[:3])].button("同出版社", key=f"btn-pub-{b.id}",
+                                                            on_click=_search_for, args=(f"出版社:{b.publisher}",))
+                if jump:
                     S.close()
-                    hard_reload()
+                    rerun()
+
+            if refresh_clicked and b.isbn:
+                try:
+                    bid2 = search_and_ingest(b.isbn, force=True)
+                except InvalidISBN as e:
+                    st.warning(f"刷新失败：{e}")   # 旧数据里校验位不对的 ISBN，未发起网络请求
                 else:
-                    st.warning("刷新失败：数据源未返回。")
+                    if bid2:
+                        get_cover_queue().drain(timeout=10)
+                        st.success("已刷新该书元数据。")
+                        S.close()
+                        hard_reload()
+                    else:
+                        st.warning("刷新失败：数据源未返回。")
 
             if delete_clicked:
                 st.session_state[f"confirm-del-{b.id}"] = True
@@ -357,6 +430,8 @@ def render_card(book_id: int):
                             fresh.isbn = (isbn or "").strip() or None
                             fresh.summary = summary or None
                             S.add(fresh)
+                            S.flush()
+                            sync_book_dims(S, [fresh.id])
                             S.commit()
                         st.session_state[f"editing-{b.id}"] = False
                         S.close()
@@ -368,5 +443,7 @@ def render_card(book_id: int):
 if not rows:
     st.info("暂无记录。可以在左侧新增图书，或上传 CSV 批量导入。")
 else:
+    render_pager("top")
     for b in rows:
         render_card(b.id)
+    render_pager("bottom")